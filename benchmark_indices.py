@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos índices de chaves estrangeiras e filtros (antes/depois)
+
+Gera uma massa de dados grande em um schema temporário, mede as consultas
+mais usadas pelas rotas sem os índices e depois com eles, e remove o schema ao final.
+
+Uso:
+    python benchmark_indices.py [--escala N]
+"""
+import argparse
+import os
+import time
+
+from sqlalchemy import create_engine, text
+
+SCHEMA = 'benchmark_indices'
+
+DB_USER = os.environ.get("DB_USER", "aba_user")
+DB_PASS = os.environ.get("DB_PASS", "aba_pass123")
+DB_NAME = os.environ.get("DB_NAME", "aba_postgres")
+DB_HOST = os.environ.get("DB_HOST", "db")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+# Mesmo conjunto criado pela migration 5d7a1c3e9b20 (mais os índices já existentes das metas)
+INDICES = [
+    'CREATE INDEX idx_checklist_respostas_checklist ON checklist_respostas (checklist_id)',
+    'CREATE INDEX idx_checklist_respostas_pergunta ON checklist_respostas (pergunta_id)',
+    'CREATE INDEX idx_checklists_data ON checklists_diarios (data)',
+    'CREATE INDEX idx_metas_plano ON metas_terapeuticas (plano_id)',
+    'CREATE INDEX idx_metas_status_previsao ON metas_terapeuticas (status, data_previsao_termino)',
+    'CREATE INDEX idx_planos_paciente ON planos_terapeuticos (paciente_id)',
+    'CREATE INDEX idx_planos_profissional ON planos_terapeuticos (profissional_id)',
+    'CREATE INDEX idx_perguntas_formulario_ordem ON perguntas (formulario_id, ordem)',
+    'CREATE INDEX idx_meta_formulario_formulario ON meta_formulario (formulario_id)',
+]
+
+# Consultas representativas das rotas de relatórios, metas e checklists
+CONSULTAS = {
+    'planos do paciente': """
+        SELECT * FROM planos_terapeuticos WHERE paciente_id = 42
+    """,
+    'metas do plano': """
+        SELECT * FROM metas_terapeuticas WHERE plano_id = 420
+    """,
+    'metas atrasadas': """
+        SELECT id FROM metas_terapeuticas
+        WHERE status = 'EM_ANDAMENTO' AND data_previsao_termino < CURRENT_DATE - 300
+    """,
+    'checklists do paciente no período': """
+        SELECT c.id, c.data, c.nota FROM checklists_diarios c
+        JOIN metas_terapeuticas m ON m.id = c.meta_id
+        JOIN planos_terapeuticos p ON p.id = m.plano_id
+        WHERE p.paciente_id = 42 AND c.data >= CURRENT_DATE - 30
+    """,
+    'checklists do dia': """
+        SELECT id FROM checklists_diarios WHERE data = CURRENT_DATE - 10
+    """,
+    'respostas de um checklist': """
+        SELECT * FROM checklist_respostas WHERE checklist_id = 12345
+    """,
+    'evolução de uma pergunta': """
+        SELECT r.resposta_calculada, c.data FROM checklist_respostas r
+        JOIN checklists_diarios c ON c.id = r.checklist_id
+        WHERE r.pergunta_id = 7 ORDER BY c.data
+    """,
+    'perguntas do formulário': """
+        SELECT * FROM perguntas WHERE formulario_id = 5 ORDER BY ordem
+    """,
+    'metas que usam um formulário': """
+        SELECT meta_id FROM meta_formulario WHERE formulario_id = 5
+    """,
+}
+
+
+def criar_massa(conn, escala):
+    """Cria as tabelas no schema de benchmark e gera os dados"""
+    pacientes = 1000 * escala
+    planos = 2 * pacientes
+    metas = 5 * planos
+    checklists = 20 * metas
+    formularios = 200
+
+    print(f"🌱 Gerando dados: {planos} planos, {metas} metas, {checklists} checklists...")
+    conn.execute(text(f"""
+        CREATE TABLE planos_terapeuticos AS
+        SELECT g AS id, (g % {pacientes}) + 1 AS paciente_id, (g % 50) + 1 AS profissional_id
+        FROM generate_series(1, {planos}) g;
+
+        CREATE TABLE metas_terapeuticas AS
+        SELECT g AS id, (g % {planos}) + 1 AS plano_id,
+               (ARRAY['EM_ANDAMENTO', 'CONCLUIDA', 'CANCELADA'])[(g % 3) + 1] AS status,
+               CURRENT_DATE - (g % 730) AS data_previsao_termino
+        FROM generate_series(1, {metas}) g;
+
+        CREATE TABLE checklists_diarios AS
+        SELECT g AS id, (g % {metas}) + 1 AS meta_id,
+               CURRENT_DATE - (g % 365) AS data, (g % 5) + 1 AS nota
+        FROM generate_series(1, {checklists}) g;
+
+        CREATE TABLE checklist_respostas AS
+        SELECT g AS id, (g % {checklists}) + 1 AS checklist_id, (g % {formularios * 10}) + 1 AS pergunta_id,
+               (g % 10)::text AS resposta_calculada
+        FROM generate_series(1, {checklists * 3}) g;
+
+        CREATE TABLE perguntas AS
+        SELECT g AS id, (g % {formularios}) + 1 AS formulario_id, g / {formularios} AS ordem,
+               'Pergunta ' || g AS texto
+        FROM generate_series(1, {formularios * 10}) g;
+
+        CREATE TABLE meta_formulario AS
+        SELECT g AS meta_id, (g % {formularios}) + 1 AS formulario_id
+        FROM generate_series(1, {metas}) g;
+    """))
+
+    # Chaves primárias existem nas tabelas reais, então entram nos dois cenários
+    for tabela in ('planos_terapeuticos', 'metas_terapeuticas', 'checklists_diarios',
+                   'checklist_respostas', 'perguntas'):
+        conn.execute(text(f"ALTER TABLE {tabela} ADD PRIMARY KEY (id)"))
+    conn.execute(text("ALTER TABLE meta_formulario ADD PRIMARY KEY (meta_id, formulario_id)"))
+    conn.execute(text("ALTER TABLE checklists_diarios ADD CONSTRAINT unique_meta_data UNIQUE (meta_id, data)"))
+    conn.execute(text("ANALYZE"))
+
+
+def medir(conn, repeticoes):
+    """Executa cada consulta com EXPLAIN ANALYZE e retorna o menor tempo (ms)"""
+    tempos = {}
+    for nome, sql in CONSULTAS.items():
+        melhor = None
+        for _ in range(repeticoes):
+            plano = conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()
+            tempo = plano[0]['Execution Time']
+            melhor = tempo if melhor is None else min(melhor, tempo)
+        tempos[nome] = melhor
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos índices (antes/depois)')
+    parser.add_argument('--escala', type=int, default=10, help='multiplicador do volume de dados')
+    parser.add_argument('--repeticoes', type=int, default=5, help='execuções por consulta')
+    args = parser.parse_args()
+
+    engine = create_engine(
+        f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    print("🚀 Benchmark de índices")
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+
+        try:
+            inicio = time.time()
+            criar_massa(conn, args.escala)
+            print(f"✅ Dados gerados em {time.time() - inicio:.1f}s")
+
+            print("⏱️ Medindo sem índices...")
+            antes = medir(conn, args.repeticoes)
+
+            print("🔧 Criando índices...")
+            for sql in INDICES:
+                conn.execute(text(sql))
+            conn.execute(text("ANALYZE"))
+
+            print("⏱️ Medindo com índices...")
+            depois = medir(conn, args.repeticoes)
+        finally:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    print(f"\n{'Consulta':<38} {'Antes (ms)':>12} {'Depois (ms)':>12} {'Ganho':>8}")
+    print("-" * 74)
+    for nome in CONSULTAS:
+        ganho = antes[nome] / depois[nome] if depois[nome] else float('inf')
+        print(f"{nome:<38} {antes[nome]:>12.2f} {depois[nome]:>12.2f} {ganho:>7.1f}x")
+    print("\n🧹 Schema de benchmark removido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Add tarefas for background report jobs
+
+Revision ID: 2b7e9d4c1a60
+Revises: f1c39b7d5e28
+Create Date: 2026-10-19 20:41:09.362514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7e9d4c1a60'
+down_revision: Union[str, Sequence[str], None] = 'f1c39b7d5e28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'tarefas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('parametros', sa.JSON(), nullable=False),
+        sa.Column('status', sa.Enum('PENDENTE', 'EXECUTANDO', 'CONCLUIDA', 'ERRO', name='statustarefaenum'), nullable=False),
+        sa.Column('resultado', sa.Text(), nullable=True),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('usuario_id', sa.Integer(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('iniciado_em', sa.DateTime(), nullable=True),
+        sa.Column('concluido_em', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_tarefas_usuario_criado_em', 'tarefas', ['usuario_id', 'criado_em'])
+    op.create_index('idx_tarefas_status_criado_em', 'tarefas', ['status', 'criado_em'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_tarefas_status_criado_em', table_name='tarefas')
+    op.drop_index('idx_tarefas_usuario_criado_em', table_name='tarefas')
+    op.drop_table('tarefas')
+    sa.Enum(name='statustarefaenum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,29 @@
+"""Add status/previsao index to metas_terapeuticas
+
+Revision ID: 3c9e2a7d41b5
+Revises: prof_pac_001
+Create Date: 2026-10-19 09:12:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e2a7d41b5'
+down_revision: Union[str, Sequence[str], None] = 'prof_pac_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Índice usado pelas listagens de metas filtradas por status e prazo (ex.: atrasadas)
+    op.create_index('idx_metas_status_previsao', 'metas_terapeuticas', ['status', 'data_previsao_termino'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_metas_status_previsao', table_name='metas_terapeuticas')
@@ -0,0 +1,58 @@
+"""Add indexes on foreign key and filter columns
+
+Revision ID: 5d7a1c3e9b20
+Revises: 8f41d0b6c2e9
+Create Date: 2026-10-19 11:12:40.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7a1c3e9b20'
+down_revision: Union[str, Sequence[str], None] = '8f41d0b6c2e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (nome, tabela, colunas) derivados dos filtros usados nas rotas.
+# metas_terapeuticas.status já é coberto por idx_metas_status_previsao,
+# checklists_diarios.meta_id por unique_meta_data e meta_formulario.meta_id pela chave primária.
+INDICES = [
+    ('idx_checklist_respostas_checklist', 'checklist_respostas', ['checklist_id']),
+    ('idx_checklist_respostas_pergunta', 'checklist_respostas', ['pergunta_id']),
+    ('idx_checklists_data', 'checklists_diarios', ['data']),
+    ('idx_metas_plano', 'metas_terapeuticas', ['plano_id']),
+    ('idx_planos_paciente', 'planos_terapeuticos', ['paciente_id']),
+    ('idx_planos_profissional', 'planos_terapeuticos', ['profissional_id']),
+    ('idx_perguntas_formulario_ordem', 'perguntas', ['formulario_id', 'ordem']),
+    ('idx_usuarios_profissional', 'usuarios', ['profissional_id']),
+    ('idx_usuarios_paciente', 'usuarios', ['paciente_id']),
+    ('idx_meta_formulario_formulario', 'meta_formulario', ['formulario_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY não bloqueia escritas, mas não pode rodar dentro de transação
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas in INDICES:
+            op.create_index(
+                nome, tabela, colunas,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for nome, tabela, _ in reversed(INDICES):
+            op.drop_index(
+                nome, table_name=tabela,
+                postgresql_concurrently=True,
+                if_exists=True
+            )
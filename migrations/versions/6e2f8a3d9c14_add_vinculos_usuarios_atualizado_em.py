@@ -0,0 +1,44 @@
+"""Add atualizado_em to vinculos and usuarios for cross-process cache invalidation
+
+Revision ID: 6e2f8a3d9c14
+Revises: 2b7e9d4c1a60
+Create Date: 2026-10-19 22:14:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2f8a3d9c14'
+down_revision: Union[str, Sequence[str], None] = '2b7e9d4c1a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# tabela -> nome do índice de atualizado_em
+TABELAS = {
+    'profissional_paciente': 'idx_vinculo_atualizado_em',
+    'usuarios': 'idx_usuarios_atualizado_em',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Registros existentes recebem o instante da migration (UTC, como datetime.utcnow no modelo)
+    for tabela, indice in TABELAS.items():
+        op.add_column(tabela, sa.Column(
+            'atualizado_em', sa.DateTime(), nullable=False,
+            server_default=sa.text("(now() at time zone 'utc')")
+        ))
+        op.alter_column(tabela, 'atualizado_em', server_default=None)
+        op.create_index(indice, tabela, ['atualizado_em'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabela, indice in TABELAS.items():
+        op.drop_index(indice, table_name=tabela)
+        op.drop_column(tabela, 'atualizado_em')
@@ -0,0 +1,31 @@
+"""Add paciente_id and profissional_id to registros_exclusao for access-scoped sync
+
+Revision ID: 8b3d5f7e2a96
+Revises: 6e2f8a3d9c14
+Create Date: 2026-10-19 23:02:11.804517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3d5f7e2a96'
+down_revision: Union[str, Sequence[str], None] = '6e2f8a3d9c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tombstones anteriores ficam sem paciente: só administradores os recebem na sincronização
+    op.add_column('registros_exclusao', sa.Column('paciente_id', sa.Integer(), nullable=True))
+    op.add_column('registros_exclusao', sa.Column('profissional_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('registros_exclusao', 'profissional_id')
+    op.drop_column('registros_exclusao', 'paciente_id')
@@ -0,0 +1,31 @@
+"""Add composite status indexes to profissional_paciente
+
+Revision ID: 8f41d0b6c2e9
+Revises: 3c9e2a7d41b5
+Create Date: 2026-10-19 10:03:22.547912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f41d0b6c2e9'
+down_revision: Union[str, Sequence[str], None] = '3c9e2a7d41b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Listagens de vínculos por profissional/paciente filtradas por status
+    op.create_index('idx_vinculo_profissional_status', 'profissional_paciente', ['profissional_id', 'status'])
+    op.create_index('idx_vinculo_paciente_status', 'profissional_paciente', ['paciente_id', 'status'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_vinculo_paciente_status', table_name='profissional_paciente')
+    op.drop_index('idx_vinculo_profissional_status', table_name='profissional_paciente')
@@ -0,0 +1,32 @@
+"""Add rolling window configuration to perguntas and resposta_janela to checklist_respostas
+
+Revision ID: 9a6c4e1f3b57
+Revises: e3b95c0d7f12
+Create Date: 2026-10-19 15:12:40.531907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a6c4e1f3b57'
+down_revision: Union[str, Sequence[str], None] = 'e3b95c0d7f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('perguntas', sa.Column('janela_sessoes', sa.Integer(), nullable=True))
+    op.add_column('perguntas', sa.Column('agregacao_janela', sa.String(length=20), nullable=True))
+    op.add_column('checklist_respostas', sa.Column('resposta_janela', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('checklist_respostas', 'resposta_janela')
+    op.drop_column('perguntas', 'agregacao_janela')
+    op.drop_column('perguntas', 'janela_sessoes')
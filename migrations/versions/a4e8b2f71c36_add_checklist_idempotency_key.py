@@ -0,0 +1,30 @@
+"""Add idempotency key to checklists_diarios
+
+Revision ID: a4e8b2f71c36
+Revises: 5d7a1c3e9b20
+Create Date: 2026-10-19 11:48:05.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e8b2f71c36'
+down_revision: Union[str, Sequence[str], None] = '5d7a1c3e9b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('checklists_diarios', sa.Column('chave_idempotencia', sa.String(length=64), nullable=True))
+    op.create_unique_constraint('unique_checklist_chave_idempotencia', 'checklists_diarios', ['chave_idempotencia'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('unique_checklist_chave_idempotencia', 'checklists_diarios', type_='unique')
+    op.drop_column('checklists_diarios', 'chave_idempotencia')
@@ -0,0 +1,46 @@
+"""Add mastery criteria and incremental mastery state to metas_terapeuticas
+
+Revision ID: b58d2f6e0a91
+Revises: 9a6c4e1f3b57
+Create Date: 2026-10-19 16:03:27.118094
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b58d2f6e0a91'
+down_revision: Union[str, Sequence[str], None] = '9a6c4e1f3b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('metas_terapeuticas', sa.Column('criterio_pergunta_id', sa.Integer(), nullable=True))
+    op.add_column('metas_terapeuticas', sa.Column('criterio_limiar', sa.Float(), nullable=True))
+    op.add_column('metas_terapeuticas', sa.Column('criterio_sessoes', sa.Integer(), nullable=True))
+    op.add_column('metas_terapeuticas', sa.Column(
+        'maestria_sequencia', sa.Integer(), nullable=False, server_default='0'
+    ))
+    op.alter_column('metas_terapeuticas', 'maestria_sequencia', server_default=None)
+    op.add_column('metas_terapeuticas', sa.Column('maestria_ultima_data', sa.Date(), nullable=True))
+    op.create_foreign_key(
+        'fk_metas_criterio_pergunta', 'metas_terapeuticas', 'perguntas',
+        ['criterio_pergunta_id'], ['id'], ondelete='SET NULL'
+    )
+    op.create_index('idx_metas_status_maestria', 'metas_terapeuticas', ['status', 'maestria_sequencia'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_metas_status_maestria', table_name='metas_terapeuticas')
+    op.drop_constraint('fk_metas_criterio_pergunta', 'metas_terapeuticas', type_='foreignkey')
+    op.drop_column('metas_terapeuticas', 'maestria_ultima_data')
+    op.drop_column('metas_terapeuticas', 'maestria_sequencia')
+    op.drop_column('metas_terapeuticas', 'criterio_sessoes')
+    op.drop_column('metas_terapeuticas', 'criterio_limiar')
+    op.drop_column('metas_terapeuticas', 'criterio_pergunta_id')
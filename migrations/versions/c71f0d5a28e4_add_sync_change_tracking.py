@@ -0,0 +1,58 @@
+"""Add change tracking columns and deletion tombstones for sync
+
+Revision ID: c71f0d5a28e4
+Revises: a4e8b2f71c36
+Create Date: 2026-10-19 12:26:51.447310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71f0d5a28e4'
+down_revision: Union[str, Sequence[str], None] = 'a4e8b2f71c36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# tabela -> nome do índice de atualizado_em
+TABELAS = {
+    'pacientes': 'idx_pacientes_atualizado_em',
+    'agenda': 'idx_agenda_atualizado_em',
+    'metas_terapeuticas': 'idx_metas_atualizado_em',
+    'checklists_diarios': 'idx_checklists_atualizado_em',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Registros existentes recebem o instante da migration (UTC, como datetime.utcnow no modelo)
+    for tabela, indice in TABELAS.items():
+        op.add_column(tabela, sa.Column(
+            'atualizado_em', sa.DateTime(), nullable=False,
+            server_default=sa.text("(now() at time zone 'utc')")
+        ))
+        op.alter_column(tabela, 'atualizado_em', server_default=None)
+        op.create_index(indice, tabela, ['atualizado_em'])
+
+    op.create_table('registros_exclusao',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tabela', sa.String(length=50), nullable=False),
+        sa.Column('registro_id', sa.Integer(), nullable=False),
+        sa.Column('excluido_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_registros_exclusao_excluido_em', 'registros_exclusao', ['excluido_em'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_registros_exclusao_excluido_em', table_name='registros_exclusao')
+    op.drop_table('registros_exclusao')
+
+    for tabela, indice in TABELAS.items():
+        op.drop_index(indice, table_name=tabela)
+        op.drop_column(tabela, 'atualizado_em')
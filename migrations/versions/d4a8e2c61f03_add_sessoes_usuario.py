@@ -0,0 +1,41 @@
+"""Add sessoes_usuario for refresh tokens
+
+Revision ID: d4a8e2c61f03
+Revises: b58d2f6e0a91
+Create Date: 2026-10-19 17:41:09.532270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8e2c61f03'
+down_revision: Union[str, Sequence[str], None] = 'b58d2f6e0a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sessoes_usuario',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('token_hash', sa.String(length=64), nullable=False),
+        sa.Column('expira_em', sa.DateTime(), nullable=False),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_sessoes_usuario_usuario', 'sessoes_usuario', ['usuario_id'])
+    op.create_index('idx_sessoes_usuario_expira_em', 'sessoes_usuario', ['expira_em'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_sessoes_usuario_expira_em', table_name='sessoes_usuario')
+    op.drop_index('idx_sessoes_usuario_usuario', table_name='sessoes_usuario')
+    op.drop_table('sessoes_usuario')
@@ -0,0 +1,28 @@
+"""Add grupo to perguntas for aggregate formulas
+
+Revision ID: e3b95c0d7f12
+Revises: c71f0d5a28e4
+Create Date: 2026-10-19 14:05:12.208413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b95c0d7f12'
+down_revision: Union[str, Sequence[str], None] = 'c71f0d5a28e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('perguntas', sa.Column('grupo', sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('perguntas', 'grupo')
@@ -0,0 +1,38 @@
+"""Add tokens_revogados for access token revocation
+
+Revision ID: f1c39b7d5e28
+Revises: d4a8e2c61f03
+Create Date: 2026-10-19 18:02:44.817305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c39b7d5e28'
+down_revision: Union[str, Sequence[str], None] = 'd4a8e2c61f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'tokens_revogados',
+        sa.Column('jti', sa.String(length=32), nullable=False),
+        sa.Column('expira_em', sa.DateTime(), nullable=False),
+        sa.Column('revogado_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index('idx_tokens_revogados_expira_em', 'tokens_revogados', ['expira_em'])
+    op.create_index('idx_tokens_revogados_revogado_em', 'tokens_revogados', ['revogado_em'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_tokens_revogados_revogado_em', table_name='tokens_revogados')
+    op.drop_index('idx_tokens_revogados_expira_em', table_name='tokens_revogados')
+    op.drop_table('tokens_revogados')
@@ -2,7 +2,7 @@ import os
 import sys
 import io
 import logging
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flasgger import Swagger
 
@@ -37,12 +37,58 @@ from src.routes.auth import auth_bp
 from src.routes.pergunta import pergunta_bp
 from src.routes.formulario import formulario_bp
 from src.routes.agenda import agenda_bp
+from src.routes.sync import sync_bp
+from src.routes.tarefas import tarefas_bp
+from src.services.autenticacao import publico, requer_permissao
+from src.services.compressao import otimizar_resposta, precomprimir_estaticos
+from src.services.estaticos import ManifestoEstatico
+from src.services.registro_log import configurar_logs
 
 # -------------------------
 # Inicialização do Flask
 # -------------------------
 app = Flask(__name__, static_folder=os.path.join(current_dir, 'static'))
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+# Exige token JWT em todas as rotas /api (exceto login, refresh e logout); "false" só em desenvolvimento
+app.config['AUTENTICACAO_OBRIGATORIA'] = os.environ.get('AUTENTICACAO_OBRIGATORIA', 'true').lower() != 'false'
+app.config['AUTH_CACHE_TTL_SEGUNDOS'] = int(os.environ.get('AUTH_CACHE_TTL_SEGUNDOS', 60))
+# Intervalo das verificações de usuários e vínculos alterados por outros processos (renovam os caches)
+app.config['AUTH_VERIFICACAO_SEGUNDOS'] = int(os.environ.get('AUTH_VERIFICACAO_SEGUNDOS', 5))
+app.config['ACESSO_VERIFICACAO_SEGUNDOS'] = int(os.environ.get('ACESSO_VERIFICACAO_SEGUNDOS', 5))
+# Validade do token de acesso (minutos) e do refresh token (dias)
+app.config['JWT_ACESSO_MINUTOS'] = int(os.environ.get('JWT_ACESSO_MINUTOS', 15))
+app.config['REFRESH_TOKEN_DIAS'] = int(os.environ.get('REFRESH_TOKEN_DIAS', 30))
+# Intervalos da lista de tokens revogados em memória: leitura das novas revogações e reconstrução completa
+app.config['REVOGACAO_ATUALIZACAO_SEGUNDOS'] = int(os.environ.get('REVOGACAO_ATUALIZACAO_SEGUNDOS', 30))
+app.config['REVOGACAO_RECONSTRUCAO_SEGUNDOS'] = int(os.environ.get('REVOGACAO_RECONSTRUCAO_SEGUNDOS', 3600))
+# Verificações de senha simultâneas por processo (login/registro) e tamanho da fila de espera
+app.config['SENHA_THREADS'] = int(os.environ.get('SENHA_THREADS', min(4, os.cpu_count() or 1)))
+app.config['SENHA_FILA_MAXIMA'] = int(os.environ.get('SENHA_FILA_MAXIMA', 32))
+# Respostas de texto/JSON menores que isso (em bytes) não são comprimidas
+app.config['COMPRESSAO_MINIMO_BYTES'] = int(os.environ.get('COMPRESSAO_MINIMO_BYTES', 1024))
+# Reexaminar a pasta do frontend a cada N segundos (0 = só na inicialização; útil em desenvolvimento)
+app.config['ESTATICOS_VERIFICAR_SEGUNDOS'] = int(os.environ.get('ESTATICOS_VERIFICAR_SEGUNDOS', 0))
+# Delegar o envio dos arquivos ao servidor web (cabeçalho X-Sendfile; ex.: Apache mod_xsendfile)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+# Logs em JSON: nível geral, níveis por módulo ("src.routes.agenda=DEBUG,sqlalchemy.engine=WARNING")
+# e fração dos registros DEBUG emitidos (ex.: 0.1 = 10%)
+app.config['LOG_NIVEL'] = os.environ.get('LOG_NIVEL', 'INFO')
+app.config['LOG_NIVEIS'] = os.environ.get('LOG_NIVEIS', '')
+app.config['LOG_AMOSTRAGEM_DEBUG'] = float(os.environ.get('LOG_AMOSTRAGEM_DEBUG', 1.0))
+
+# Relatórios em segundo plano (/api/tarefas): execuções simultâneas por tipo ("relatorio_periodo=1,..."),
+# tamanho da fila de cada tipo, retenção dos resultados e tempo após o qual a tarefa é dada como interrompida
+app.config['TAREFAS_LIMITES'] = os.environ.get('TAREFAS_LIMITES', '')
+app.config['TAREFAS_FILA_MAXIMA'] = int(os.environ.get('TAREFAS_FILA_MAXIMA', 20))
+app.config['TAREFAS_RETENCAO_HORAS'] = int(os.environ.get('TAREFAS_RETENCAO_HORAS', 24))
+app.config['TAREFAS_TEMPO_MAXIMO_MINUTOS'] = int(os.environ.get('TAREFAS_TEMPO_MAXIMO_MINUTOS', 30))
+
+# Relatórios idênticos (mesmos parâmetros e mesmo acesso) reaproveitam a resposta por N segundos (0 = desligado);
+# requisições simultâneas sempre compartilham um único cálculo
+app.config['RELATORIOS_CACHE_SEGUNDOS'] = int(os.environ.get('RELATORIOS_CACHE_SEGUNDOS', 10))
+
+configurar_logs(app)
+logger = logging.getLogger(__name__)
 
 # -------------------------
 # Configuração CORS
@@ -88,69 +134,73 @@ swagger = Swagger(app, template={
 blueprints = [
     user_bp, paciente_bp, profissional_bp, profissional_paciente_bp,
     plano_terapeutico_bp, meta_terapeutica_bp, checklist_diario_bp,
-    relatorios_bp, auth_bp, pergunta_bp, formulario_bp, agenda_bp
+    relatorios_bp, auth_bp, pergunta_bp, formulario_bp, agenda_bp,
+    sync_bp, tarefas_bp
 ]
 
 for bp in blueprints:
     app.register_blueprint(bp, url_prefix='/api')
 
+# ETag/304 nos GETs da API e compressão gzip/brotli das respostas
+app.after_request(otimizar_resposta)
+
 # -------------------------
 # Criar tabelas e popular dados iniciais
 # -------------------------
 with app.app_context():
     try:
         db.create_all()
-        print("✅ Tabelas criadas com sucesso.")
+        logger.info("Tabelas criadas com sucesso")
 
         # Executar seed data se necessário
         from src.database.seed_data import create_seed_data
         create_seed_data()
 
-    except Exception as e:
-        print("❌ Erro ao inicializar banco de dados:", e)
+    except Exception:
+        logger.exception("Erro ao inicializar banco de dados")
 
 # -------------------------
 # Rota de teste
 # -------------------------
 @app.route('/api/hello', methods=['GET'])
+@publico
 def hello():
     return {"mensagem": "Olá, mundo!"}
 
 # -------------------------
 # Servir frontend (SPA)
 # -------------------------
+# Pasta indexada uma vez; o index.html fica em memória
+manifesto_estatico = ManifestoEstatico(app.static_folder)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder = app.static_folder
-    requested_path = os.path.join(static_folder, path)
-
-    if path != "" and os.path.exists(requested_path):
-        return send_from_directory(static_folder, path)
-
-    index_path = os.path.join(static_folder, 'index.html')
-    if os.path.exists(index_path):
-        return send_from_directory(static_folder, 'index.html')
+    return manifesto_estatico.responder(path)
 
-    return "index.html not found", 404
+@app.cli.command('precomprimir-estaticos')
+def precomprimir_estaticos_comando():
+    """Gera as variantes .gz/.br dos arquivos do frontend (rodar após cada build)"""
+    print(f"{precomprimir_estaticos(app.static_folder)} arquivos pré-comprimidos gerados")
+    manifesto_estatico.carregar()
 
 # -------------------------
 # Endpoint de exemplo PUT com logging de payload
 # -------------------------
 @app.route('/api/test-put/<int:id>', methods=['PUT'])
+@requer_permissao('editar_dados')
 def test_put(id):
     try:
         data = request.json
-        print(f"Payload recebido para update {id}: {data}")
+        logger.debug("Payload recebido para update %s", id, extra={'payload': data})
         return jsonify({"status": "ok", "id": id, "payload": data})
     except Exception as e:
-        print("Erro ao processar PUT:", e)
+        logger.exception("Erro ao processar PUT %s", id)
         return jsonify({"error": str(e)}), 500
 
 # -------------------------
 # Inicialização do Flask
 # -------------------------
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
-    logging.debug(f"Tentando conectar ao banco: {DB_USER}@{DB_HOST}:{DB_NAME}")
+    logger.info("Conectando ao banco %s@%s:%s", DB_USER, DB_HOST, DB_NAME)
     app.run(host='0.0.0.0', port=5000, debug=True)
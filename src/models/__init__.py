@@ -11,11 +11,15 @@ from .plano_terapeutico import PlanoTerapeutico
 from .meta_terapeutica import MetaTerapeutica, StatusMetaEnum
 from .checklist_diario import ChecklistDiario
 from .usuario import Usuario, TipoUsuarioEnum
+from .sessao_usuario import SessaoUsuario
+from .token_revogado import TokenRevogado
 from .formulario import Formulario
 from .pergunta import Pergunta, TipoPerguntaEnum
 from .checklist_respostas import ChecklistResposta
 from .checklist_diario import ChecklistDiario
 from .agenda import Agenda, StatusAgendamentoEnum
+from .tarefa import Tarefa, StatusTarefaEnum
+from .registro_exclusao import RegistroExclusao, MODELOS_SINCRONIZADOS
 
 # Exportar para facilitar importações
 __all__ = [
@@ -27,15 +31,21 @@ __all__ = [
     'MetaTerapeutica',
     'ChecklistDiario',
     'Usuario',
+    'SessaoUsuario',
+    'TokenRevogado',
     'Formulario',     
     'Pergunta',  
     'ChecklistResposta',
     'ChecklistDiario',
     'Agenda',
+    'Tarefa',
+    'RegistroExclusao',
+    'MODELOS_SINCRONIZADOS',
     'DiagnosticoEnum',
     'StatusMetaEnum',
     'StatusAgendamentoEnum',
     'StatusVinculoEnum',
+    'StatusTarefaEnum',
     'TipoAtendimentoEnum',
     'TipoUsuarioEnum',
     'TipoPerguntaEnum'
@@ -18,6 +18,8 @@ class Agenda(db.Model):
     observacoes = db.Column(db.Text)
     status = db.Column(db.Enum(StatusAgendamentoEnum), default=StatusAgendamentoEnum.AGENDADO, nullable=False)
     presente = db.Column(db.Boolean, default=None, nullable=True)  # None = não informado, True = presente, False = ausente
+    # Alteração mais recente, usada pela sincronização incremental (/sync)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Chaves estrangeiras
     paciente_id = db.Column(db.Integer, db.ForeignKey('pacientes.id'), nullable=False)
@@ -33,6 +35,7 @@ class Agenda(db.Model):
         db.Index('idx_agenda_paciente', 'paciente_id'),
         db.Index('idx_agenda_profissional', 'profissional_id'),
         db.Index('idx_agenda_status', 'status'),
+        db.Index('idx_agenda_atualizado_em', 'atualizado_em'),
     )
 
     def __repr__(self):
@@ -48,6 +51,7 @@ class Agenda(db.Model):
             'presente': self.presente,
             'paciente_id': self.paciente_id,
             'profissional_id': self.profissional_id,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
             'paciente': {
                 'id': self.paciente.id,
                 'nome': self.paciente.nome
@@ -60,7 +64,7 @@ class Agenda(db.Model):
         }
 
     @classmethod
-    def get_agendamentos_por_mes(cls, ano, mes, profissional_id=None, paciente_id=None):
+    def get_agendamentos_por_mes(cls, ano, mes, profissional_id=None, paciente_id=None, pacientes_ids=None):
         """
         Retorna agendamentos de um mês específico
         """
@@ -74,11 +78,15 @@ class Agenda(db.Model):
         
         if paciente_id:
             query = query.filter(cls.paciente_id == paciente_id)
+        
+        # Restrição de acesso: apenas os pacientes informados (None = todos)
+        if pacientes_ids is not None:
+            query = query.filter(cls.paciente_id.in_(pacientes_ids))
             
         return query.order_by(cls.data_hora).all()
 
     @classmethod
-    def get_agendamentos_por_dia(cls, data, profissional_id=None, paciente_id=None):
+    def get_agendamentos_por_dia(cls, data, profissional_id=None, paciente_id=None, pacientes_ids=None):
         """
         Retorna agendamentos de um dia específico
         """
@@ -91,6 +99,10 @@ class Agenda(db.Model):
         
         if paciente_id:
             query = query.filter(cls.paciente_id == paciente_id)
+        
+        # Restrição de acesso: apenas os pacientes informados (None = todos)
+        if pacientes_ids is not None:
+            query = query.filter(cls.paciente_id.in_(pacientes_ids))
             
         return query.order_by(cls.data_hora).all()
 
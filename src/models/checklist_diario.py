@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 from . import db
 from .meta_terapeutica import MetaTerapeutica
 from .checklist_respostas import ChecklistResposta
@@ -11,12 +11,20 @@ class ChecklistDiario(db.Model):
     data = db.Column(db.Date, nullable=False, default=date.today)
     nota = db.Column(db.Integer, nullable=True)
     observacao = db.Column(db.Text, nullable=True)
+    # Chave enviada pelo cliente para tornar reenvios do mesmo checklist seguros
+    chave_idempotencia = db.Column(db.String(64), nullable=True)
+    # Alteração mais recente, usada pela sincronização incremental (/sync)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     meta = db.relationship('MetaTerapeutica', back_populates='checklists_diarios')
     respostas = db.relationship('ChecklistResposta', back_populates='checklist', cascade='all, delete-orphan', lazy=True)
 
+    # unique_meta_data também atende filtros por meta_id (coluna líder)
     __table_args__ = (
         db.UniqueConstraint('meta_id', 'data', name='unique_meta_data'),
+        db.UniqueConstraint('chave_idempotencia', name='unique_checklist_chave_idempotencia'),
+        db.Index('idx_checklists_data', 'data'),
+        db.Index('idx_checklists_atualizado_em', 'atualizado_em'),
     )
 
     def to_dict(self):
@@ -27,39 +35,27 @@ class ChecklistDiario(db.Model):
             'data': self.data.isoformat() if self.data else None,
             'nota': self.nota,
             'observacao': self.observacao,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
             'respostas': [r.to_dict() for r in self.respostas],
             'perguntas': self.obter_perguntas_formularios()
         }
     
+    def esquema_formulario(self):
+        """Esquema compilado (e cacheado) dos formulários vinculados à meta"""
+        from src.services.esquema_formulario import obter_esquema
+        return obter_esquema(self.meta_id) if self.meta_id else None
+
     def obter_perguntas_formularios(self):
         """Retorna todas as perguntas dos formulários vinculados à meta"""
-        perguntas = []
-        if self.meta and self.meta.formularios:
-            for formulario in self.meta.formularios:
-                perguntas.extend([p.to_dict() for p in formulario.perguntas])
-        return perguntas
+        esquema = self.esquema_formulario()
+        return esquema.perguntas if esquema else []
 
     def validar_respostas(self, respostas_dict):
         """
         Valida se todas as perguntas obrigatórias foram respondidas
         respostas_dict: dict com {pergunta_id: resposta}
         """
-        if not self.meta or not self.meta.formularios:
+        esquema = self.esquema_formulario()
+        if not esquema:
             return True, "Nenhum formulário vinculado à meta"
-        
-        perguntas_obrigatorias = []
-        for formulario in self.meta.formularios:
-            for pergunta in formulario.perguntas:
-                if pergunta.obrigatoria and pergunta.tipo.value != 'FORMULA':
-                    perguntas_obrigatorias.append(pergunta)
-        
-        perguntas_nao_respondidas = []
-        for pergunta in perguntas_obrigatorias:
-            resposta = respostas_dict.get(str(pergunta.id), "")
-            if not resposta or resposta.strip() == "":
-                perguntas_nao_respondidas.append(pergunta.texto)
-        
-        if perguntas_nao_respondidas:
-            return False, f"Perguntas obrigatórias não respondidas: {', '.join(perguntas_nao_respondidas)}"
-        
-        return True, "Validação aprovada"
+        return esquema.validar(respostas_dict)
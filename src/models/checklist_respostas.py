@@ -1,5 +1,6 @@
 from . import db
 from .pergunta import Pergunta
+from src.services.formulas import avaliar_formula
 
 class ChecklistResposta(db.Model):
     __tablename__ = "checklist_respostas"
@@ -9,10 +10,16 @@ class ChecklistResposta(db.Model):
     pergunta_id = db.Column(db.Integer, db.ForeignKey('perguntas.id'), nullable=False)
     resposta = db.Column(db.Text, nullable=True)
     resposta_calculada = db.Column(db.Text, nullable=True)  # Para armazenar o resultado da fórmula
+    resposta_janela = db.Column(db.Text, nullable=True)  # Agregado das últimas sessões (perguntas com janela)
 
     checklist = db.relationship('ChecklistDiario', back_populates='respostas')
     pergunta = db.relationship('Pergunta', backref='checklist_respostas')
 
+    __table_args__ = (
+        db.Index('idx_checklist_respostas_checklist', 'checklist_id'),
+        db.Index('idx_checklist_respostas_pergunta', 'pergunta_id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -20,6 +27,7 @@ class ChecklistResposta(db.Model):
             'pergunta_id': self.pergunta_id,
             'resposta': self.resposta,
             'resposta_calculada': self.resposta_calculada,
+            'resposta_janela': self.resposta_janela,
             'pergunta': self.pergunta.to_dict() if self.pergunta else None,
             'eh_formula': self.pergunta.tipo.value == 'FORMULA' if self.pergunta else False
         }
@@ -29,25 +37,18 @@ class ChecklistResposta(db.Model):
         Calcula a fórmula da pergunta usando as respostas fornecidas
         respostas_dict: dict com {pergunta_id: resposta}
         """
-        if not self.pergunta or self.pergunta.tipo.value != 'FORMULA' or not self.pergunta.formula:
-            return None
-            
-        try:
-            formula = self.pergunta.formula
-            # Substituir referências de perguntas pelos valores das respostas
-            for pergunta_id, resposta in respostas_dict.items():
-                # Converter resposta para número se possível
-                try:
-                    valor = float(resposta) if resposta else 0
-                except (ValueError, TypeError):
-                    valor = 0
-                
-                # Substituir {pergunta_id} pelo valor na fórmula
-                formula = formula.replace(f'{{{pergunta_id}}}', str(valor))
-            
-            # Avaliar a fórmula (cuidado com segurança - em produção usar uma biblioteca segura)
-            resultado = eval(formula)
-            return str(resultado)
-        except Exception as e:
-            print(f"Erro ao calcular fórmula: {e}")
+        if not self.pergunta or self.pergunta.tipo.value != 'FORMULA':
             return None
+        perguntas = [(p.id, p.grupo) for p in self.pergunta.formulario.perguntas]
+        return ChecklistResposta.avaliar_formula(
+            self.pergunta.formula, respostas_dict, perguntas, self.pergunta.id
+        )
+
+    @staticmethod
+    def avaliar_formula(formula, respostas_dict, perguntas=None, proprio_id=None):
+        """
+        Avalia uma fórmula substituindo {pergunta_id} pelas respostas fornecidas
+        respostas_dict: dict com {pergunta_id: resposta}
+        perguntas: [(pergunta_id, grupo)] do formulário, para intervalos e grupos
+        """
+        return avaliar_formula(formula, respostas_dict, perguntas, proprio_id)
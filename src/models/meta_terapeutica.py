@@ -1,12 +1,16 @@
-from datetime import date
+from datetime import date, datetime
 from enum import Enum
+from sqlalchemy import case, func, cast, Numeric
+from sqlalchemy.ext.hybrid import hybrid_property
 from . import db
 
 # Tabela de associação Many-to-Many entre MetaTerapeutica e Formulario
 meta_formulario = db.Table(
     "meta_formulario",
     db.Column("meta_id", db.Integer, db.ForeignKey("metas_terapeuticas.id"), primary_key=True),
-    db.Column("formulario_id", db.Integer, db.ForeignKey("formularios.id"), primary_key=True)
+    db.Column("formulario_id", db.Integer, db.ForeignKey("formularios.id"), primary_key=True),
+    # A chave primária (meta_id, formulario_id) já atende buscas por meta_id
+    db.Index("idx_meta_formulario_formulario", "formulario_id")
 )
 
 class StatusMetaEnum(Enum):
@@ -22,6 +26,16 @@ class MetaTerapeutica(db.Model):
     data_inicio = db.Column(db.Date, nullable=False)
     data_previsao_termino = db.Column(db.Date, nullable=False)
     status = db.Column(db.Enum(StatusMetaEnum), nullable=False, default=StatusMetaEnum.EM_ANDAMENTO)
+    # Alteração mais recente, usada pela sincronização incremental (/sync)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Critério de maestria (ex.: valor >= 80 em 3 sessões consecutivas); desativado sem criterio_sessoes
+    criterio_pergunta_id = db.Column(db.Integer, db.ForeignKey('perguntas.id', ondelete='SET NULL'), nullable=True)  # sem pergunta usa a nota
+    criterio_limiar = db.Column(db.Float, nullable=True)
+    criterio_sessoes = db.Column(db.Integer, nullable=True)
+    # Estado incremental do critério: sessões consecutivas atingindo o limiar até a última sessão avaliada
+    maestria_sequencia = db.Column(db.Integer, nullable=False, default=0)
+    maestria_ultima_data = db.Column(db.Date, nullable=True)
 
     # Relacionamento com plano
     plano = db.relationship('PlanoTerapeutico', back_populates='metas_terapeuticas')
@@ -37,6 +51,14 @@ class MetaTerapeutica(db.Model):
         lazy="subquery"
     )
 
+    # Índices para metas por plano e listagens filtradas por status e prazo (ex.: metas atrasadas)
+    __table_args__ = (
+        db.Index('idx_metas_plano', 'plano_id'),
+        db.Index('idx_metas_status_previsao', 'status', 'data_previsao_termino'),
+        db.Index('idx_metas_atualizado_em', 'atualizado_em'),
+        db.Index('idx_metas_status_maestria', 'status', 'maestria_sequencia'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -45,6 +67,11 @@ class MetaTerapeutica(db.Model):
             'data_inicio': self.data_inicio.isoformat() if self.data_inicio else None,
             'data_previsao_termino': self.data_previsao_termino.isoformat() if self.data_previsao_termino else None,
             'status': self.status.value if self.status else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+            'criterio_pergunta_id': self.criterio_pergunta_id,
+            'criterio_limiar': self.criterio_limiar,
+            'criterio_sessoes': self.criterio_sessoes,
+            'maestria_sequencia': self.maestria_sequencia,
             'formularios': [f.to_dict() for f in self.formularios]
         }
 
@@ -58,3 +85,49 @@ class MetaTerapeutica(db.Model):
             return 100
         progresso = min(100, max(0, (dias_decorridos / total_dias) * 100))
         return round(progresso, 2)
+
+    @hybrid_property
+    def progresso(self):
+        """Progresso temporal da meta (0-100), calculável também em SQL"""
+        return self.calcular_progresso()
+
+    @progresso.expression
+    def progresso(cls):
+        total_dias = cls.data_previsao_termino - cls.data_inicio
+        dias_decorridos = func.current_date() - cls.data_inicio
+        return case(
+            (total_dias <= 0, 100),
+            else_=func.round(
+                cast(func.least(100, func.greatest(0, dias_decorridos * 100.0 / total_dias)), Numeric),
+                2
+            )
+        )
+
+    @hybrid_property
+    def dias_restantes(self):
+        """Dias até a data prevista de término (negativo se já passou)"""
+        return (self.data_previsao_termino - date.today()).days
+
+    @dias_restantes.expression
+    def dias_restantes(cls):
+        return cls.data_previsao_termino - func.current_date()
+
+    @hybrid_property
+    def atrasada(self):
+        """Meta em andamento cuja data prevista de término já passou"""
+        return self.status == StatusMetaEnum.EM_ANDAMENTO and self.data_previsao_termino < date.today()
+
+    @atrasada.expression
+    def atrasada(cls):
+        return (cls.status == StatusMetaEnum.EM_ANDAMENTO) & (cls.data_previsao_termino < func.current_date())
+
+    @hybrid_property
+    def sessoes_para_maestria(self):
+        """Sessões consecutivas que ainda faltam para atingir o critério de maestria (None sem critério)"""
+        if not self.criterio_sessoes:
+            return None
+        return max(0, self.criterio_sessoes - (self.maestria_sequencia or 0))
+
+    @sessoes_para_maestria.expression
+    def sessoes_para_maestria(cls):
+        return cls.criterio_sessoes - cls.maestria_sequencia
@@ -1,6 +1,7 @@
-from datetime import date
+from datetime import date, datetime
 from enum import Enum
 from . import db
+from .profissional_paciente import ProfissionalPaciente
 
 class DiagnosticoEnum(Enum):
     TEA = "TEA"
@@ -16,6 +17,8 @@ class Paciente(db.Model):
     responsavel = db.Column(db.String(100), nullable=False)
     contato = db.Column(db.String(50), nullable=False)
     diagnostico = db.Column(db.Enum(DiagnosticoEnum), nullable=False)
+    # Alteração mais recente, usada pela sincronização incremental (/sync)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relacionamentos
     planos_terapeuticos = db.relationship(
@@ -33,6 +36,10 @@ class Paciente(db.Model):
         cascade='all, delete-orphan'
     )
 
+    __table_args__ = (
+        db.Index('idx_pacientes_atualizado_em', 'atualizado_em'),
+    )
+
     def __repr__(self):
         return f'<Paciente {self.nome}>'
 
@@ -43,7 +50,8 @@ class Paciente(db.Model):
             'data_nascimento': self.data_nascimento.isoformat() if self.data_nascimento else None,
             'responsavel': self.responsavel,
             'contato': self.contato,
-            'diagnostico': self.diagnostico.value if self.diagnostico else None
+            'diagnostico': self.diagnostico.value if self.diagnostico else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
         }
 
     def calcular_idade(self):
@@ -52,6 +60,7 @@ class Paciente(db.Model):
     
     def to_dict_com_profissionais(self):
         """Retorna dados do paciente incluindo profissionais vinculados"""
+        vinculos_ativos = self.query_vinculos_ativos().all()
         return {
             'id': self.id,
             'nome': self.nome,
@@ -60,18 +69,24 @@ class Paciente(db.Model):
             'responsavel': self.responsavel,
             'contato': self.contato,
             'diagnostico': self.diagnostico.value if self.diagnostico else None,
-            'profissionais_vinculados': [vinculo.to_dict_completo() for vinculo in self.vinculos_profissionais if vinculo.esta_ativo()],
-            'total_profissionais_ativos': len([v for v in self.vinculos_profissionais if v.esta_ativo()])
+            'profissionais_vinculados': [vinculo.to_dict_completo() for vinculo in vinculos_ativos],
+            'total_profissionais_ativos': len(vinculos_ativos)
         }
     
+    def query_vinculos_ativos(self):
+        """Query dos vínculos ativos do paciente, filtrados no banco"""
+        return ProfissionalPaciente.query_ativos().filter(ProfissionalPaciente.paciente_id == self.id)
+    
     def obter_profissionais_ativos(self):
         """Retorna lista de profissionais com vínculo ativo"""
-        return [vinculo.profissional for vinculo in self.vinculos_profissionais if vinculo.esta_ativo()]
+        return [vinculo.profissional for vinculo in self.query_vinculos_ativos()]
     
     def tem_vinculo_com_profissional(self, profissional_id):
         """Verifica se tem vínculo ativo com um profissional específico"""
-        return any(v.profissional_id == profissional_id and v.esta_ativo() for v in self.vinculos_profissionais)
+        return db.session.query(
+            self.query_vinculos_ativos().filter(ProfissionalPaciente.profissional_id == profissional_id).exists()
+        ).scalar()
     
     def obter_tipos_atendimento(self):
         """Retorna lista de tipos de atendimento ativos"""
-        return [v.tipo_atendimento.value for v in self.vinculos_profissionais if v.esta_ativo()]
+        return [tipo.value for (tipo,) in self.query_vinculos_ativos().with_entities(ProfissionalPaciente.tipo_atendimento)]
@@ -1,5 +1,9 @@
+from datetime import datetime
 from enum import Enum
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 from . import db
+from .formulario import Formulario
 
 # Enum padronizado com letras maiúsculas para coincidir com o banco
 class TipoPerguntaEnum(Enum):
@@ -19,6 +23,15 @@ class Pergunta(db.Model):
     ordem = db.Column(db.Integer, nullable=False)
     formulario_id = db.Column(db.Integer, db.ForeignKey("formularios.id"), nullable=False)
     formula = db.Column(db.Text, nullable=True)  # Campo para armazenar a fórmula
+    grupo = db.Column(db.String(50), nullable=True)  # Tag usada em fórmulas de agregação (#grupo)
+    # Valor acumulado das últimas N sessões da meta (ex.: média móvel de 7 sessões)
+    janela_sessoes = db.Column(db.Integer, nullable=True)
+    agregacao_janela = db.Column(db.String(20), nullable=True)  # soma, media, contar_sim ou percentual
+
+    # Perguntas são sempre buscadas por formulário, na ordem de exibição
+    __table_args__ = (
+        db.Index('idx_perguntas_formulario_ordem', 'formulario_id', 'ordem'),
+    )
 
     def to_dict(self):
         return {
@@ -28,5 +41,32 @@ class Pergunta(db.Model):
             "obrigatoria": self.obrigatoria,
             "ordem": self.ordem,
             "formulario_id": self.formulario_id,
-            "formula": self.formula
+            "formula": self.formula,
+            "grupo": self.grupo,
+            "janela_sessoes": self.janela_sessoes,
+            "agregacao_janela": self.agregacao_janela
         }
+
+
+@event.listens_for(Session, 'before_flush')
+def atualizar_versao_formulario(session, flush_context, instances):
+    """
+    Alterações em perguntas atualizam atualizado_em do formulário, que serve
+    de versão para o cache de esquemas de formulário (src.services.esquema_formulario)
+    """
+    formulario_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Pergunta):
+            historico = inspect(obj).attrs.formulario_id.history
+            formulario_ids.update(i for i in historico.sum() if i is not None)
+            if obj.formulario_id is not None:
+                formulario_ids.add(obj.formulario_id)
+
+    if not formulario_ids:
+        return
+    agora = datetime.utcnow()
+    with session.no_autoflush:
+        for formulario_id in formulario_ids:
+            formulario = session.get(Formulario, formulario_id)
+            if formulario is not None and formulario not in session.deleted:
+                formulario.atualizado_em = agora
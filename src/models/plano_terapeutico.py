@@ -26,6 +26,11 @@ class PlanoTerapeutico(db.Model):
         cascade='all, delete-orphan'
     )
 
+    __table_args__ = (
+        db.Index('idx_planos_paciente', 'paciente_id'),
+        db.Index('idx_planos_profissional', 'profissional_id'),
+    )
+
     def __repr__(self):
         return f'<PlanoTerapeutico {self.id}>'
 
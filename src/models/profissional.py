@@ -1,4 +1,5 @@
 from . import db
+from .profissional_paciente import ProfissionalPaciente
 
 class Profissional(db.Model):
     __tablename__ = 'profissionais'
@@ -39,20 +40,27 @@ class Profissional(db.Model):
     
     def to_dict_com_pacientes(self):
         """Retorna dados do profissional incluindo pacientes vinculados"""
+        vinculos_ativos = self.query_vinculos_ativos().all()
         return {
             'id': self.id,
             'nome': self.nome,
             'especialidade': self.especialidade,
             'email': self.email,
             'telefone': self.telefone,
-            'pacientes_vinculados': [vinculo.to_dict_completo() for vinculo in self.vinculos_pacientes if vinculo.esta_ativo()],
-            'total_pacientes_ativos': len([v for v in self.vinculos_pacientes if v.esta_ativo()])
+            'pacientes_vinculados': [vinculo.to_dict_completo() for vinculo in vinculos_ativos],
+            'total_pacientes_ativos': len(vinculos_ativos)
         }
     
+    def query_vinculos_ativos(self):
+        """Query dos vínculos ativos do profissional, filtrados no banco"""
+        return ProfissionalPaciente.query_ativos().filter(ProfissionalPaciente.profissional_id == self.id)
+    
     def obter_pacientes_ativos(self):
         """Retorna lista de pacientes com vínculo ativo"""
-        return [vinculo.paciente for vinculo in self.vinculos_pacientes if vinculo.esta_ativo()]
+        return [vinculo.paciente for vinculo in self.query_vinculos_ativos()]
     
     def tem_vinculo_com_paciente(self, paciente_id):
         """Verifica se tem vínculo ativo com um paciente específico"""
-        return any(v.paciente_id == paciente_id and v.esta_ativo() for v in self.vinculos_pacientes)
+        return db.session.query(
+            self.query_vinculos_ativos().filter(ProfissionalPaciente.paciente_id == paciente_id).exists()
+        ).scalar()
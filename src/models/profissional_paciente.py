@@ -1,5 +1,6 @@
-from datetime import date
+from datetime import date, datetime
 from enum import Enum
+from sqlalchemy.orm import joinedload
 from . import db
 
 class StatusVinculoEnum(Enum):
@@ -44,21 +45,35 @@ class ProfissionalPaciente(db.Model):
     # Dados de controle
     data_criacao = db.Column(db.Date, nullable=False, default=date.today)
     criado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relacionamentos
     profissional = db.relationship('Profissional', back_populates='vinculos_pacientes')
     paciente = db.relationship('Paciente', back_populates='vinculos_profissionais')
     usuario_criador = db.relationship('Usuario', foreign_keys=[criado_por])
     
-    # Constraint para evitar duplicatas
+    # Constraint para evitar duplicatas e índices das listagens filtradas por status
     __table_args__ = (
         db.UniqueConstraint('profissional_id', 'paciente_id', 'tipo_atendimento', 
                           name='unique_profissional_paciente_tipo'),
+        db.Index('idx_vinculo_profissional_status', 'profissional_id', 'status'),
+        db.Index('idx_vinculo_paciente_status', 'paciente_id', 'status'),
+        db.Index('idx_vinculo_atualizado_em', 'atualizado_em'),
     )
     
     def __repr__(self):
         return f'<ProfissionalPaciente {self.profissional_id}-{self.paciente_id}>'
     
+    @classmethod
+    def query_completa(cls):
+        """Query que já carrega profissional e paciente no mesmo SELECT (usada com to_dict_completo)"""
+        return cls.query.options(joinedload(cls.profissional), joinedload(cls.paciente))
+    
+    @classmethod
+    def query_ativos(cls):
+        """Vínculos ativos, com o filtro de status aplicado no banco"""
+        return cls.query_completa().filter(cls.status == StatusVinculoEnum.ATIVO)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,120 @@
+from datetime import datetime
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+from . import db
+from .paciente import Paciente
+from .agenda import Agenda
+from .plano_terapeutico import PlanoTerapeutico
+from .meta_terapeutica import MetaTerapeutica, meta_formulario
+from .checklist_diario import ChecklistDiario
+from .checklist_respostas import ChecklistResposta
+from .profissional_paciente import ProfissionalPaciente
+from .formulario import Formulario
+from .pergunta import Pergunta
+
+# Entidades acompanhadas pela sincronização incremental (/sync)
+MODELOS_SINCRONIZADOS = (Paciente, Agenda, MetaTerapeutica, ChecklistDiario)
+# Também recebem tombstone os vínculos, para a sincronização saber quem perdeu acesso a um paciente excluído
+MODELOS_COM_EXCLUSAO = MODELOS_SINCRONIZADOS + (ProfissionalPaciente,)
+
+
+class RegistroExclusao(db.Model):
+    """Marca (tombstone) de um registro excluído, para que os clientes possam removê-lo na sincronização"""
+    __tablename__ = 'registros_exclusao'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tabela = db.Column(db.String(50), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+    excluido_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Paciente dono do registro (filtra as exclusões pelo acesso) e, nos vínculos, o profissional
+    paciente_id = db.Column(db.Integer, nullable=True)
+    profissional_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_registros_exclusao_excluido_em', 'excluido_em'),
+    )
+
+    def to_dict(self):
+        return {
+            'tabela': self.tabela,
+            'registro_id': self.registro_id,
+            'excluido_em': self.excluido_em.isoformat() if self.excluido_em else None
+        }
+
+
+@event.listens_for(Session, 'before_flush')
+def registrar_alteracoes(session, flush_context, instances):
+    """
+    Mantém o controle de alterações das entidades sincronizadas:
+    grava tombstones das exclusões e atualiza atualizado_em quando só
+    relacionamentos mudaram (ex.: respostas de um checklist, formulários de uma meta)
+    ou quando mudou um formulário/pergunta, que metas e checklists incluem no to_dict()
+    """
+    agora = datetime.utcnow()
+
+    excluidos = [obj for obj in session.deleted if isinstance(obj, MODELOS_COM_EXCLUSAO) and obj.id is not None]
+    if excluidos:
+        with session.no_autoflush:
+            pacientes_metas = _pacientes_das_metas(excluidos)
+        for obj in excluidos:
+            session.add(RegistroExclusao(
+                tabela=obj.__tablename__, registro_id=obj.id, excluido_em=agora,
+                paciente_id=_paciente_do_registro(obj, pacientes_metas),
+                profissional_id=obj.profissional_id if isinstance(obj, ProfissionalPaciente) else None
+            ))
+
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, ChecklistResposta):
+                checklist = obj.checklist
+                if checklist is not None and checklist not in session.deleted:
+                    checklist.atualizado_em = agora
+            elif (isinstance(obj, MODELOS_SINCRONIZADOS) and obj in session.dirty
+                  and session.is_modified(obj, include_collections=True)):
+                obj.atualizado_em = agora
+
+        formulario_ids = _formularios_alterados(session)
+        if formulario_ids:
+            # Em lote, sem carregar as metas e os checklists dos formulários
+            metas = select(meta_formulario.c.meta_id).where(meta_formulario.c.formulario_id.in_(formulario_ids))
+            for modelo, coluna in ((MetaTerapeutica, MetaTerapeutica.id), (ChecklistDiario, ChecklistDiario.meta_id)):
+                session.execute(
+                    update(modelo).where(coluna.in_(metas)).values(atualizado_em=agora),
+                    execution_options={'synchronize_session': False}
+                )
+
+
+def _formularios_alterados(session):
+    """Ids dos formulários já gravados que foram alterados ou excluídos, ou tiveram perguntas alteradas"""
+    formulario_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Pergunta):
+            formulario_ids.update(inspect(obj).attrs.formulario_id.history.sum())
+            formulario_ids.add(obj.formulario_id)
+        elif isinstance(obj, Formulario):
+            formulario_ids.add(obj.id)
+    formulario_ids.discard(None)
+    return formulario_ids
+
+
+def _pacientes_das_metas(registros):
+    """{meta_id: paciente_id} das metas excluídas e das metas dos checklists excluídos, em uma consulta"""
+    meta_ids = {obj.id for obj in registros if isinstance(obj, MetaTerapeutica)}
+    meta_ids |= {obj.meta_id for obj in registros if isinstance(obj, ChecklistDiario)}
+    if not meta_ids:
+        return {}
+    return dict(db.session.query(MetaTerapeutica.id, PlanoTerapeutico.paciente_id).join(
+        PlanoTerapeutico, PlanoTerapeutico.id == MetaTerapeutica.plano_id
+    ).filter(MetaTerapeutica.id.in_(meta_ids)))
+
+
+def _paciente_do_registro(obj, pacientes_metas):
+    if isinstance(obj, Paciente):
+        return obj.id
+    if isinstance(obj, (Agenda, ProfissionalPaciente)):
+        return obj.paciente_id
+    if isinstance(obj, MetaTerapeutica):
+        return pacientes_metas.get(obj.id)
+    return pacientes_metas.get(obj.meta_id)
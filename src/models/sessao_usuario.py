@@ -0,0 +1,24 @@
+from datetime import datetime
+from . import db
+
+
+class SessaoUsuario(db.Model):
+    """
+    Sessão de login com refresh token. Guarda apenas o hash (SHA-256) do token;
+    logout e revogação excluem a linha
+    """
+    __tablename__ = 'sessoes_usuario'
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
+    token_hash = db.Column(db.String(64), nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_sessoes_usuario_usuario', 'usuario_id'),
+        db.Index('idx_sessoes_usuario_expira_em', 'expira_em'),
+    )
+
+    def __repr__(self):
+        return f'<SessaoUsuario {self.id} usuario={self.usuario_id}>'
@@ -0,0 +1,51 @@
+from datetime import datetime
+from enum import Enum
+from . import db
+
+
+class StatusTarefaEnum(Enum):
+    PENDENTE = "Pendente"
+    EXECUTANDO = "Executando"
+    CONCLUIDA = "Concluída"
+    ERRO = "Erro"
+
+
+class Tarefa(db.Model):
+    """
+    Execução em segundo plano de um relatório pesado. O resultado fica gravado
+    (JSON já serializado) até ser removido pela limpeza periódica
+    """
+    __tablename__ = 'tarefas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    parametros = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.Enum(StatusTarefaEnum), nullable=False, default=StatusTarefaEnum.PENDENTE)
+    # Carregado só no download: a consulta de status não traz o JSON do relatório
+    resultado = db.deferred(db.Column(db.Text))
+    erro = db.Column(db.Text)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'))
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_tarefas_usuario_criado_em', 'usuario_id', 'criado_em'),
+        db.Index('idx_tarefas_status_criado_em', 'status', 'criado_em'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'parametros': self.parametros,
+            'status': self.status.value if self.status else None,
+            'erro': self.erro,
+            'usuario_id': self.usuario_id,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None
+        }
+
+    def __repr__(self):
+        return f'<Tarefa {self.id} {self.tipo} {self.status}>'
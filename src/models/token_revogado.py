@@ -0,0 +1,19 @@
+from datetime import datetime
+from . import db
+
+
+class TokenRevogado(db.Model):
+    """Token de acesso (jti) revogado antes de expirar. Pode ser removido após expira_em"""
+    __tablename__ = 'tokens_revogados'
+
+    jti = db.Column(db.String(32), primary_key=True)
+    expira_em = db.Column(db.DateTime, nullable=False)
+    revogado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_tokens_revogados_expira_em', 'expira_em'),
+        db.Index('idx_tokens_revogados_revogado_em', 'revogado_em'),
+    )
+
+    def __repr__(self):
+        return f'<TokenRevogado {self.jti}>'
@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 from enum import Enum
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
@@ -18,6 +18,7 @@ class Usuario(db.Model):
     tipo_usuario = db.Column(db.Enum(TipoUsuarioEnum), nullable=False)
     ativo = db.Column(db.Boolean, default=True, nullable=False)
     data_criacao = db.Column(db.Date, nullable=False, default=date.today)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relacionamentos específicos por tipo
     profissional_id = db.Column(db.Integer, db.ForeignKey('profissionais.id'), nullable=True)
@@ -27,6 +28,12 @@ class Usuario(db.Model):
     profissional = db.relationship('Profissional', backref='usuario', uselist=False)
     paciente = db.relationship('Paciente', backref='responsavel_usuario', uselist=False)
     
+    __table_args__ = (
+        db.Index('idx_usuarios_profissional', 'profissional_id'),
+        db.Index('idx_usuarios_paciente', 'paciente_id'),
+        db.Index('idx_usuarios_atualizado_em', 'atualizado_em'),
+    )
+    
     def __repr__(self):
         return f'<Usuario {self.email}>'
     
@@ -52,13 +59,10 @@ class Usuario(db.Model):
     
     def pode_acessar_paciente(self, paciente_id):
         """Verifica se o usuário pode acessar dados de um paciente específico"""
-        if self.tipo_usuario == TipoUsuarioEnum.PROFISSIONAL:
-            # Profissionais podem acessar pacientes que atendem
-            return True  # Por simplicidade, profissionais podem ver todos os pacientes
-        elif self.tipo_usuario == TipoUsuarioEnum.RESPONSAVEL:
-            # Responsáveis só podem acessar dados do próprio filho
-            return self.paciente_id == paciente_id
-        return False
+        from src.services.acesso import pacientes_acessiveis
+        # Profissionais: pacientes com vínculo ativo; responsáveis: o próprio filho; admin: todos
+        pacientes = pacientes_acessiveis(self)
+        return pacientes is None or paciente_id in pacientes
     
     def pode_editar_dados(self):
         """Verifica se o usuário pode editar dados do sistema"""
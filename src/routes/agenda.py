@@ -2,14 +2,10 @@ import logging
 from flask import Blueprint, request, jsonify
 from datetime import datetime, date
 from src.models import db, Agenda, Paciente, Profissional, StatusAgendamentoEnum
+from src.services.acesso import pacientes_da_requisicao, pode_acessar_paciente, restringir_pacientes
+from src.services.autenticacao import requer_permissao
 
-# Configurar logger
-logger = logging.getLogger('agenda_logger')
-logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler()
-formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = logging.getLogger(__name__)
 
 agenda_bp = Blueprint('agenda', __name__)
 
@@ -49,7 +45,7 @@ def listar_agendamentos():
         description: Lista de agendamentos
     """
     try:
-        query = Agenda.query
+        query = restringir_pacientes(Agenda.query, Agenda.paciente_id)
         
         # Filtros opcionais
         profissional_id = request.args.get('profissional_id', type=int)
@@ -88,7 +84,7 @@ def listar_agendamentos():
                 return jsonify({'erro': 'Formato de data_fim inválido. Use YYYY-MM-DD'}), 400
         
         agendamentos = query.order_by(Agenda.data_hora).all()
-        logger.info(f"Listando {len(agendamentos)} agendamentos")
+        logger.debug("Listando %s agendamentos", len(agendamentos))
         
         return jsonify([agenda.to_dict() for agenda in agendamentos]), 200
         
@@ -118,14 +114,17 @@ def obter_agendamento(agenda_id):
     """
     try:
         agenda = Agenda.query.get_or_404(agenda_id)
-        logger.info(f"Agendamento obtido: ID {agenda.id}")
+        if not pode_acessar_paciente(agenda.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
+        logger.debug("Agendamento obtido: ID %s", agenda.id)
         return jsonify(agenda.to_dict()), 200
     except Exception as e:
-        logger.exception(f"Erro ao obter agendamento ID {agenda_id}")
+        logger.exception("Erro ao obter agendamento ID %s", agenda_id)
         return jsonify({'erro': str(e)}), 500
 
 # --- CRIAR ---
 @agenda_bp.route('/agenda', methods=['POST'])
+@requer_permissao('editar_dados')
 def criar_agendamento():
     """
     Cria um novo agendamento
@@ -167,18 +166,20 @@ def criar_agendamento():
     """
     try:
         dados = request.get_json()
-        logger.debug(f"Dados recebidos para criar agendamento: {dados}")
+        logger.debug("Dados recebidos para criar agendamento", extra={'dados': dados})
 
         # Validações obrigatórias
         for campo in ['data_hora', 'paciente_id', 'profissional_id']:
             if not dados.get(campo):
-                logger.warning(f"Campo obrigatório ausente: {campo}")
+                logger.warning("Campo obrigatório ausente: %s", campo)
                 return jsonify({'erro': f'{campo} é obrigatório'}), 400
 
         # Validar se paciente existe
         paciente = Paciente.query.get(dados['paciente_id'])
         if not paciente:
             return jsonify({'erro': 'Paciente não encontrado'}), 400
+        if not pode_acessar_paciente(paciente.id):
+            return jsonify({'erro': 'Acesso negado'}), 403
 
         # Validar se profissional existe
         profissional = Profissional.query.get(dados['profissional_id'])
@@ -235,7 +236,7 @@ def criar_agendamento():
         db.session.add(agenda)
         db.session.commit()
 
-        logger.info(f"Agendamento criado: ID {agenda.id}")
+        logger.info("Agendamento criado: ID %s", agenda.id)
         return jsonify(agenda.to_dict()), 201
 
     except Exception as e:
@@ -245,6 +246,7 @@ def criar_agendamento():
 
 # --- ATUALIZAR ---
 @agenda_bp.route('/agenda/<int:agenda_id>', methods=['PUT'])
+@requer_permissao('editar_dados')
 def atualizar_agendamento(agenda_id):
     """
     Atualiza um agendamento existente
@@ -286,8 +288,10 @@ def atualizar_agendamento(agenda_id):
     """
     try:
         agenda = Agenda.query.get_or_404(agenda_id)
+        if not pode_acessar_paciente(agenda.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         dados = request.get_json()
-        logger.debug(f"Atualizando agendamento ID {agenda_id} com dados: {dados}")
+        logger.debug("Atualizando agendamento ID %s", agenda_id, extra={'dados': dados})
 
         # Atualizar campos
         if 'data_hora' in dados:
@@ -326,6 +330,8 @@ def atualizar_agendamento(agenda_id):
             paciente = Paciente.query.get(dados['paciente_id'])
             if not paciente:
                 return jsonify({'erro': 'Paciente não encontrado'}), 400
+            if not pode_acessar_paciente(paciente.id):
+                return jsonify({'erro': 'Acesso negado'}), 403
             agenda.paciente_id = dados['paciente_id']
 
         if 'profissional_id' in dados:
@@ -345,16 +351,17 @@ def atualizar_agendamento(agenda_id):
                 return jsonify({'erro': 'Conflito de horário com outro agendamento'}), 400
 
         db.session.commit()
-        logger.info(f"Agendamento atualizado: ID {agenda.id}")
+        logger.info("Agendamento atualizado: ID %s", agenda.id)
         return jsonify(agenda.to_dict()), 200
 
     except Exception as e:
         db.session.rollback()
-        logger.exception(f"Erro ao atualizar agendamento ID {agenda_id}")
+        logger.exception("Erro ao atualizar agendamento ID %s", agenda_id)
         return jsonify({'erro': str(e)}), 500
 
 # --- DELETAR ---
 @agenda_bp.route('/agenda/<int:agenda_id>', methods=['DELETE'])
+@requer_permissao('editar_dados')
 def deletar_agendamento(agenda_id):
     """
     Deleta um agendamento
@@ -374,13 +381,15 @@ def deletar_agendamento(agenda_id):
     """
     try:
         agenda = Agenda.query.get_or_404(agenda_id)
+        if not pode_acessar_paciente(agenda.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         db.session.delete(agenda)
         db.session.commit()
-        logger.info(f"Agendamento deletado: ID {agenda.id}")
+        logger.info("Agendamento deletado: ID %s", agenda.id)
         return jsonify({'mensagem': 'Agendamento deletado com sucesso'}), 200
     except Exception as e:
         db.session.rollback()
-        logger.exception(f"Erro ao deletar agendamento ID {agenda_id}")
+        logger.exception("Erro ao deletar agendamento ID %s", agenda_id)
         return jsonify({'erro': str(e)}), 500
 
 # --- AGENDAMENTOS POR MÊS ---
@@ -429,14 +438,14 @@ def agendamentos_por_mes(ano, mes):
         paciente_id = request.args.get('paciente_id', type=int)
 
         agendamentos = Agenda.get_agendamentos_por_mes(
-            ano, mes, profissional_id, paciente_id
+            ano, mes, profissional_id, paciente_id, pacientes_da_requisicao()
         )
 
-        logger.info(f"Agendamentos do mês {mes}/{ano}: {len(agendamentos)} encontrados")
+        logger.debug("Agendamentos do mês %s/%s: %s encontrados", mes, ano, len(agendamentos))
         return jsonify([agenda.to_dict() for agenda in agendamentos]), 200
 
     except Exception as e:
-        logger.exception(f"Erro ao listar agendamentos do mês {mes}/{ano}")
+        logger.exception("Erro ao listar agendamentos do mês %s/%s", mes, ano)
         return jsonify({'erro': str(e)}), 500
 
 # --- AGENDAMENTOS POR DIA ---
@@ -478,18 +487,19 @@ def agendamentos_por_dia(data):
         paciente_id = request.args.get('paciente_id', type=int)
 
         agendamentos = Agenda.get_agendamentos_por_dia(
-            data_obj, profissional_id, paciente_id
+            data_obj, profissional_id, paciente_id, pacientes_da_requisicao()
         )
 
-        logger.info(f"Agendamentos do dia {data}: {len(agendamentos)} encontrados")
+        logger.debug("Agendamentos do dia %s: %s encontrados", data, len(agendamentos))
         return jsonify([agenda.to_dict() for agenda in agendamentos]), 200
 
     except Exception as e:
-        logger.exception(f"Erro ao listar agendamentos do dia {data}")
+        logger.exception("Erro ao listar agendamentos do dia %s", data)
         return jsonify({'erro': str(e)}), 500
 
 # --- ATUALIZAR PRESENÇA ---
 @agenda_bp.route('/agenda/<int:agenda_id>/presenca', methods=['PATCH'])
+@requer_permissao('registrar_progresso')
 def atualizar_presenca_agendamento(agenda_id):
     """
     Atualiza apenas a presença de um agendamento
@@ -522,6 +532,8 @@ def atualizar_presenca_agendamento(agenda_id):
     """
     try:
         agenda = Agenda.query.get_or_404(agenda_id)
+        if not pode_acessar_paciente(agenda.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         dados = request.get_json()
 
         if 'presente' not in dados:
@@ -534,16 +546,17 @@ def atualizar_presenca_agendamento(agenda_id):
         agenda.presente = dados['presente']
         db.session.commit()
         
-        logger.info(f"Presença do agendamento ID {agenda_id} atualizada para {agenda.presente}")
+        logger.info("Presença do agendamento ID %s atualizada para %s", agenda_id, agenda.presente)
         return jsonify(agenda.to_dict()), 200
 
     except Exception as e:
         db.session.rollback()
-        logger.exception(f"Erro ao atualizar presença do agendamento ID {agenda_id}")
+        logger.exception("Erro ao atualizar presença do agendamento ID %s", agenda_id)
         return jsonify({'erro': str(e)}), 500
 
 # --- ATUALIZAR STATUS ---
 @agenda_bp.route('/agenda/<int:agenda_id>/status', methods=['PATCH'])
+@requer_permissao('registrar_progresso')
 def atualizar_status_agendamento(agenda_id):
     """
     Atualiza apenas o status de um agendamento
@@ -576,6 +589,8 @@ def atualizar_status_agendamento(agenda_id):
     """
     try:
         agenda = Agenda.query.get_or_404(agenda_id)
+        if not pode_acessar_paciente(agenda.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         dados = request.get_json()
 
         if 'status' not in dados:
@@ -596,10 +611,10 @@ def atualizar_status_agendamento(agenda_id):
             return jsonify({'erro': 'Status inválido. Valores aceitos: AGENDADO, CONFIRMADO, CANCELADO, REALIZADO, FALTOU'}), 400
 
         db.session.commit()
-        logger.info(f"Status do agendamento ID {agenda_id} atualizado para {agenda.status.value}")
+        logger.info("Status do agendamento ID %s atualizado para %s", agenda_id, agenda.status.value)
         return jsonify(agenda.to_dict()), 200
 
     except Exception as e:
         db.session.rollback()
-        logger.exception(f"Erro ao atualizar status do agendamento ID {agenda_id}")
+        logger.exception("Erro ao atualizar status do agendamento ID %s", agenda_id)
         return jsonify({'erro': str(e)}), 500
@@ -1,16 +1,24 @@
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime, timedelta
+import click
+from flask import Blueprint, request, jsonify, session, g
 from src.models import db, Usuario, Profissional, Paciente, TipoUsuarioEnum
-import jwt
-import os
+from src.services.autenticacao import (
+    ErroAutenticacao, autenticar, autenticar_requisicao, decodificar_token, extrair_token, publico,
+    requer_permissao
+)
+from src.services.revogacao import revogar_payload
+from src.services.sessoes import (
+    ServidorOcupado, criar_sessao, encerrar_sessao, encerrar_sessoes_usuario, gerar_hash_senha,
+    gerar_token_acesso, limpar_sessoes_expiradas, renovar_sessao, validade_acesso_minutos,
+    validade_refresh_dias, verificar_senha
+)
 
 auth_bp = Blueprint('auth', __name__)
 
-# Chave secreta para JWT (em produção, usar variável de ambiente)
-JWT_SECRET = os.environ.get('JWT_SECRET', 'sua-chave-secreta-super-segura')
-JWT_EXPIRATION_HOURS = 24
+# Autenticação única para todas as rotas /api (exceto as marcadas com @publico)
+auth_bp.before_app_request(autenticar_requisicao)
 
 @auth_bp.route('/auth/login', methods=['POST'])
+@publico
 def login():
     """Realiza login do usuário"""
     try:
@@ -25,21 +33,17 @@ def login():
         # Buscar usuário
         usuario = Usuario.query.filter_by(email=dados['email']).first()
         
-        if not usuario or not usuario.verificar_senha(dados['senha']):
+        # Hash da senha verificado no pool limitado de threads
+        if not usuario or not verificar_senha(usuario.senha_hash, dados['senha']):
             return jsonify({'erro': 'Email ou senha incorretos'}), 401
         
         if not usuario.ativo:
             return jsonify({'erro': 'Usuário inativo'}), 401
         
-        # Gerar token JWT
-        payload = {
-            'user_id': usuario.id,
-            'email': usuario.email,
-            'tipo_usuario': usuario.tipo_usuario.value,
-            'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
-        }
-        
-        token = jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+        # Token de acesso curto + refresh token da sessão (renovado em /auth/refresh sem senha)
+        sessao, refresh_token = criar_sessao(usuario)
+        token = gerar_token_acesso(usuario, sessao.id)
+        db.session.commit()
         
         # Dados do usuário para retorno
         user_data = usuario.to_dict()
@@ -52,16 +56,65 @@ def login():
         
         return jsonify({
             'token': token,
+            'refresh_token': refresh_token,
             'usuario': user_data,
-            'expires_in': JWT_EXPIRATION_HOURS * 3600  # em segundos
+            'expires_in': validade_acesso_minutos() * 60,  # em segundos
+            'refresh_expires_in': validade_refresh_dias() * 86400
+        }), 200
+        
+    except ServidorOcupado as e:
+        return jsonify({'erro': str(e)}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@auth_bp.route('/auth/refresh', methods=['POST'])
+@publico
+def refresh():
+    """
+    Renova o token de acesso a partir do refresh token, sem verificar a senha
+    ---
+    tags:
+      - Autenticação
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            refresh_token: { type: string }
+    responses:
+      200:
+        description: Novo token de acesso e novo refresh token (o anterior deixa de valer)
+      401:
+        description: Refresh token inválido, expirado ou sessão encerrada
+    """
+    try:
+        dados = request.get_json(silent=True) or {}
+        try:
+            usuario, sessao, refresh_token = renovar_sessao(dados.get('refresh_token'))
+        except ErroAutenticacao as e:
+            return jsonify({'erro': str(e)}), 401
+        
+        token = gerar_token_acesso(usuario, sessao.id)
+        db.session.commit()
+        
+        return jsonify({
+            'token': token,
+            'refresh_token': refresh_token,
+            'expires_in': validade_acesso_minutos() * 60,
+            'refresh_expires_in': validade_refresh_dias() * 86400
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
 @auth_bp.route('/auth/register', methods=['POST'])
+@requer_permissao('administrar')
 def register():
-    """Registra um novo usuário"""
+    """Registra um novo usuário (somente administradores)"""
     try:
         dados = request.get_json()
         
@@ -124,7 +177,7 @@ def register():
             paciente_id=dados.get('paciente_id')
         )
         
-        usuario.set_senha(dados['senha'])
+        usuario.senha_hash = gerar_hash_senha(dados['senha'])
         
         db.session.add(usuario)
         db.session.commit()
@@ -134,38 +187,26 @@ def register():
             'usuario': usuario.to_dict()
         }), 201
         
+    except ServidorOcupado as e:
+        return jsonify({'erro': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
 @auth_bp.route('/auth/verify-token', methods=['POST'])
+@publico
 def verify_token():
     """Verifica se o token JWT é válido"""
     try:
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'erro': 'Token não fornecido'}), 401
-        
-        # Remover 'Bearer ' do início se presente
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        # Decodificar token
         try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return jsonify({'erro': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'erro': 'Token inválido'}), 401
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(payload['user_id'])
-        if not usuario or not usuario.ativo:
-            return jsonify({'erro': 'Usuário não encontrado ou inativo'}), 401
-        
-        # Dados do usuário para retorno
+            usuario_autenticado = autenticar(extrair_token())
+        except ErroAutenticacao as e:
+            return jsonify({'erro': str(e)}), 401
+
+        # Dados completos do usuário apenas nesta rota (as demais usam o cache do middleware)
+        usuario = Usuario.query.get(usuario_autenticado.id)
         user_data = usuario.to_dict()
+        user_data['permissoes'] = sorted(usuario_autenticado.permissoes)
         
         # Adicionar informações específicas do tipo de usuário
         if usuario.tipo_usuario == TipoUsuarioEnum.PROFISSIONAL and usuario.profissional:
@@ -182,35 +223,37 @@ def verify_token():
         return jsonify({'erro': str(e)}), 500
 
 @auth_bp.route('/auth/logout', methods=['POST'])
+@publico
 def logout():
-    """Realiza logout do usuário"""
-    # Em uma implementação com JWT, o logout é feito no frontend removendo o token
-    # Aqui podemos implementar uma blacklist de tokens se necessário
-    return jsonify({'mensagem': 'Logout realizado com sucesso'}), 200
+    """
+    Realiza logout do usuário encerrando a sessão de refresh e revogando o token de acesso
+    Aceita o refresh_token no corpo e/ou o token de acesso no header (mesmo expirado)
+    """
+    try:
+        dados = request.get_json(silent=True) or {}
+        try:
+            if not dados.get('refresh_token') and not extrair_token():
+                return jsonify({'erro': 'Token não fornecido'}), 401
+            if dados.get('refresh_token'):
+                encerrar_sessao(refresh_token=dados['refresh_token'])
+            if extrair_token():
+                payload = decodificar_token(extrair_token(), verificar_expiracao=False)
+                encerrar_sessao(sessao_id=payload.get('sid'))
+                revogar_payload(payload)
+        except ErroAutenticacao as e:
+            return jsonify({'erro': str(e)}), 401
+        db.session.commit()
+        return jsonify({'mensagem': 'Logout realizado com sucesso'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
 
 @auth_bp.route('/auth/change-password', methods=['PUT'])
 def change_password():
     """Altera a senha do usuário"""
     try:
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'erro': 'Token não fornecido'}), 401
-        
-        # Remover 'Bearer ' do início se presente
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        # Decodificar token
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return jsonify({'erro': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'erro': 'Token inválido'}), 401
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(payload['user_id'])
+        # Usuário já autenticado pelo middleware
+        usuario = Usuario.query.get(g.usuario.id) if g.get('usuario') else None
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
         
@@ -223,15 +266,19 @@ def change_password():
             return jsonify({'erro': 'Nova senha é obrigatória'}), 400
         
         # Verificar senha atual
-        if not usuario.verificar_senha(dados['senha_atual']):
+        if not verificar_senha(usuario.senha_hash, dados['senha_atual']):
             return jsonify({'erro': 'Senha atual incorreta'}), 400
         
-        # Alterar senha
-        usuario.set_senha(dados['nova_senha'])
+        # Alterar senha, encerrar as sessões abertas com a senha anterior e revogar o token atual
+        usuario.senha_hash = gerar_hash_senha(dados['nova_senha'])
+        encerrar_sessoes_usuario(usuario.id)
+        revogar_payload(decodificar_token(extrair_token()))
         db.session.commit()
         
         return jsonify({'mensagem': 'Senha alterada com sucesso'}), 200
         
+    except ServidorOcupado as e:
+        return jsonify({'erro': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
@@ -239,26 +286,16 @@ def change_password():
 # Função auxiliar para verificar autenticação em outras rotas
 def verificar_autenticacao():
     """Função auxiliar para verificar autenticação em outras rotas"""
-    token = request.headers.get('Authorization')
-    
-    if not token:
-        return None, {'erro': 'Token não fornecido'}, 401
-    
-    # Remover 'Bearer ' do início se presente
-    if token.startswith('Bearer '):
-        token = token[7:]
-    
+    if g.get('usuario') is not None:
+        return g.usuario, None, None
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-    except jwt.ExpiredSignatureError:
-        return None, {'erro': 'Token expirado'}, 401
-    except jwt.InvalidTokenError:
-        return None, {'erro': 'Token inválido'}, 401
-    
-    # Buscar usuário
-    usuario = Usuario.query.get(payload['user_id'])
-    if not usuario or not usuario.ativo:
-        return None, {'erro': 'Usuário não encontrado ou inativo'}, 401
-    
-    return usuario, None, None
+        return autenticar(extrair_token()), None, None
+    except ErroAutenticacao as e:
+        return None, {'erro': str(e)}, 401
 
+@auth_bp.cli.command('limpar-sessoes')
+def limpar_sessoes_comando():
+    """Remove as sessões de refresh expiradas"""
+    removidas = limpar_sessoes_expiradas()
+    db.session.commit()
+    click.echo(f'{removidas} sessões expiradas removidas')
@@ -1,16 +1,29 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, date
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from src.models import db, ChecklistDiario, MetaTerapeutica, ChecklistResposta, Pergunta, TipoPerguntaEnum
+from src.services.acesso import pode_acessar_meta, restringir_metas
+from src.services.esquema_formulario import obter_esquema, obter_esquemas
+from src.services.janelas import atualizar_janelas
+from src.services.maestria import atualizar_maestria
+from src.services.autenticacao import requer_permissao
 
 checklist_diario_bp = Blueprint('checklist_diario', __name__)
 
+# Tamanho da coluna chave_idempotencia
+TAMANHO_MAXIMO_CHAVE = 64
+
+# Quantidade máxima de checklists aceitos em POST /checklists-diarios/lote
+TAMANHO_MAXIMO_LOTE = 500
+
 # --------------------------
 # Listagens
 # --------------------------
 @checklist_diario_bp.route('/checklists-diarios', methods=['GET'])
 def listar_checklists():
     try:
-        checklists = ChecklistDiario.query.all()
+        checklists = restringir_metas(ChecklistDiario.query, ChecklistDiario.meta_id).all()
         return jsonify([c.to_dict() for c in checklists]), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -19,6 +32,8 @@ def listar_checklists():
 def obter_checklist(checklist_id):
     try:
         checklist = ChecklistDiario.query.get_or_404(checklist_id)
+        if not pode_acessar_meta(checklist.meta_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         return jsonify(checklist.to_dict()), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -26,7 +41,8 @@ def obter_checklist(checklist_id):
 @checklist_diario_bp.route('/checklists-diarios/meta/<int:meta_id>', methods=['GET'])
 def listar_checklists_por_meta(meta_id):
     try:
-        checklists = ChecklistDiario.query.filter_by(meta_id=meta_id).order_by(ChecklistDiario.data.desc()).all()
+        query = restringir_metas(ChecklistDiario.query.filter_by(meta_id=meta_id), ChecklistDiario.meta_id)
+        checklists = query.order_by(ChecklistDiario.data.desc()).all()
         return jsonify([c.to_dict() for c in checklists]), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -35,80 +51,371 @@ def listar_checklists_por_meta(meta_id):
 # Criação de checklist
 # --------------------------
 @checklist_diario_bp.route('/checklists-diarios', methods=['POST'])
+@requer_permissao('registrar_progresso')
 def criar_checklist():
+    """
+    Cria um checklist diário com as respostas dos formulários da meta
+    ---
+    tags:
+      - Checklist Diário
+    parameters:
+      - name: Idempotency-Key
+        in: header
+        type: string
+        required: false
+        description: Chave para reenvio seguro (também aceita no campo chave_idempotencia)
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            meta_id:
+              type: integer
+            data:
+              type: string
+              format: date
+            nota:
+              type: integer
+            observacao:
+              type: string
+            respostas:
+              type: object
+            chave_idempotencia:
+              type: string
+    responses:
+      201:
+        description: Checklist criado
+      200:
+        description: Reenvio com a mesma chave de idempotência; retorna o checklist já criado
+      400:
+        description: Dados inválidos ou checklist já existente para a meta na data
+    """
     try:
         dados = request.get_json()
-        meta_id = dados.get('meta_id')
-        nota = dados.get('nota')
-        observacao = dados.get('observacao')
-        respostas_dict = dados.get('respostas', {})  # {pergunta_id: resposta}
+        try:
+            campos = _ler_checklist(dados, request.headers.get('Idempotency-Key'))
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
 
-        # Validações
-        if not meta_id:
-            return jsonify({'erro': 'ID da meta é obrigatório'}), 400
+        meta_id = campos['meta_id']
+        data_checklist = campos['data']
+        nota = campos['nota']
+        observacao = campos['observacao']
+        respostas_dict = campos['respostas']
+        chave = campos['chave_idempotencia']
 
-        meta = MetaTerapeutica.query.get(meta_id)
-        if not meta:
-            return jsonify({'erro': 'Meta terapêutica não encontrada'}), 404
-
-        # Data
-        data_checklist = date.today()
-        if dados.get('data'):
-            try:
-                data_checklist = datetime.strptime(dados['data'], '%Y-%m-%d').date()
-            except ValueError:
-                return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+        # Reenvio com a mesma chave: devolve o checklist já gravado sem recarregar a meta
+        if chave:
+            existente = ChecklistDiario.query.filter_by(chave_idempotencia=chave).first()
+            if existente:
+                return _resposta_reenvio(existente, meta_id, data_checklist)
 
-        # Checklist existente
-        if ChecklistDiario.query.filter_by(meta_id=meta_id, data=data_checklist).first():
-            return jsonify({'erro': 'Já existe um checklist para esta meta nesta data'}), 400
+        if not db.session.query(MetaTerapeutica.query.filter_by(id=meta_id).exists()).scalar():
+            return jsonify({'erro': 'Meta terapêutica não encontrada'}), 404
+        if not pode_acessar_meta(meta_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
 
-        # Criar checklist temporário para validação
-        checklist_temp = ChecklistDiario(meta_id=meta_id, data=data_checklist, nota=nota, observacao=observacao)
-        checklist_temp.meta = meta  # Para poder usar o método de validação
-        
         # Validar respostas obrigatórias
-        valido, mensagem = checklist_temp.validar_respostas(respostas_dict)
+        esquema = obter_esquema(meta_id)
+        valido, mensagem = esquema.validar(respostas_dict)
         if not valido:
             return jsonify({'erro': mensagem}), 400
 
-        # Criar checklist
-        checklist = ChecklistDiario(meta_id=meta_id, data=data_checklist, nota=nota, observacao=observacao)
+        linhas_respostas = esquema.montar_respostas(respostas_dict)
 
-        # Adicionar respostas para todas as perguntas dos formulários vinculados
-        for formulario in meta.formularios:
-            for pergunta in formulario.perguntas:
-                resposta_texto = respostas_dict.get(str(pergunta.id), "")
-                resposta_obj = ChecklistResposta(pergunta_id=pergunta.id, resposta=resposta_texto)
-                
-                # Calcular fórmula se for pergunta do tipo FORMULA
-                if pergunta.tipo.value == 'FORMULA':
-                    resposta_calculada = resposta_obj.calcular_formula(respostas_dict)
-                    resposta_obj.resposta_calculada = resposta_calculada
-                
-                checklist.respostas.append(resposta_obj)
+        # INSERT ... ON CONFLICT DO NOTHING: envios concorrentes não disputam a
+        # constraint unique_meta_data, apenas um deles insere
+        checklist_id = db.session.execute(
+            pg_insert(ChecklistDiario)
+            .values(
+                meta_id=meta_id, data=data_checklist, nota=nota,
+                observacao=observacao, chave_idempotencia=chave
+            )
+            .on_conflict_do_nothing()
+            .returning(ChecklistDiario.id)
+        ).scalar()
+
+        if checklist_id is None:
+            db.session.rollback()
+            if chave:
+                existente = ChecklistDiario.query.filter_by(chave_idempotencia=chave).first()
+                if existente:
+                    return _resposta_reenvio(existente, meta_id, data_checklist)
+            return jsonify({'erro': 'Já existe um checklist para esta meta nesta data'}), 400
+
+        if linhas_respostas:
+            for linha in linhas_respostas:
+                linha['checklist_id'] = checklist_id
+            db.session.execute(insert(ChecklistResposta), linhas_respostas)
+        atualizar_janelas([(meta_id, data_checklist)])
+        atualizar_maestria([(meta_id, data_checklist)])
 
-        db.session.add(checklist)
         db.session.commit()
+        checklist = db.session.get(ChecklistDiario, checklist_id)
         return jsonify(checklist.to_dict()), 201
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
+
+def _ler_checklist(dados, chave=None):
+    """
+    Lê e valida os campos de um checklist enviado pelo cliente
+    Lança ValueError com a mensagem de erro quando inválido
+    """
+    if not isinstance(dados, dict):
+        raise ValueError('Dados do checklist inválidos')
+
+    meta_id = dados.get('meta_id')
+    if not meta_id:
+        raise ValueError('ID da meta é obrigatório')
+    try:
+        meta_id = int(meta_id)
+    except (TypeError, ValueError):
+        raise ValueError('ID da meta inválido')
+
+    chave = chave or dados.get('chave_idempotencia')
+    if chave is not None and not isinstance(chave, str):
+        raise ValueError('Chave de idempotência deve ser um texto')
+    if chave and len(chave) > TAMANHO_MAXIMO_CHAVE:
+        raise ValueError(f'Chave de idempotência deve ter no máximo {TAMANHO_MAXIMO_CHAVE} caracteres')
+
+    data_checklist = date.today()
+    if dados.get('data'):
+        if not isinstance(dados['data'], str):
+            raise ValueError('Formato de data inválido. Use YYYY-MM-DD')
+        try:
+            data_checklist = datetime.strptime(dados['data'], '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Formato de data inválido. Use YYYY-MM-DD')
+
+    # bool é subclasse de int, mas true/false não é uma nota
+    nota = dados.get('nota')
+    if nota is not None and (not isinstance(nota, int) or isinstance(nota, bool)):
+        raise ValueError('Nota deve ser um número inteiro')
+
+    observacao = dados.get('observacao')
+    if observacao is not None and not isinstance(observacao, str):
+        raise ValueError('Observação deve ser um texto')
+
+    respostas = dados.get('respostas') or {}  # {pergunta_id: resposta}
+    if not isinstance(respostas, dict):
+        raise ValueError('Respostas devem ser um objeto {pergunta_id: resposta}')
+
+    return {
+        'meta_id': meta_id,
+        'data': data_checklist,
+        'nota': nota,
+        'observacao': observacao,
+        'respostas': respostas,
+        'chave_idempotencia': chave
+    }
+
+
+def _resposta_reenvio(checklist, meta_id, data_checklist):
+    """Resposta para um envio repetido com chave de idempotência já usada"""
+    if checklist.meta_id != meta_id or checklist.data != data_checklist:
+        return jsonify({'erro': 'Chave de idempotência já utilizada em outro checklist'}), 400
+    if not pode_acessar_meta(meta_id):
+        return jsonify({'erro': 'Acesso negado'}), 403
+    return jsonify(checklist.to_dict()), 200
+
+# --------------------------
+# Criação em lote (sincronização offline)
+# --------------------------
+@checklist_diario_bp.route('/checklists-diarios/lote', methods=['POST'])
+@requer_permissao('registrar_progresso')
+def criar_checklists_lote():
+    """
+    Cria vários checklists de uma vez (sincronização de tablets offline)
+    ---
+    tags:
+      - Checklist Diário
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            checklists:
+              type: array
+              items:
+                type: object
+                description: Mesmo formato do POST /checklists-diarios
+    responses:
+      200:
+        description: Resultado por item (criado, existente ou erro), na ordem enviada
+      400:
+        description: Lote vazio ou acima do limite
+    """
+    try:
+        dados = request.get_json() or {}
+        itens = dados.get('checklists')
+        if not isinstance(itens, list) or not itens:
+            return jsonify({'erro': 'Informe a lista de checklists'}), 400
+        if len(itens) > TAMANHO_MAXIMO_LOTE:
+            return jsonify({'erro': f'O lote deve ter no máximo {TAMANHO_MAXIMO_LOTE} checklists'}), 400
+
+        resultados = [None] * len(itens)
+        campos_por_indice = {}
+        for indice, item in enumerate(itens):
+            try:
+                campos_por_indice[indice] = _ler_checklist(item)
+            except ValueError as e:
+                resultados[indice] = _resultado_lote(indice, 'erro', erro=str(e))
+
+        # Reenvios: chaves de idempotência já gravadas, em uma única consulta
+        chaves = {c['chave_idempotencia'] for c in campos_por_indice.values() if c['chave_idempotencia']}
+        existentes = {}
+        if chaves:
+            existentes = {
+                c.chave_idempotencia: c
+                for c in ChecklistDiario.query.filter(ChecklistDiario.chave_idempotencia.in_(chaves))
+            }
+
+        # Esquemas de formulário de todas as metas do lote obtidos de uma vez
+        meta_ids = {c['meta_id'] for c in campos_por_indice.values()}
+        esquemas = {}
+        if meta_ids:
+            # Metas de pacientes não acessíveis contam como não encontradas
+            existentes_ids = [
+                meta_id for (meta_id,) in restringir_metas(
+                    db.session.query(MetaTerapeutica.id).filter(MetaTerapeutica.id.in_(meta_ids)), MetaTerapeutica.id
+                )
+            ]
+            esquemas = obter_esquemas(existentes_ids) if existentes_ids else {}
+
+        # Validação e cálculo das fórmulas em memória
+        pendentes = {}  # (meta_id, data) -> (indice, campos, linhas_respostas)
+        chaves_no_lote = set()
+        for indice, campos in campos_por_indice.items():
+            chave = campos['chave_idempotencia']
+            if chave in existentes:
+                resultados[indice] = _resultado_reenvio_lote(indice, existentes[chave], campos)
+                continue
+            if chave and chave in chaves_no_lote:
+                resultados[indice] = _resultado_lote(indice, 'erro', erro='Chave de idempotência repetida no lote')
+                continue
+
+            esquema = esquemas.get(campos['meta_id'])
+            if not esquema:
+                resultados[indice] = _resultado_lote(indice, 'erro', erro='Meta terapêutica não encontrada')
+                continue
+
+            identificador = (campos['meta_id'], campos['data'])
+            if identificador in pendentes:
+                resultados[indice] = _resultado_lote(indice, 'erro', erro='Checklist repetido no lote para esta meta nesta data')
+                continue
+
+            valido, mensagem = esquema.validar(campos['respostas'])
+            if not valido:
+                resultados[indice] = _resultado_lote(indice, 'erro', erro=mensagem)
+                continue
+
+            if chave:
+                chaves_no_lote.add(chave)
+            pendentes[identificador] = (indice, campos, esquema.montar_respostas(campos['respostas']))
+
+        if pendentes:
+            # Um único INSERT multi-linha; conflitos (meta/data ou chave já gravados) são ignorados
+            inseridos = db.session.execute(
+                pg_insert(ChecklistDiario)
+                .values([
+                    {
+                        'meta_id': campos['meta_id'],
+                        'data': campos['data'],
+                        'nota': campos['nota'],
+                        'observacao': campos['observacao'],
+                        'chave_idempotencia': campos['chave_idempotencia']
+                    }
+                    for _, campos, _ in pendentes.values()
+                ])
+                .on_conflict_do_nothing()
+                .returning(ChecklistDiario.id, ChecklistDiario.meta_id, ChecklistDiario.data)
+            ).all()
+            ids_inseridos = {(meta_id, data): checklist_id for checklist_id, meta_id, data in inseridos}
+
+            linhas_respostas = []
+            for identificador, (indice, _, linhas) in pendentes.items():
+                checklist_id = ids_inseridos.get(identificador)
+                if checklist_id is None:
+                    continue
+                for linha in linhas:
+                    linha['checklist_id'] = checklist_id
+                linhas_respostas.extend(linhas)
+                resultados[indice] = _resultado_lote(indice, 'criado', checklist_id=checklist_id)
+
+            if linhas_respostas:
+                db.session.execute(insert(ChecklistResposta), linhas_respostas)
+            atualizar_janelas(ids_inseridos.keys())
+            atualizar_maestria(ids_inseridos.keys())
+            db.session.commit()
+
+            # Itens que perderam a disputa para um envio concorrente
+            conflitos = [(i, c) for i, c, _ in pendentes.values() if resultados[i] is None]
+            chaves_conflito = {c['chave_idempotencia'] for _, c in conflitos if c['chave_idempotencia']}
+            gravados = {}
+            if chaves_conflito:
+                gravados = {
+                    c.chave_idempotencia: c
+                    for c in ChecklistDiario.query.filter(ChecklistDiario.chave_idempotencia.in_(chaves_conflito))
+                }
+            for indice, campos in conflitos:
+                existente = gravados.get(campos['chave_idempotencia'])
+                if existente:
+                    resultados[indice] = _resultado_reenvio_lote(indice, existente, campos)
+                else:
+                    resultados[indice] = _resultado_lote(
+                        indice, 'erro', erro='Já existe um checklist para esta meta nesta data'
+                    )
+
+        resumo = {status: sum(1 for r in resultados if r['status'] == status) for status in ('criado', 'existente', 'erro')}
+        return jsonify({
+            'total': len(resultados),
+            'resumo': resumo,
+            'resultados': resultados
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+
+def _resultado_lote(indice, status, checklist_id=None, erro=None):
+    resultado = {'indice': indice, 'status': status, 'checklist_id': checklist_id}
+    if erro:
+        resultado['erro'] = erro
+    return resultado
+
+
+def _resultado_reenvio_lote(indice, checklist, campos):
+    """Resultado de um item cuja chave de idempotência já foi gravada"""
+    if checklist.meta_id != campos['meta_id'] or checklist.data != campos['data']:
+        return _resultado_lote(indice, 'erro', erro='Chave de idempotência já utilizada em outro checklist')
+    return _resultado_lote(indice, 'existente', checklist_id=checklist.id)
+
 # --------------------------
 # Atualização de checklist
 # --------------------------
 @checklist_diario_bp.route('/checklists-diarios/<int:checklist_id>', methods=['PUT'])
+@requer_permissao('registrar_progresso')
 def atualizar_checklist(checklist_id):
     try:
         checklist = ChecklistDiario.query.get_or_404(checklist_id)
+        if not pode_acessar_meta(checklist.meta_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         dados = request.get_json()
+        meta_anterior = checklist.meta_id
 
         if 'meta_id' in dados:
             meta = MetaTerapeutica.query.get(dados['meta_id'])
             if not meta:
                 return jsonify({'erro': 'Meta terapêutica não encontrada'}), 404
+            if not pode_acessar_meta(meta.id):
+                return jsonify({'erro': 'Acesso negado'}), 403
             checklist.meta_id = meta.id
 
         if 'nota' in dados:
@@ -128,10 +435,18 @@ def atualizar_checklist(checklist_id):
             for resposta in checklist.respostas:
                 if str(resposta.pergunta_id) in respostas_dict:
                     resposta.resposta = respostas_dict[str(resposta.pergunta_id)]
-                    
-                    # Recalcular fórmula se for pergunta do tipo FORMULA
-                    if resposta.pergunta and resposta.pergunta.tipo.value == 'FORMULA':
-                        resposta.resposta_calculada = resposta.calcular_formula(respostas_dict)
+
+            # Recalcular todas as fórmulas com as respostas atualizadas, em ordem de dependência
+            respostas_atuais = {str(r.pergunta_id): r.resposta for r in checklist.respostas}
+            resultados = checklist.esquema_formulario().calcular_formulas(respostas_atuais)
+            for resposta in checklist.respostas:
+                if resposta.pergunta_id in resultados:
+                    resposta.resposta_calculada = resultados[resposta.pergunta_id]
+
+        if respostas_dict or 'nota' in dados or checklist.meta_id != meta_anterior:
+            sessoes = {(meta_anterior, checklist.data), (checklist.meta_id, checklist.data)}
+            atualizar_janelas(sessoes)
+            atualizar_maestria(sessoes)
 
         db.session.commit()
         return jsonify(checklist.to_dict()), 200
@@ -144,10 +459,18 @@ def atualizar_checklist(checklist_id):
 # Deletar checklist
 # --------------------------
 @checklist_diario_bp.route('/checklists-diarios/<int:checklist_id>', methods=['DELETE'])
+@requer_permissao('registrar_progresso')
 def deletar_checklist(checklist_id):
     try:
         checklist = ChecklistDiario.query.get_or_404(checklist_id)
+        if not pode_acessar_meta(checklist.meta_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
+        sessao = (checklist.meta_id, checklist.data)
         db.session.delete(checklist)
+        db.session.flush()
+        # As sessões seguintes deixam de incluir o checklist excluído em suas janelas
+        atualizar_janelas([sessao])
+        atualizar_maestria([sessao])
         db.session.commit()
         return jsonify({'mensagem': 'Checklist diário deletado com sucesso'}), 200
     except Exception as e:
@@ -176,6 +499,8 @@ def obter_formulas_checklist(checklist_id):
     """
     try:
         checklist = ChecklistDiario.query.get_or_404(checklist_id)
+        if not pode_acessar_meta(checklist.meta_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         
         formulas_calculadas = []
         for resposta in checklist.respostas:
@@ -192,6 +517,7 @@ def obter_formulas_checklist(checklist_id):
                     'resposta_original': resposta.resposta,
                     'valor_calculado': resposta.resposta_calculada,
                     'valor_numerico': valor_numerico,
+                    'valor_janela': resposta.resposta_janela,
                     'resposta_id': resposta.id
                 })
         
@@ -240,7 +566,7 @@ def obter_formulas_meta(meta_id):
         data_fim = request.args.get('data_fim')
         
         # Buscar checklists da meta
-        query = ChecklistDiario.query.filter_by(meta_id=meta_id)
+        query = restringir_metas(ChecklistDiario.query.filter_by(meta_id=meta_id), ChecklistDiario.meta_id)
         
         if data_inicio:
             query = query.filter(ChecklistDiario.data >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
@@ -274,6 +600,7 @@ def obter_formulas_meta(meta_id):
                         'data': checklist.data.isoformat(),
                         'valor_calculado': resposta.resposta_calculada,
                         'valor_numerico': valor_numerico,
+                        'valor_janela': resposta.resposta_janela,
                         'checklist_id': checklist.id
                     })
         
@@ -1,10 +1,81 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify
+from sqlalchemy import insert, update, delete
 from src.models import db
 from src.models.formulario import Formulario
-from src.models.pergunta import Pergunta
+from src.models.pergunta import Pergunta, TipoPerguntaEnum
+from src.models.checklist_respostas import ChecklistResposta
+from src.services.formulas import FormulaInvalida, validar_formula
+from src.services.esquema_formulario import verificar_ciclos_formulario
+from src.services.janelas import recalcular_janelas, validar_janela
+from src.services.autenticacao import requer_permissao
 
 formulario_bp = Blueprint("formulario", __name__)
 
+
+def _ler_perguntas(perguntas):
+    """
+    Converte as perguntas do payload em linhas prontas para inserção/atualização em lote
+    (ordem = posição na lista). Lança ValueError se alguma pergunta for inválida
+    """
+    linhas = []
+    for i, p in enumerate(perguntas, start=1):
+        if not p.get("texto"):
+            raise ValueError(f"Texto da pergunta {i} é obrigatório")
+
+        tipo_valor = p.get("tipo") or "texto"
+        try:
+            tipo = TipoPerguntaEnum[str(tipo_valor).upper()]
+        except KeyError:
+            raise ValueError(f"Tipo inválido: {tipo_valor}")
+
+        formula = p.get("formula")
+        if tipo == TipoPerguntaEnum.FORMULA:
+            try:
+                validar_formula(formula)
+            except FormulaInvalida as e:
+                raise ValueError(f"Pergunta '{p['texto']}': {e}")
+
+        try:
+            janela_sessoes, agregacao_janela = validar_janela(
+                p.get("janela_sessoes"), p.get("agregacao_janela"), tipo
+            )
+        except ValueError as e:
+            raise ValueError(f"Pergunta '{p['texto']}': {e}")
+
+        linhas.append({
+            "id": p.get("id"),
+            "texto": p["texto"],
+            "tipo": tipo,
+            "obrigatoria": p.get("obrigatoria", False),
+            "ordem": i,
+            "formula": formula,
+            "grupo": p.get("grupo") or None,
+            "janela_sessoes": janela_sessoes,
+            "agregacao_janela": agregacao_janela
+        })
+    return linhas
+
+
+def _validar_referencias(linhas, removidas=()):
+    """Confere, em uma única consulta, se as fórmulas só referenciam perguntas existentes"""
+    formulas = [l for l in linhas if l["tipo"] == TipoPerguntaEnum.FORMULA]
+    referencias = set()
+    for linha in formulas:
+        referencias |= validar_formula(linha["formula"]).referencias
+    if not referencias:
+        return
+
+    existentes = {
+        pergunta_id for (pergunta_id,) in
+        db.session.query(Pergunta.id).filter(Pergunta.id.in_(referencias))
+    } - set(removidas)
+    for linha in formulas:
+        try:
+            validar_formula(linha["formula"], existentes)
+        except FormulaInvalida as e:
+            raise ValueError(f"Pergunta '{linha['texto']}': {e}")
+
 # Listar todos
 @formulario_bp.route("/formularios", methods=["GET"])
 def listar_formularios():
@@ -75,6 +146,7 @@ def obter_formulario(id):
 
 # Criar
 @formulario_bp.route("/formularios", methods=["POST"])
+@requer_permissao('criar_planos')
 def criar_formulario():
     """
     Cria um novo formulário
@@ -112,6 +184,15 @@ def criar_formulario():
                     default: false
                   formula:
                     type: string
+                  grupo:
+                    type: string
+                    description: Tag usada em fórmulas de agregação (#grupo)
+                  janela_sessoes:
+                    type: integer
+                    description: Quantidade de sessões agregadas em resposta_janela (fórmulas)
+                  agregacao_janela:
+                    type: string
+                    description: soma, media, contar_sim ou percentual (padrão media)
     responses:
       201:
         description: Formulário criado com sucesso
@@ -122,6 +203,12 @@ def criar_formulario():
     if not dados.get("nome"):
         return jsonify({"erro": "Nome é obrigatório"}), 400
 
+    try:
+        perguntas = _ler_perguntas(dados.get("perguntas", []))
+        _validar_referencias(perguntas)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
     form = Formulario(
         nome=dados["nome"],
         descricao=dados.get("descricao"),
@@ -130,16 +217,18 @@ def criar_formulario():
     db.session.add(form)
     db.session.flush()  # garante ID disponível antes das perguntas
 
-    for i, p in enumerate(dados.get("perguntas", []), start=1):
-        pergunta = Pergunta(
-            texto=p["texto"],
-            tipo=p.get("tipo", "texto"),
-            obrigatoria=p.get("obrigatoria", False),
-            ordem=i,
-            formulario_id=form.id,
-            formula=p.get("formula")
-        )
-        db.session.add(pergunta)
+    if perguntas:
+        for linha in perguntas:
+            linha.pop("id")
+            linha["formulario_id"] = form.id
+        db.session.execute(insert(Pergunta), perguntas)
+
+        # Intervalos e grupos só são resolvidos com as perguntas gravadas
+        try:
+            verificar_ciclos_formulario(form.id)
+        except FormulaInvalida as e:
+            db.session.rollback()
+            return jsonify({"erro": str(e)}), 400
 
     db.session.commit()
     return jsonify(form.to_dict()), 201
@@ -149,6 +238,7 @@ def criar_formulario():
 
 # Atualizar
 @formulario_bp.route("/formularios/<int:id>", methods=["PUT"])
+@requer_permissao('criar_planos')
 def atualizar_formulario(id):
     """
     Atualiza um formulário existente
@@ -187,41 +277,102 @@ def atualizar_formulario(id):
                     type: boolean
                   formula:
                     type: string
+                  grupo:
+                    type: string
+                    description: Tag usada em fórmulas de agregação (#grupo)
+                  janela_sessoes:
+                    type: integer
+                    description: Quantidade de sessões agregadas em resposta_janela (fórmulas)
+                  agregacao_janela:
+                    type: string
+                    description: soma, media, contar_sim ou percentual (padrão media)
     responses:
       200:
         description: Formulário atualizado com sucesso
+      400:
+        description: Pergunta ou fórmula inválida, ou id de pergunta de outro formulário
       404:
         description: Formulário não encontrado
     """
     form = Formulario.query.get_or_404(id)
     dados = request.get_json()
 
+    try:
+        perguntas = _ler_perguntas(dados["perguntas"]) if "perguntas" in dados else None
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
     form.nome = dados.get("nome", form.nome)
     form.descricao = dados.get("descricao", form.descricao)
     form.categoria = dados.get("categoria", form.categoria)
 
-    # Atualizar perguntas sem apagar as antigas
-    for i, p in enumerate(dados.get("perguntas", []), start=1):
-        if "id" in p and p["id"]:
-            # Atualiza pergunta existente
-            pergunta = Pergunta.query.filter_by(id=p["id"], formulario_id=form.id).first()
-            if pergunta:
-                pergunta.texto = p["texto"]
-                pergunta.tipo = p.get("tipo", "texto")
-                pergunta.obrigatoria = p.get("obrigatoria", False)
-                pergunta.ordem = i
-                pergunta.formula = p.get("formula")
-        else:
-            # Cria nova pergunta
-            pergunta = Pergunta(
-                texto=p["texto"],
-                tipo=p.get("tipo", "texto"),
-                obrigatoria=p.get("obrigatoria", False),
-                ordem=i,
-                formulario_id=form.id,
-                formula=p.get("formula")
+    if perguntas is not None:
+        # Diferença entre as perguntas enviadas e as existentes, carregadas uma única vez
+        existentes = {p.id: p for p in form.perguntas}
+        atualizacoes, novas = [], []
+        for linha in perguntas:
+            pergunta_id = linha["id"]
+            campos = {k: v for k, v in linha.items() if k != "id"}
+            if not pergunta_id:
+                novas.append(dict(campos, formulario_id=form.id))
+            elif pergunta_id in existentes:
+                atualizacoes.append(dict(campos, id=pergunta_id))
+            else:
+                return jsonify({"erro": f"Pergunta {pergunta_id} não pertence a este formulário"}), 400
+
+        # Perguntas que saíram do formulário são removidas, exceto as que já têm
+        # respostas registradas: essas são mantidas (ao final) para preservar o histórico
+        ausentes = set(existentes) - {a["id"] for a in atualizacoes}
+        com_respostas = set()
+        if ausentes:
+            com_respostas = {
+                pergunta_id for (pergunta_id,) in
+                db.session.query(ChecklistResposta.pergunta_id)
+                .filter(ChecklistResposta.pergunta_id.in_(ausentes))
+                .distinct()
+            }
+        removidas = ausentes - com_respostas
+        mantidas = sorted(com_respostas, key=lambda i: (existentes[i].ordem, i))
+        for posicao, pergunta_id in enumerate(mantidas, start=len(perguntas) + 1):
+            atualizacoes.append({"id": pergunta_id, "ordem": posicao})
+
+        try:
+            _validar_referencias(perguntas, removidas)
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+
+        # Mudança na configuração de janela recalcula o histórico dessas perguntas
+        janelas_alteradas = {
+            a["id"]: (a["janela_sessoes"], a["agregacao_janela"])
+            for a in atualizacoes
+            if "janela_sessoes" in a and (a["janela_sessoes"], a["agregacao_janela"]) != (
+                existentes[a["id"]].janela_sessoes, existentes[a["id"]].agregacao_janela
             )
-            db.session.add(pergunta)
+        }
+
+        if atualizacoes:
+            db.session.execute(update(Pergunta), atualizacoes)
+        if novas:
+            db.session.execute(insert(Pergunta), novas)
+        if removidas:
+            db.session.execute(delete(Pergunta).where(Pergunta.id.in_(removidas)))
+
+        # Ciclos são verificados com as perguntas já gravadas, pois intervalos e
+        # grupos dependem do conjunto final de perguntas do formulário
+        try:
+            verificar_ciclos_formulario(form.id)
+        except FormulaInvalida as e:
+            db.session.rollback()
+            return jsonify({"erro": str(e)}), 400
+
+        if janelas_alteradas:
+            recalcular_janelas(
+                list(janelas_alteradas),
+                {pergunta_id: janela for pergunta_id, janela in janelas_alteradas.items() if janela[0]}
+            )
+
+        # Instruções em lote não passam pelos eventos do ORM: atualiza a versão do formulário aqui
+        form.atualizado_em = datetime.utcnow()
 
     db.session.commit()
     return jsonify(form.to_dict()), 200
@@ -230,6 +381,7 @@ def atualizar_formulario(id):
 
 # Deletar
 @formulario_bp.route("/formularios/<int:id>", methods=["DELETE"])
+@requer_permissao('criar_planos')
 def deletar_formulario(id):
     """
     Deleta um formulário
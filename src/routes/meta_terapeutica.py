@@ -1,18 +1,122 @@
+import click
 from flask import Blueprint, request, jsonify
 from datetime import datetime, date
-from src.models import db, MetaTerapeutica, PlanoTerapeutico, StatusMetaEnum, Formulario
+from src.models import db, MetaTerapeutica, PlanoTerapeutico, StatusMetaEnum, Formulario, Pergunta
+from src.services.acesso import pode_acessar_meta, pode_acessar_paciente, restringir_metas
+from src.services.maestria import reavaliar_meta, validar_criterio
+from src.services.autenticacao import requer_permissao
 
 meta_terapeutica_bp = Blueprint('meta_terapeutica', __name__)
 
+# Campos do critério de maestria aceitos em POST/PUT
+CAMPOS_CRITERIO = ('criterio_sessoes', 'criterio_limiar', 'criterio_pergunta_id')
+
 # -----------------------
 # GETs
 # -----------------------
 
 @meta_terapeutica_bp.route('/metas-terapeuticas', methods=['GET'])
 def listar_metas():
+    """
+    Lista metas terapêuticas com progresso calculado no banco
+    ---
+    tags:
+      - Metas Terapêuticas
+    parameters:
+      - name: plano_id
+        in: query
+        type: integer
+      - name: paciente_id
+        in: query
+        type: integer
+      - name: profissional_id
+        in: query
+        type: integer
+      - name: status
+        in: query
+        type: string
+        enum: [EmAndamento, Concluida]
+      - name: atrasada
+        in: query
+        type: boolean
+        description: Apenas metas em andamento com prazo vencido (true) ou não vencidas (false)
+      - name: progresso_min
+        in: query
+        type: number
+      - name: progresso_max
+        in: query
+        type: number
+      - name: ordenar_por
+        in: query
+        type: string
+        enum: [id, progresso, dias_restantes, data_inicio, data_previsao_termino]
+      - name: ordem
+        in: query
+        type: string
+        enum: [asc, desc]
+    responses:
+      200:
+        description: Lista de metas com progresso, dias_restantes e atrasada
+      400:
+        description: Filtro inválido
+    """
     try:
-        metas = MetaTerapeutica.query.all()
-        return jsonify([meta.to_dict() for meta in metas]), 200
+        return _listar_metas_filtradas(
+            plano_id=request.args.get('plano_id', type=int),
+            paciente_id=request.args.get('paciente_id', type=int),
+            profissional_id=request.args.get('profissional_id', type=int)
+        )
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@meta_terapeutica_bp.route('/metas-terapeuticas/quase-maestria', methods=['GET'])
+def listar_metas_quase_maestria():
+    """
+    Lista metas em andamento próximas de atingir o critério de maestria
+    ---
+    tags:
+      - Metas Terapêuticas
+    parameters:
+      - name: faltam
+        in: query
+        type: integer
+        default: 1
+        description: Máximo de sessões consecutivas que ainda faltam
+      - name: paciente_id
+        in: query
+        type: integer
+      - name: profissional_id
+        in: query
+        type: integer
+    responses:
+      200:
+        description: Metas ordenadas pelas sessões que faltam, com sessoes_para_maestria
+    """
+    try:
+        faltam = request.args.get('faltam', 1, type=int)
+        # Lê apenas o estado guardado em cada meta, sem consultar os checklists
+        query = db.session.query(MetaTerapeutica, MetaTerapeutica.sessoes_para_maestria).filter(
+            MetaTerapeutica.status == StatusMetaEnum.EM_ANDAMENTO,
+            MetaTerapeutica.maestria_sequencia > 0,
+            MetaTerapeutica.criterio_sessoes.isnot(None),
+            MetaTerapeutica.sessoes_para_maestria <= faltam
+        )
+        query = restringir_metas(query, MetaTerapeutica.id)
+        paciente_id = request.args.get('paciente_id', type=int)
+        profissional_id = request.args.get('profissional_id', type=int)
+        if paciente_id or profissional_id:
+            query = query.join(PlanoTerapeutico, PlanoTerapeutico.id == MetaTerapeutica.plano_id)
+            if paciente_id:
+                query = query.filter(PlanoTerapeutico.paciente_id == paciente_id)
+            if profissional_id:
+                query = query.filter(PlanoTerapeutico.profissional_id == profissional_id)
+
+        metas = []
+        for meta, sessoes_para_maestria in query.order_by(MetaTerapeutica.sessoes_para_maestria, MetaTerapeutica.id):
+            dados = meta.to_dict()
+            dados['sessoes_para_maestria'] = sessoes_para_maestria
+            metas.append(dados)
+        return jsonify(metas), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -20,6 +124,8 @@ def listar_metas():
 def obter_meta(meta_id):
     try:
         meta = MetaTerapeutica.query.get_or_404(meta_id)
+        if not pode_acessar_meta(meta.id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         return jsonify(meta.to_dict()), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -27,16 +133,91 @@ def obter_meta(meta_id):
 @meta_terapeutica_bp.route('/metas-terapeuticas/plano/<int:plano_id>', methods=['GET'])
 def listar_metas_por_plano(plano_id):
     try:
-        metas = MetaTerapeutica.query.filter_by(plano_id=plano_id).all()
-        return jsonify([meta.to_dict() for meta in metas]), 200
+        return _listar_metas_filtradas(plano_id=plano_id)
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@meta_terapeutica_bp.route('/metas-terapeuticas/paciente/<int:paciente_id>', methods=['GET'])
+def listar_metas_por_paciente(paciente_id):
+    try:
+        return _listar_metas_filtradas(paciente_id=paciente_id)
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+# Campos aceitos em ordenar_por -> expressão SQL
+CAMPOS_ORDENACAO = {
+    'id': MetaTerapeutica.id,
+    'progresso': MetaTerapeutica.progresso,
+    'dias_restantes': MetaTerapeutica.dias_restantes,
+    'data_inicio': MetaTerapeutica.data_inicio,
+    'data_previsao_termino': MetaTerapeutica.data_previsao_termino
+}
+
+def _listar_metas_filtradas(plano_id=None, paciente_id=None, profissional_id=None):
+    """
+    Lista metas aplicando filtros e ordenação da query string em SQL,
+    com progresso, dias restantes e atraso calculados pelo banco
+    """
+    query = db.session.query(
+        MetaTerapeutica,
+        MetaTerapeutica.progresso,
+        MetaTerapeutica.dias_restantes,
+        MetaTerapeutica.atrasada
+    )
+    query = restringir_metas(query, MetaTerapeutica.id)
+
+    if plano_id:
+        query = query.filter(MetaTerapeutica.plano_id == plano_id)
+    if paciente_id or profissional_id:
+        query = query.join(PlanoTerapeutico, PlanoTerapeutico.id == MetaTerapeutica.plano_id)
+        if paciente_id:
+            query = query.filter(PlanoTerapeutico.paciente_id == paciente_id)
+        if profissional_id:
+            query = query.filter(PlanoTerapeutico.profissional_id == profissional_id)
+
+    status = request.args.get('status')
+    if status:
+        try:
+            query = query.filter(MetaTerapeutica.status == StatusMetaEnum(status))
+        except ValueError:
+            return jsonify({'erro': 'Status inválido'}), 400
+
+    atrasada = request.args.get('atrasada')
+    if atrasada is not None:
+        if atrasada.lower() == 'true':
+            query = query.filter(MetaTerapeutica.atrasada)
+        else:
+            query = query.filter(~MetaTerapeutica.atrasada)
+
+    progresso_min = request.args.get('progresso_min', type=float)
+    if progresso_min is not None:
+        query = query.filter(MetaTerapeutica.progresso >= progresso_min)
+    progresso_max = request.args.get('progresso_max', type=float)
+    if progresso_max is not None:
+        query = query.filter(MetaTerapeutica.progresso <= progresso_max)
+
+    ordenar_por = request.args.get('ordenar_por', 'id')
+    if ordenar_por not in CAMPOS_ORDENACAO:
+        return jsonify({'erro': f"ordenar_por inválido. Valores aceitos: {', '.join(CAMPOS_ORDENACAO)}"}), 400
+    campo = CAMPOS_ORDENACAO[ordenar_por]
+    ordem = campo.desc() if request.args.get('ordem', 'asc').lower() == 'desc' else campo.asc()
+    query = query.order_by(ordem, MetaTerapeutica.id)
+
+    metas = []
+    for meta, progresso, dias_restantes, atrasada in query.all():
+        dados = meta.to_dict()
+        dados['progresso'] = float(progresso) if progresso is not None else 0
+        dados['dias_restantes'] = dias_restantes
+        dados['atrasada'] = bool(atrasada)
+        metas.append(dados)
+    return jsonify(metas), 200
+
 # -----------------------
 # POST
 # -----------------------
 
 @meta_terapeutica_bp.route('/metas-terapeuticas', methods=['POST'])
+@requer_permissao('criar_planos')
 def criar_meta():
     try:
         dados = request.get_json()
@@ -49,6 +230,8 @@ def criar_meta():
         plano = PlanoTerapeutico.query.get(dados['plano_id'])
         if not plano:
             return jsonify({'erro': 'Plano terapêutico não encontrado'}), 404
+        if not pode_acessar_paciente(plano.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
 
         # Datas
         try:
@@ -68,13 +251,21 @@ def criar_meta():
             except ValueError:
                 return jsonify({'erro': 'Status inválido'}), 400
 
+        try:
+            criterio_sessoes, criterio_limiar, criterio_pergunta_id = _ler_criterio(dados)
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
+
         # Criar meta
         meta = MetaTerapeutica(
             plano_id=dados['plano_id'],
             descricao=dados['descricao'],
             data_inicio=data_inicio,
             data_previsao_termino=data_previsao_termino,
-            status=status
+            status=status,
+            criterio_sessoes=criterio_sessoes,
+            criterio_limiar=criterio_limiar,
+            criterio_pergunta_id=criterio_pergunta_id
         )
 
         # Vincular múltiplos formulários existentes
@@ -97,15 +288,20 @@ def criar_meta():
 # -----------------------
 
 @meta_terapeutica_bp.route('/metas-terapeuticas/<int:meta_id>', methods=['PUT'])
+@requer_permissao('criar_planos')
 def atualizar_meta(meta_id):
     try:
         meta = MetaTerapeutica.query.get_or_404(meta_id)
+        if not pode_acessar_meta(meta.id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         dados = request.get_json()
 
         if 'plano_id' in dados:
             plano = PlanoTerapeutico.query.get(dados['plano_id'])
             if not plano:
                 return jsonify({'erro': 'Plano terapêutico não encontrado'}), 404
+            if not pode_acessar_paciente(plano.paciente_id):
+                return jsonify({'erro': 'Acesso negado'}), 403
             meta.plano_id = dados['plano_id']
 
         if 'descricao' in dados:
@@ -138,6 +334,18 @@ def atualizar_meta(meta_id):
             formularios = Formulario.query.filter(Formulario.id.in_(formulario_ids)).all()
             meta.formularios = formularios
 
+        # Critério de maestria alterado: reavalia o estado a partir das últimas sessões
+        if any(campo in dados for campo in CAMPOS_CRITERIO):
+            try:
+                criterio = _ler_criterio({
+                    campo: dados.get(campo, getattr(meta, campo)) for campo in CAMPOS_CRITERIO
+                })
+            except ValueError as e:
+                return jsonify({'erro': str(e)}), 400
+            if criterio != (meta.criterio_sessoes, meta.criterio_limiar, meta.criterio_pergunta_id):
+                meta.criterio_sessoes, meta.criterio_limiar, meta.criterio_pergunta_id = criterio
+                reavaliar_meta(meta)
+
         db.session.commit()
         return jsonify(meta.to_dict()), 200
 
@@ -150,9 +358,12 @@ def atualizar_meta(meta_id):
 # -----------------------
 
 @meta_terapeutica_bp.route('/metas-terapeuticas/<int:meta_id>', methods=['DELETE'])
+@requer_permissao('criar_planos')
 def deletar_meta(meta_id):
     try:
         meta = MetaTerapeutica.query.get_or_404(meta_id)
+        if not pode_acessar_meta(meta.id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         db.session.delete(meta)
         db.session.commit()
         return jsonify({'mensagem': 'Meta terapêutica deletada com sucesso'}), 200
@@ -165,12 +376,54 @@ def deletar_meta(meta_id):
 # -----------------------
 
 @meta_terapeutica_bp.route('/metas-terapeuticas/<int:meta_id>/concluir', methods=['PUT'])
+@requer_permissao('criar_planos')
 def concluir_meta(meta_id):
     try:
         meta = MetaTerapeutica.query.get_or_404(meta_id)
+        if not pode_acessar_meta(meta.id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         meta.status = StatusMetaEnum.CONCLUIDA
         db.session.commit()
         return jsonify(meta.to_dict()), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
+
+
+# -----------------------
+# Critério de maestria
+# -----------------------
+
+def _ler_criterio(dados):
+    """Lê e valida o critério de maestria enviado. Lança ValueError se inválido"""
+    criterio = validar_criterio(
+        dados.get('criterio_sessoes'), dados.get('criterio_limiar'), dados.get('criterio_pergunta_id')
+    )
+    pergunta_id = criterio[2]
+    if pergunta_id and not db.session.get(Pergunta, pergunta_id):
+        raise ValueError('Pergunta do critério de maestria não encontrada')
+    return criterio
+
+
+@meta_terapeutica_bp.cli.command('reavaliar-maestria')
+@click.option('--meta-id', 'meta_ids', type=int, multiple=True, help='Reavalia apenas estas metas')
+@click.option('--lote', default=500, show_default=True, help='Metas por transação')
+def reavaliar_maestria_comando(meta_ids, lote):
+    """Reavalia o estado de maestria das metas com critério (após mudança de regras)"""
+    query = db.session.query(MetaTerapeutica.id).filter(MetaTerapeutica.criterio_sessoes.isnot(None))
+    if meta_ids:
+        query = query.filter(MetaTerapeutica.id.in_(meta_ids))
+    ids = [meta_id for (meta_id,) in query.order_by(MetaTerapeutica.id)]
+
+    concluidas = 0
+    for inicio in range(0, len(ids), lote):
+        metas = MetaTerapeutica.query.filter(MetaTerapeutica.id.in_(ids[inicio:inicio + lote])).all()
+        for meta in metas:
+            status_anterior = meta.status
+            reavaliar_meta(meta)
+            if meta.status != status_anterior:
+                concluidas += 1
+        db.session.commit()
+        click.echo(f"{min(inicio + lote, len(ids))}/{len(ids)} metas reavaliadas")
+
+    click.echo(f"Reavaliação concluída: {len(ids)} metas, {concluidas} concluídas por maestria")
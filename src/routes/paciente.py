@@ -1,13 +1,15 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from src.models import db, Paciente, DiagnosticoEnum
+from src.services.acesso import pode_acessar_paciente, restringir_pacientes
+from src.services.autenticacao import requer_permissao
 
 paciente_bp = Blueprint('paciente', __name__)
 
 @paciente_bp.route('/pacientes', methods=['GET'])
 def listar_pacientes():
     """
-    Lista todos os pacientes
+    Lista os pacientes acessíveis pelo usuário autenticado
     ---
     tags:
       - Pacientes
@@ -33,7 +35,7 @@ def listar_pacientes():
                 type: string
     """
     try:
-        pacientes = Paciente.query.all()
+        pacientes = restringir_pacientes(Paciente.query, Paciente.id).all()
         return jsonify([paciente.to_dict() for paciente in pacientes]), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -55,10 +57,14 @@ def obter_paciente(paciente_id):
     responses:
       200:
         description: Paciente encontrado
+      403:
+        description: Paciente sem vínculo com o usuário
       404:
         description: Paciente não encontrado
     """
     try:
+        if not pode_acessar_paciente(paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         paciente = Paciente.query.get_or_404(paciente_id)
         return jsonify(paciente.to_dict()), 200
     except Exception as e:
@@ -66,6 +72,7 @@ def obter_paciente(paciente_id):
 
 
 @paciente_bp.route('/pacientes', methods=['POST'])
+@requer_permissao('editar_dados')
 def criar_paciente():
     """
     Cria um novo paciente
@@ -146,6 +153,7 @@ def criar_paciente():
 
 
 @paciente_bp.route('/pacientes/<int:paciente_id>', methods=['PUT'])
+@requer_permissao('editar_dados')
 def atualizar_paciente(paciente_id):
     """
     Atualiza um paciente existente
@@ -184,6 +192,8 @@ def atualizar_paciente(paciente_id):
         description: Paciente não encontrado
     """
     try:
+        if not pode_acessar_paciente(paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         paciente = Paciente.query.get_or_404(paciente_id)
         dados = request.get_json()
         
@@ -213,6 +223,7 @@ def atualizar_paciente(paciente_id):
 
 
 @paciente_bp.route('/pacientes/<int:paciente_id>', methods=['DELETE'])
+@requer_permissao('editar_dados')
 def deletar_paciente(paciente_id):
     """
     Deleta um paciente
@@ -231,6 +242,8 @@ def deletar_paciente(paciente_id):
         description: Paciente não encontrado
     """
     try:
+        if not pode_acessar_paciente(paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         paciente = Paciente.query.get_or_404(paciente_id)
         db.session.delete(paciente)
         db.session.commit()
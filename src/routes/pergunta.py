@@ -2,6 +2,10 @@
 from flask import Blueprint, request, jsonify
 from src.models import db
 from src.models.pergunta import Pergunta, TipoPerguntaEnum
+from src.services.formulas import FormulaInvalida, validar_formula
+from src.services.esquema_formulario import verificar_ciclos_formulario
+from src.services.janelas import recalcular_janelas, validar_janela
+from src.services.autenticacao import requer_permissao
 
 pergunta_bp = Blueprint("pergunta", __name__)
 
@@ -19,6 +23,7 @@ def obter_pergunta(pergunta_id):
     return jsonify(pergunta.to_dict()), 200
 
 @pergunta_bp.route("/perguntas", methods=["POST"])
+@requer_permissao('criar_planos')
 def criar_pergunta():
     dados = request.get_json()
     if not dados.get("texto") or not dados.get("tipo"):
@@ -26,20 +31,37 @@ def criar_pergunta():
 
     # Converter tipo recebido para enum PostgreSQL
     try:
-        tipo_enum = TIPO_MAP[dados["tipo"].lower()]
+        tipo_enum = TIPO_MAP[dados["tipo"].upper()]
     except KeyError:
         return jsonify({"erro": f"Tipo inválido: {dados['tipo']}"}), 400
 
+    if tipo_enum == TipoPerguntaEnum.FORMULA:
+        try:
+            validar_formula(dados.get("formula"))
+        except FormulaInvalida as e:
+            return jsonify({"erro": str(e)}), 400
+
+    try:
+        janela_sessoes, agregacao_janela = validar_janela(
+            dados.get("janela_sessoes"), dados.get("agregacao_janela"), tipo_enum
+        )
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
     pergunta = Pergunta(
         texto=dados["texto"],
         tipo=tipo_enum,
-        formula=dados.get("formula")
+        formula=dados.get("formula"),
+        grupo=dados.get("grupo") or None,
+        janela_sessoes=janela_sessoes,
+        agregacao_janela=agregacao_janela
     )
     db.session.add(pergunta)
     db.session.commit()
     return jsonify(pergunta.to_dict()), 201
 
 @pergunta_bp.route("/perguntas/<int:pergunta_id>", methods=["PUT"])
+@requer_permissao('criar_planos')
 def atualizar_pergunta(pergunta_id):
     pergunta = Pergunta.query.get_or_404(pergunta_id)
     dados = request.get_json()
@@ -49,17 +71,47 @@ def atualizar_pergunta(pergunta_id):
 
     if "tipo" in dados:
         try:
-            pergunta.tipo = TIPO_MAP[dados["tipo"].lower()]
+            pergunta.tipo = TIPO_MAP[dados["tipo"].upper()]
         except KeyError:
             return jsonify({"erro": f"Tipo inválido: {dados['tipo']}"}), 400
 
     if "formula" in dados:
         pergunta.formula = dados["formula"]
 
+    if "grupo" in dados:
+        pergunta.grupo = dados["grupo"] or None
+
+    janela_anterior = (pergunta.janela_sessoes, pergunta.agregacao_janela)
+    try:
+        janela = validar_janela(
+            dados.get("janela_sessoes", pergunta.janela_sessoes),
+            dados.get("agregacao_janela", pergunta.agregacao_janela),
+            pergunta.tipo
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 400
+    pergunta.janela_sessoes, pergunta.agregacao_janela = janela
+
+    try:
+        if pergunta.tipo == TipoPerguntaEnum.FORMULA:
+            validar_formula(pergunta.formula)
+        # Mudar o grupo ou o tipo também pode fechar um ciclo através de #grupo ou {a..b}
+        db.session.flush()
+        verificar_ciclos_formulario(pergunta.formulario_id)
+    except FormulaInvalida as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 400
+
+    # Nova configuração de janela: recalcula o histórico desta pergunta
+    if janela != janela_anterior:
+        recalcular_janelas([pergunta.id], {pergunta.id: janela} if janela[0] else {})
+
     db.session.commit()
     return jsonify(pergunta.to_dict()), 200
 
 @pergunta_bp.route("/perguntas/<int:pergunta_id>", methods=["DELETE"])
+@requer_permissao('criar_planos')
 def deletar_pergunta(pergunta_id):
     pergunta = Pergunta.query.get_or_404(pergunta_id)
     db.session.delete(pergunta)
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from src.models import db, PlanoTerapeutico, Paciente, Profissional
+from src.services.acesso import pode_acessar_paciente, restringir_pacientes
+from src.services.autenticacao import requer_permissao
 
 plano_terapeutico_bp = Blueprint('plano_terapeutico', __name__)
 
@@ -8,7 +10,7 @@ plano_terapeutico_bp = Blueprint('plano_terapeutico', __name__)
 def listar_planos():
     """Lista todos os planos terapêuticos"""
     try:
-        planos = PlanoTerapeutico.query.all()
+        planos = restringir_pacientes(PlanoTerapeutico.query, PlanoTerapeutico.paciente_id).all()
         return jsonify([plano.to_dict() for plano in planos]), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -18,6 +20,8 @@ def obter_plano(plano_id):
     """Obtém um plano terapêutico específico"""
     try:
         plano = PlanoTerapeutico.query.get_or_404(plano_id)
+        if not pode_acessar_paciente(plano.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         return jsonify(plano.to_dict()), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -26,7 +30,9 @@ def obter_plano(plano_id):
 def listar_planos_por_paciente(paciente_id):
     """Lista planos terapêuticos de um paciente específico"""
     try:
-        planos = PlanoTerapeutico.query.filter_by(paciente_id=paciente_id).all()
+        planos = restringir_pacientes(
+            PlanoTerapeutico.query.filter_by(paciente_id=paciente_id), PlanoTerapeutico.paciente_id
+        ).all()
         return jsonify([plano.to_dict() for plano in planos]), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -35,12 +41,15 @@ def listar_planos_por_paciente(paciente_id):
 def listar_planos_por_profissional(profissional_id):
     """Lista planos terapêuticos de um profissional específico"""
     try:
-        planos = PlanoTerapeutico.query.filter_by(profissional_id=profissional_id).all()
+        planos = restringir_pacientes(
+            PlanoTerapeutico.query.filter_by(profissional_id=profissional_id), PlanoTerapeutico.paciente_id
+        ).all()
         return jsonify([plano.to_dict() for plano in planos]), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 @plano_terapeutico_bp.route('/planos-terapeuticos', methods=['POST'])
+@requer_permissao('criar_planos')
 def criar_plano():
     """Cria um novo plano terapêutico"""
     try:
@@ -58,6 +67,8 @@ def criar_plano():
         paciente = Paciente.query.get(dados['paciente_id'])
         if not paciente:
             return jsonify({'erro': 'Paciente não encontrado'}), 404
+        if not pode_acessar_paciente(paciente.id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         
         profissional = Profissional.query.get(dados['profissional_id'])
         if not profissional:
@@ -89,10 +100,13 @@ def criar_plano():
         return jsonify({'erro': str(e)}), 500
 
 @plano_terapeutico_bp.route('/planos-terapeuticos/<int:plano_id>', methods=['PUT'])
+@requer_permissao('criar_planos')
 def atualizar_plano(plano_id):
     """Atualiza um plano terapêutico existente"""
     try:
         plano = PlanoTerapeutico.query.get_or_404(plano_id)
+        if not pode_acessar_paciente(plano.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         dados = request.get_json()
         
         # Verificar se paciente existe (se está sendo alterado)
@@ -100,6 +114,8 @@ def atualizar_plano(plano_id):
             paciente = Paciente.query.get(dados['paciente_id'])
             if not paciente:
                 return jsonify({'erro': 'Paciente não encontrado'}), 404
+            if not pode_acessar_paciente(paciente.id):
+                return jsonify({'erro': 'Acesso negado'}), 403
             plano.paciente_id = dados['paciente_id']
         
         # Verificar se profissional existe (se está sendo alterado)
@@ -126,10 +142,13 @@ def atualizar_plano(plano_id):
         return jsonify({'erro': str(e)}), 500
 
 @plano_terapeutico_bp.route('/planos-terapeuticos/<int:plano_id>', methods=['DELETE'])
+@requer_permissao('criar_planos')
 def deletar_plano(plano_id):
     """Deleta um plano terapêutico"""
     try:
         plano = PlanoTerapeutico.query.get_or_404(plano_id)
+        if not pode_acessar_paciente(plano.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         db.session.delete(plano)
         db.session.commit()
         return jsonify({'mensagem': 'Plano terapêutico deletado com sucesso'}), 200
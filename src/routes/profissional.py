@@ -1,14 +1,9 @@
 import logging
 from flask import Blueprint, request, jsonify
 from src.models import db, Profissional
+from src.services.autenticacao import requer_permissao
 
-# Configurar logger
-logger = logging.getLogger('profissional_logger')
-logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler()  # Log no console
-formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = logging.getLogger(__name__)
 
 profissional_bp = Blueprint('profissional', __name__)
 
@@ -17,7 +12,7 @@ profissional_bp = Blueprint('profissional', __name__)
 def listar_profissionais():
     try:
         profissionais = Profissional.query.all()
-        logger.info(f"Listando {len(profissionais)} profissionais")
+        logger.debug("Listando %s profissionais", len(profissionais))
         return jsonify([profissional.to_dict() for profissional in profissionais]), 200
     except Exception as e:
         logger.exception("Erro ao listar profissionais")
@@ -28,28 +23,29 @@ def listar_profissionais():
 def obter_profissional(profissional_id):
     try:
         profissional = Profissional.query.get_or_404(profissional_id)
-        logger.info(f"Profissional obtido: {profissional.nome} (ID {profissional.id})")
+        logger.debug("Profissional obtido: %s (ID %s)", profissional.nome, profissional.id)
         return jsonify(profissional.to_dict()), 200
     except Exception as e:
-        logger.exception(f"Erro ao obter profissional ID {profissional_id}")
+        logger.exception("Erro ao obter profissional ID %s", profissional_id)
         return jsonify({'erro': str(e)}), 500
 
 # --- CRIAR ---
 @profissional_bp.route('/profissionais', methods=['POST'])
+@requer_permissao('administrar')
 def criar_profissional():
     try:
         dados = request.get_json()
-        logger.debug(f"Dados recebidos para criar profissional: {dados}")
+        logger.debug("Dados recebidos para criar profissional", extra={'dados': dados})
 
         # Validações
         for campo in ['nome', 'especialidade', 'email', 'telefone']:
             if not dados.get(campo):
-                logger.warning(f"Campo obrigatório ausente: {campo}")
+                logger.warning("Campo obrigatório ausente: %s", campo)
                 return jsonify({'erro': f'{campo} é obrigatório'}), 400
 
         # Checar email duplicado
         if Profissional.query.filter_by(email=dados['email']).first():
-            logger.warning(f"Email já cadastrado: {dados['email']}")
+            logger.warning("Email já cadastrado: %s", dados['email'])
             return jsonify({'erro': 'Email já cadastrado'}), 400
 
         profissional = Profissional(
@@ -62,7 +58,7 @@ def criar_profissional():
         db.session.add(profissional)
         db.session.commit()
 
-        logger.info(f"Profissional criado: {profissional.nome} (ID {profissional.id})")
+        logger.info("Profissional criado: %s (ID %s)", profissional.nome, profissional.id)
         return jsonify(profissional.to_dict()), 201
 
     except Exception as e:
@@ -72,15 +68,16 @@ def criar_profissional():
 
 # --- ATUALIZAR ---
 @profissional_bp.route('/profissionais/<int:profissional_id>', methods=['PUT'])
+@requer_permissao('administrar')
 def atualizar_profissional(profissional_id):
     try:
         profissional = Profissional.query.get_or_404(profissional_id)
         dados = request.get_json()
-        logger.debug(f"Atualizando profissional ID {profissional_id} com dados: {dados}")
+        logger.debug("Atualizando profissional ID %s", profissional_id, extra={'dados': dados})
 
         if 'email' in dados and dados['email'] != profissional.email:
             if Profissional.query.filter_by(email=dados['email']).first():
-                logger.warning(f"Email já cadastrado: {dados['email']}")
+                logger.warning("Email já cadastrado: %s", dados['email'])
                 return jsonify({'erro': 'Email já cadastrado'}), 400
 
         for campo in ['nome', 'especialidade', 'email', 'telefone']:
@@ -88,24 +85,25 @@ def atualizar_profissional(profissional_id):
                 setattr(profissional, campo, dados[campo])
 
         db.session.commit()
-        logger.info(f"Profissional atualizado: {profissional.nome} (ID {profissional.id})")
+        logger.info("Profissional atualizado: %s (ID %s)", profissional.nome, profissional.id)
         return jsonify(profissional.to_dict()), 200
 
     except Exception as e:
         db.session.rollback()
-        logger.exception(f"Erro ao atualizar profissional ID {profissional_id}")
+        logger.exception("Erro ao atualizar profissional ID %s", profissional_id)
         return jsonify({'erro': str(e)}), 500
 
 # --- DELETAR ---
 @profissional_bp.route('/profissionais/<int:profissional_id>', methods=['DELETE'])
+@requer_permissao('administrar')
 def deletar_profissional(profissional_id):
     try:
         profissional = Profissional.query.get_or_404(profissional_id)
         db.session.delete(profissional)
         db.session.commit()
-        logger.info(f"Profissional deletado: {profissional.nome} (ID {profissional.id})")
+        logger.info("Profissional deletado: %s (ID %s)", profissional.nome, profissional.id)
         return jsonify({'mensagem': 'Profissional deletado com sucesso'}), 200
     except Exception as e:
         db.session.rollback()
-        logger.exception(f"Erro ao deletar profissional ID {profissional_id}")
+        logger.exception("Erro ao deletar profissional ID %s", profissional_id)
         return jsonify({'erro': str(e)}), 500
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, date
 from src.models import db, ProfissionalPaciente, Profissional, Paciente, StatusVinculoEnum, TipoAtendimentoEnum
+from src.services.acesso import pode_acessar_paciente, restringir_pacientes
+from src.services.autenticacao import requer_permissao
 
 profissional_paciente_bp = Blueprint('profissional_paciente', __name__)
 
@@ -38,7 +40,7 @@ def listar_vinculos():
             type: object
     """
     try:
-        query = ProfissionalPaciente.query
+        query = restringir_pacientes(ProfissionalPaciente.query_completa(), ProfissionalPaciente.paciente_id)
         
         # Filtros opcionais
         status = request.args.get('status')
@@ -92,11 +94,14 @@ def obter_vinculo(vinculo_id):
     """
     try:
         vinculo = ProfissionalPaciente.query.get_or_404(vinculo_id)
+        if not pode_acessar_paciente(vinculo.paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         return jsonify(vinculo.to_dict_completo()), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 @profissional_paciente_bp.route('/vinculos', methods=['POST'])
+@requer_permissao('administrar')
 def criar_vinculo():
     """
     Cria um novo vínculo profissional-paciente
@@ -204,6 +209,7 @@ def criar_vinculo():
         return jsonify({'erro': str(e)}), 500
 
 @profissional_paciente_bp.route('/vinculos/<int:vinculo_id>', methods=['PUT'])
+@requer_permissao('administrar')
 def atualizar_vinculo(vinculo_id):
     """
     Atualiza um vínculo existente
@@ -283,6 +289,7 @@ def atualizar_vinculo(vinculo_id):
         return jsonify({'erro': str(e)}), 500
 
 @profissional_paciente_bp.route('/vinculos/<int:vinculo_id>/ativar', methods=['POST'])
+@requer_permissao('administrar')
 def ativar_vinculo(vinculo_id):
     """
     Ativa um vínculo
@@ -310,6 +317,7 @@ def ativar_vinculo(vinculo_id):
         return jsonify({'erro': str(e)}), 500
 
 @profissional_paciente_bp.route('/vinculos/<int:vinculo_id>/inativar', methods=['POST'])
+@requer_permissao('administrar')
 def inativar_vinculo(vinculo_id):
     """
     Inativa um vínculo
@@ -354,6 +362,7 @@ def inativar_vinculo(vinculo_id):
         return jsonify({'erro': str(e)}), 500
 
 @profissional_paciente_bp.route('/vinculos/<int:vinculo_id>/suspender', methods=['POST'])
+@requer_permissao('administrar')
 def suspender_vinculo(vinculo_id):
     """
     Suspende um vínculo
@@ -407,7 +416,10 @@ def listar_pacientes_do_profissional(profissional_id):
         profissional = Profissional.query.get_or_404(profissional_id)
         apenas_ativos = request.args.get('apenas_ativos', 'true').lower() == 'true'
         
-        query = ProfissionalPaciente.query.filter_by(profissional_id=profissional_id)
+        query = restringir_pacientes(
+            ProfissionalPaciente.query_completa().filter_by(profissional_id=profissional_id),
+            ProfissionalPaciente.paciente_id
+        )
         
         if apenas_ativos:
             query = query.filter_by(status=StatusVinculoEnum.ATIVO)
@@ -445,7 +457,10 @@ def listar_profissionais_do_paciente(paciente_id):
         paciente = Paciente.query.get_or_404(paciente_id)
         apenas_ativos = request.args.get('apenas_ativos', 'true').lower() == 'true'
         
-        query = ProfissionalPaciente.query.filter_by(paciente_id=paciente_id)
+        query = restringir_pacientes(
+            ProfissionalPaciente.query_completa().filter_by(paciente_id=paciente_id),
+            ProfissionalPaciente.paciente_id
+        )
         
         if apenas_ativos:
             query = query.filter_by(status=StatusVinculoEnum.ATIVO)
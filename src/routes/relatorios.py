@@ -1,11 +1,66 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_
-from src.models import db, Paciente, Profissional, PlanoTerapeutico, MetaTerapeutica, ChecklistDiario, StatusMetaEnum, ChecklistResposta, Pergunta, TipoPerguntaEnum
+from sqlalchemy import func, and_, case, cast, Float
+from src.models import (
+    db, Paciente, Profissional, PlanoTerapeutico, MetaTerapeutica, ChecklistDiario, StatusMetaEnum,
+    ChecklistResposta, Pergunta, TipoPerguntaEnum, ProfissionalPaciente, StatusVinculoEnum, Agenda,
+    StatusAgendamentoEnum
+)
+from src.services.estatisticas import calcular_estatisticas, calcular_estatisticas_lote
+from src.services.acesso import filtro_metas, filtro_pacientes, pode_acessar_meta, pode_acessar_paciente
+from src.services.amostragem import AGRUPAMENTOS, MINIMO_PONTOS, indices_reduzidos, reduzir_pontos
+from src.services.coalescencia import coalescer
+from src.services.tarefas import tipo_tarefa
 
 relatorios_bp = Blueprint('relatorios', __name__)
 
+# Janela padrão (em dias) dos registros recentes no relatório do paciente
+JANELA_RECENTE_PADRAO = 30
+
+# Respostas calculadas que podem ser convertidas para número no banco
+PADRAO_NUMERICO = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+
+
+def _formulas_calculadas_por_checklist(checklist_ids):
+    """
+    Busca em uma única consulta as fórmulas calculadas dos checklists informados
+    checklist_ids: lista de IDs ou subconsulta que retorna IDs de checklists
+    Retorna dict {checklist_id: [formula_calculada, ...]}
+    """
+    linhas = db.session.query(
+        ChecklistResposta.checklist_id,
+        ChecklistResposta.pergunta_id,
+        ChecklistResposta.resposta_calculada,
+        ChecklistResposta.resposta_janela,
+        Pergunta.texto,
+        Pergunta.formula
+    ).join(Pergunta, Pergunta.id == ChecklistResposta.pergunta_id).filter(
+        ChecklistResposta.checklist_id.in_(checklist_ids),
+        Pergunta.tipo == TipoPerguntaEnum.FORMULA,
+        ChecklistResposta.resposta_calculada.isnot(None),
+        ChecklistResposta.resposta_calculada != ''
+    ).order_by(ChecklistResposta.checklist_id, ChecklistResposta.id).all()
+
+    formulas = {}
+    for linha in linhas:
+        try:
+            valor_numerico = float(linha.resposta_calculada)
+        except (ValueError, TypeError):
+            valor_numerico = None
+
+        formulas.setdefault(linha.checklist_id, []).append({
+            'pergunta_id': linha.pergunta_id,
+            'pergunta_texto': linha.texto,
+            'formula': linha.formula,
+            'valor_calculado': linha.resposta_calculada,
+            'valor_numerico': valor_numerico,
+            'valor_janela': linha.resposta_janela
+        })
+    return formulas
+
+
 @relatorios_bp.route('/relatorios/dashboard', methods=['GET'])
+@coalescer
 def obter_dados_dashboard():
     """
     Obtém dados estatísticos para o dashboard
@@ -41,23 +96,31 @@ def obter_dados_dashboard():
                   count: { type: integer }
     """
     try:
-        total_pacientes = Paciente.query.count()
+        # Contagens limitadas aos pacientes acessíveis pelo usuário
+        acesso_pacientes = filtro_pacientes(Paciente.id)
+        acesso_metas = filtro_metas(MetaTerapeutica.id)
+
+        total_pacientes = Paciente.query.filter(*acesso_pacientes).count()
         total_profissionais = Profissional.query.count()
-        total_metas_ativas = MetaTerapeutica.query.filter_by(status=StatusMetaEnum.EM_ANDAMENTO).count()
+        total_metas_ativas = MetaTerapeutica.query.filter(
+            MetaTerapeutica.status == StatusMetaEnum.EM_ANDAMENTO, *acesso_metas
+        ).count()
         hoje = date.today()
-        registros_hoje = ChecklistDiario.query.filter_by(data=hoje).count()
+        registros_hoje = ChecklistDiario.query.filter(
+            ChecklistDiario.data == hoje, *filtro_metas(ChecklistDiario.meta_id)
+        ).count()
 
         diagnosticos = db.session.query(
             Paciente.diagnostico,
             func.count(Paciente.id).label('count')
-        ).group_by(Paciente.diagnostico).all()
+        ).filter(*acesso_pacientes).group_by(Paciente.diagnostico).all()
 
         distribuicao_diagnosticos = [{'diagnostico': diag.value, 'count': count} for diag, count in diagnosticos]
 
         metas_status = db.session.query(
             MetaTerapeutica.status,
             func.count(MetaTerapeutica.id).label('count')
-        ).group_by(MetaTerapeutica.status).all()
+        ).filter(*acesso_metas).group_by(MetaTerapeutica.status).all()
 
         distribuicao_metas = [{'status': status.value, 'count': count} for status, count in metas_status]
 
@@ -98,6 +161,15 @@ def obter_evolucao_meta(meta_id):
         type: string
         format: date
         description: Data final (YYYY-MM-DD)
+      - name: max_pontos
+        in: query
+        type: integer
+        description: Reduz a série para no máximo N pontos preservando sua forma (LTTB)
+      - name: agrupamento
+        in: query
+        type: string
+        enum: [semana, mes]
+        description: Agrega os registros por semana ou mês
     responses:
       200:
         description: Evolução da meta
@@ -120,72 +192,192 @@ def obter_evolucao_meta(meta_id):
                 nota_maxima: { type: integer }
                 nota_minima: { type: integer }
                 tendencia: { type: string }
+      400:
+        description: Parâmetros inválidos
     """
     try:
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-
-        query = ChecklistDiario.query.filter_by(meta_id=meta_id)
+        try:
+            data_inicio = _parse_data(request.args.get('data_inicio'))
+            data_fim = _parse_data(request.args.get('data_fim'))
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+        try:
+            max_pontos, agrupamento = _parametros_amostragem()
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
 
+        filtros = [ChecklistDiario.meta_id == meta_id, *filtro_metas(ChecklistDiario.meta_id)]
         if data_inicio:
-            query = query.filter(ChecklistDiario.data >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
+            filtros.append(ChecklistDiario.data >= data_inicio)
         if data_fim:
-            query = query.filter(ChecklistDiario.data <= datetime.strptime(data_fim, '%Y-%m-%d').date())
+            filtros.append(ChecklistDiario.data <= data_fim)
 
-        registros = query.order_by(ChecklistDiario.data).all()
-        
-        # Incluir dados das fórmulas calculadas
-        dados_evolucao = []
-        for r in registros:
-            dados_registro = {
-                'data': r.data.isoformat(), 
-                'nota': r.nota, 
-                'observacao': r.observacao,
-                'formulas_calculadas': []
-            }
-            
-            # Buscar fórmulas calculadas deste checklist
-            for resposta in r.respostas:
-                if resposta.pergunta and resposta.pergunta.tipo == TipoPerguntaEnum.FORMULA and resposta.resposta_calculada:
-                    try:
-                        valor_numerico = float(resposta.resposta_calculada)
-                    except (ValueError, TypeError):
-                        valor_numerico = None
-                    
-                    dados_registro['formulas_calculadas'].append({
-                        'pergunta_id': resposta.pergunta_id,
-                        'pergunta_texto': resposta.pergunta.texto,
-                        'formula': resposta.pergunta.formula,
-                        'valor_calculado': resposta.resposta_calculada,
-                        'valor_numerico': valor_numerico
-                    })
-            
-            dados_evolucao.append(dados_registro)
-
-        if registros:
-            notas = [r.nota for r in registros]
-            estatisticas = {
-                'total_registros': len(registros),
-                'nota_media': round(sum(notas) / len(notas), 2),
-                'nota_maxima': max(notas),
-                'nota_minima': min(notas),
-                'tendencia': 'crescente' if notas[-1] > notas[0] else 'decrescente' if notas[-1] < notas[0] else 'estável'
-            }
+        registros = db.session.query(
+            ChecklistDiario.id, ChecklistDiario.data, ChecklistDiario.nota, ChecklistDiario.observacao
+        ).filter(*filtros).order_by(ChecklistDiario.data).all()
+
+        # Estatísticas sempre sobre a série completa, antes de qualquer redução
+        serie = calcular_estatisticas([r.data for r in registros], [r.nota for r in registros])
+        estatisticas = {
+            'total_registros': len(registros),
+            'nota_media': serie['media'],
+            'nota_maxima': serie['maximo'],
+            'nota_minima': serie['minimo'],
+            'tendencia': serie['tendencia'],
+            'inclinacao': serie['inclinacao'],
+            'variancia': serie['variancia'],
+            'desvio_padrao': serie['desvio_padrao'],
+            'percentis': serie['percentis'],
+            'media_movel': serie['media_movel']
+        }
+
+        if agrupamento:
+            dados_evolucao = _evolucao_meta_agrupada(filtros, agrupamento)
+            if max_pontos:
+                dados_evolucao = reduzir_pontos(
+                    dados_evolucao,
+                    [date.fromisoformat(d['data']) for d in dados_evolucao],
+                    [d['nota'] for d in dados_evolucao],
+                    max_pontos
+                )
+            estatisticas['media_movel'] = _reduzir_media_movel(serie['media_movel'], len(dados_evolucao))
         else:
-            estatisticas = {
-                'total_registros': 0,
-                'nota_media': 0,
-                'nota_maxima': 0,
-                'nota_minima': 0,
-                'tendencia': 'sem_dados'
-            }
+            exibidos = registros
+            ids_exibidos = db.session.query(ChecklistDiario.id).filter(*filtros)
+            if max_pontos and len(registros) > max_pontos:
+                notas = [r.nota for r in registros]
+                indices = indices_reduzidos([r.data for r in registros], notas, max_pontos)
+                exibidos = [registros[i] for i in indices]
+                ids_exibidos = [r.id for r in exibidos]
+                estatisticas['media_movel'] = _media_movel_dos_indices(serie['media_movel'], notas, indices)
 
-        return jsonify({'evolucao': dados_evolucao, 'estatisticas': estatisticas}), 200
+            # Fórmulas calculadas dos registros exibidos em uma única consulta
+            formulas_por_checklist = _formulas_calculadas_por_checklist(ids_exibidos) if exibidos else {}
+            dados_evolucao = [{
+                'data': r.data.isoformat(),
+                'nota': r.nota,
+                'observacao': r.observacao,
+                'formulas_calculadas': formulas_por_checklist.get(r.id, [])
+            } for r in exibidos]
+
+        return jsonify({
+            'evolucao': dados_evolucao,
+            'estatisticas': estatisticas,
+            'amostragem': _resumo_amostragem(len(registros), len(dados_evolucao), max_pontos, agrupamento)
+        }), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 
+def _parametros_amostragem():
+    """Lê e valida os parâmetros max_pontos e agrupamento da requisição"""
+    max_pontos = request.args.get('max_pontos')
+    if max_pontos is not None:
+        try:
+            max_pontos = int(max_pontos)
+        except ValueError:
+            raise ValueError('max_pontos deve ser um número inteiro')
+        if max_pontos < MINIMO_PONTOS:
+            raise ValueError(f'max_pontos deve ser no mínimo {MINIMO_PONTOS}')
+
+    agrupamento = request.args.get('agrupamento')
+    if agrupamento and agrupamento not in AGRUPAMENTOS:
+        raise ValueError(f"agrupamento inválido. Valores aceitos: {', '.join(AGRUPAMENTOS)}")
+
+    return max_pontos, agrupamento or None
+
+
+def _resumo_amostragem(total_original, total_exibido, max_pontos, agrupamento):
+    return {
+        'total_pontos_originais': total_original,
+        'total_pontos': total_exibido,
+        'agrupamento': agrupamento,
+        'max_pontos': max_pontos,
+        'reduzido': total_exibido < total_original
+    }
+
+
+def _media_movel_dos_indices(media_movel, valores, indices):
+    """
+    Média móvel só nos pontos exibidos após a redução (índices de indices_reduzidos).
+    media_movel tem uma entrada por valor não nulo da série, na mesma ordem
+    """
+    posicoes = {}
+    for indice, valor in enumerate(valores):
+        if valor is not None:
+            posicoes[indice] = len(posicoes)
+    return [media_movel[posicoes[i]] for i in indices if i in posicoes]
+
+
+def _reduzir_media_movel(media_movel, total_pontos):
+    """Média móvel diária reduzida (LTTB) à quantidade de pontos da evolução agrupada"""
+    return reduzir_pontos(
+        media_movel,
+        [date.fromisoformat(m['data']) for m in media_movel],
+        [m['valor'] for m in media_movel],
+        max(total_pontos, MINIMO_PONTOS)
+    )
+
+
+def _valor_numerico_sql():
+    """Expressão SQL que converte resposta_calculada em número, ou NULL se não for numérica"""
+    return case(
+        (ChecklistResposta.resposta_calculada.regexp_match(PADRAO_NUMERICO),
+         cast(ChecklistResposta.resposta_calculada, Float)),
+        else_=None
+    )
+
+
+def _evolucao_meta_agrupada(filtros, agrupamento):
+    """Agrega notas e fórmulas por semana/mês diretamente no banco"""
+    periodo = func.date_trunc(AGRUPAMENTOS[agrupamento], ChecklistDiario.data).label('periodo')
+
+    linhas = db.session.query(
+        periodo,
+        func.avg(ChecklistDiario.nota),
+        func.min(ChecklistDiario.nota),
+        func.max(ChecklistDiario.nota),
+        func.count(ChecklistDiario.id)
+    ).filter(*filtros).group_by(periodo).order_by(periodo).all()
+
+    valor = _valor_numerico_sql()
+    formulas = db.session.query(
+        periodo,
+        ChecklistResposta.pergunta_id,
+        Pergunta.texto,
+        Pergunta.formula,
+        func.avg(valor),
+        func.count(valor)
+    ).select_from(ChecklistDiario).join(
+        ChecklistResposta, ChecklistResposta.checklist_id == ChecklistDiario.id
+    ).join(Pergunta, Pergunta.id == ChecklistResposta.pergunta_id).filter(
+        *filtros,
+        Pergunta.tipo == TipoPerguntaEnum.FORMULA
+    ).group_by(periodo, ChecklistResposta.pergunta_id, Pergunta.texto, Pergunta.formula).all()
+
+    formulas_por_periodo = {}
+    for inicio, pergunta_id, texto, formula, media, total in formulas:
+        if total:
+            formulas_por_periodo.setdefault(inicio, []).append({
+                'pergunta_id': pergunta_id,
+                'pergunta_texto': texto,
+                'formula': formula,
+                'valor_numerico': round(float(media), 2),
+                'total_registros': total
+            })
+
+    return [{
+        'data': inicio.date().isoformat(),
+        'nota': round(float(media), 2) if media is not None else None,
+        'nota_minima': minima,
+        'nota_maxima': maxima,
+        'total_registros': total,
+        'formulas_calculadas': formulas_por_periodo.get(inicio, [])
+    } for inicio, media, minima, maxima, total in linhas]
+
+
 @relatorios_bp.route('/relatorios/paciente/<int:paciente_id>', methods=['GET'])
+@coalescer
 def obter_relatorio_paciente(paciente_id):
     """
     Obtém relatório completo de um paciente
@@ -198,80 +390,114 @@ def obter_relatorio_paciente(paciente_id):
         type: integer
         required: true
         description: ID do paciente
+      - name: dias
+        in: query
+        type: integer
+        description: Tamanho da janela de registros recentes em dias (padrão 30)
     responses:
       200:
         description: Relatório do paciente
+      400:
+        description: Janela inválida
     """
     try:
-        paciente = Paciente.query.get_or_404(paciente_id)
-        planos = PlanoTerapeutico.query.filter_by(paciente_id=paciente_id).all()
-        metas_ids = [meta.id for plano in planos for meta in plano.metas_terapeuticas]
-        metas = MetaTerapeutica.query.filter(MetaTerapeutica.id.in_(metas_ids)).all() if metas_ids else []
-
-        data_limite = date.today() - timedelta(days=30)
-        registros_recentes = db.session.query(ChecklistDiario).join(MetaTerapeutica).join(PlanoTerapeutico).filter(
-            PlanoTerapeutico.paciente_id == paciente_id,
-            ChecklistDiario.data >= data_limite
-        ).order_by(ChecklistDiario.data.desc()).all()
-
-        total_metas = len(metas)
-        metas_concluidas = len([m for m in metas if m.status == StatusMetaEnum.CONCLUIDA])
-        metas_ativas = total_metas - metas_concluidas
-
-        media_notas_recentes = round(sum(r.nota for r in registros_recentes) / len(registros_recentes), 2) if registros_recentes else 0
-
-        evolucao_por_meta = {}
-        for meta in metas:
-            registros_meta = [r for r in registros_recentes if r.meta_id == meta.id]
-            if registros_meta:
-                registros_detalhados = []
-                for r in sorted(registros_meta, key=lambda x: x.data):
-                    registro_detalhado = {
-                        'data': r.data.isoformat(), 
-                        'nota': r.nota,
-                        'formulas_calculadas': []
-                    }
-                    
-                    # Incluir fórmulas calculadas
-                    for resposta in r.respostas:
-                        if resposta.pergunta and resposta.pergunta.tipo == TipoPerguntaEnum.FORMULA and resposta.resposta_calculada:
-                            try:
-                                valor_numerico = float(resposta.resposta_calculada)
-                            except (ValueError, TypeError):
-                                valor_numerico = None
-                            
-                            registro_detalhado['formulas_calculadas'].append({
-                                'pergunta_id': resposta.pergunta_id,
-                                'pergunta_texto': resposta.pergunta.texto,
-                                'formula': resposta.pergunta.formula,
-                                'valor_calculado': resposta.resposta_calculada,
-                                'valor_numerico': valor_numerico
-                            })
-                    
-                    registros_detalhados.append(registro_detalhado)
-                
-                evolucao_por_meta[meta.id] = {
-                    'meta_descricao': meta.descricao,
-                    'registros': registros_detalhados
-                }
+        dias = request.args.get('dias', type=int)
+        if dias is None:
+            dias = current_app.config.get('RELATORIO_PACIENTE_DIAS_RECENTES', JANELA_RECENTE_PADRAO)
+        if dias <= 0:
+            return jsonify({'erro': 'dias deve ser maior que zero'}), 400
 
-        return jsonify({
-            'paciente': paciente.to_dict(),
-            'resumo': {
-                'total_planos': len(planos),
-                'total_metas': total_metas,
-                'metas_ativas': metas_ativas,
-                'metas_concluidas': metas_concluidas,
-                'registros_ultimos_30_dias': len(registros_recentes),
-                'media_notas_recentes': media_notas_recentes
-            },
-            'evolucao_por_meta': evolucao_por_meta
-        }), 200
+        if not pode_acessar_paciente(paciente_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
+        paciente = Paciente.query.get_or_404(paciente_id)
+        return jsonify(_montar_relatorio_paciente(paciente, dias)), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 
+def _montar_relatorio_paciente(paciente, dias):
+    """
+    Monta o relatório do paciente com um número fixo de consultas agrupadas,
+    independente da quantidade de planos, metas e registros
+    """
+    total_planos = db.session.query(func.count(PlanoTerapeutico.id)).filter(
+        PlanoTerapeutico.paciente_id == paciente.id
+    ).scalar()
+
+    metas = db.session.query(
+        MetaTerapeutica.id, MetaTerapeutica.descricao, MetaTerapeutica.status
+    ).join(PlanoTerapeutico).filter(
+        PlanoTerapeutico.paciente_id == paciente.id
+    ).order_by(MetaTerapeutica.id).all()
+
+    data_limite = date.today() - timedelta(days=dias)
+    filtro_recentes = and_(
+        PlanoTerapeutico.paciente_id == paciente.id,
+        ChecklistDiario.data >= data_limite
+    )
+    registros_recentes = db.session.query(
+        ChecklistDiario.id, ChecklistDiario.meta_id, ChecklistDiario.data, ChecklistDiario.nota
+    ).join(MetaTerapeutica).join(PlanoTerapeutico).filter(
+        filtro_recentes
+    ).order_by(ChecklistDiario.meta_id, ChecklistDiario.data).all()
+
+    ids_recentes = db.session.query(ChecklistDiario.id).join(MetaTerapeutica).join(PlanoTerapeutico).filter(
+        filtro_recentes
+    )
+    formulas_por_checklist = _formulas_calculadas_por_checklist(ids_recentes) if registros_recentes else {}
+
+    # Agrupar registros por meta em uma única passada
+    registros_por_meta = {}
+    series_por_meta = {}
+    soma_notas = 0
+    total_notas = 0
+    for r in registros_recentes:
+        if r.nota is not None:
+            soma_notas += r.nota
+            total_notas += 1
+        registros_por_meta.setdefault(r.meta_id, []).append({
+            'data': r.data.isoformat(),
+            'nota': r.nota,
+            'formulas_calculadas': formulas_por_checklist.get(r.id, [])
+        })
+        datas, notas = series_por_meta.setdefault(r.meta_id, ([], []))
+        datas.append(r.data)
+        notas.append(r.nota)
+
+    # Estatísticas de todas as metas calculadas em uma única chamada vetorizada
+    estatisticas_por_meta = calcular_estatisticas_lote(series_por_meta)
+
+    evolucao_por_meta = {}
+    for meta in metas:
+        if meta.id in registros_por_meta:
+            evolucao_por_meta[meta.id] = {
+                'meta_descricao': meta.descricao,
+                'registros': registros_por_meta[meta.id],
+                'estatisticas': estatisticas_por_meta[meta.id]
+            }
+
+    total_metas = len(metas)
+    metas_concluidas = len([m for m in metas if m.status == StatusMetaEnum.CONCLUIDA])
+
+    return {
+        'paciente': paciente.to_dict(),
+        'resumo': {
+            'total_planos': total_planos,
+            'total_metas': total_metas,
+            'metas_ativas': total_metas - metas_concluidas,
+            'metas_concluidas': metas_concluidas,
+            'janela_dias': dias,
+            'registros_recentes': len(registros_recentes),
+            # Mantido por compatibilidade com o frontend; reflete a janela solicitada
+            'registros_ultimos_30_dias': len(registros_recentes),
+            'media_notas_recentes': round(soma_notas / total_notas, 2) if total_notas else 0
+        },
+        'evolucao_por_meta': evolucao_por_meta
+    }
+
+
 @relatorios_bp.route('/relatorios/profissional/<int:profissional_id>', methods=['GET'])
+@coalescer
 def obter_relatorio_profissional(profissional_id):
     """
     Obtém relatório de atividades de um profissional
@@ -284,43 +510,142 @@ def obter_relatorio_profissional(profissional_id):
         type: integer
         required: true
         description: ID do profissional
+      - name: data_inicio
+        in: query
+        type: string
+        format: date
+        description: Início do período de sessões e checklists (YYYY-MM-DD)
+      - name: data_fim
+        in: query
+        type: string
+        format: date
+        description: Fim do período de sessões e checklists (YYYY-MM-DD)
     responses:
       200:
         description: Relatório do profissional
+      400:
+        description: Formato de data inválido
     """
     try:
+        try:
+            data_inicio = _parse_data(request.args.get('data_inicio'))
+            data_fim = _parse_data(request.args.get('data_fim'))
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+
         profissional = Profissional.query.get_or_404(profissional_id)
-        planos = PlanoTerapeutico.query.filter_by(profissional_id=profissional_id).all()
-        pacientes_ids = [plano.paciente_id for plano in planos]
-        pacientes = Paciente.query.filter(Paciente.id.in_(pacientes_ids)).all() if pacientes_ids else []
+        return jsonify(_montar_relatorio_profissional(profissional, data_inicio, data_fim)), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
 
-        metas_ids = [meta.id for plano in planos for meta in plano.metas_terapeuticas]
-        metas = MetaTerapeutica.query.filter(MetaTerapeutica.id.in_(metas_ids)).all() if metas_ids else []
 
-        distribuicao_diagnosticos = {}
-        for paciente in pacientes:
-            diag = paciente.diagnostico.value
-            distribuicao_diagnosticos[diag] = distribuicao_diagnosticos.get(diag, 0) + 1
+def _parse_data(valor):
+    """Converte uma data YYYY-MM-DD opcional"""
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
 
-        total_metas = len(metas)
-        metas_concluidas = len([m for m in metas if m.status == StatusMetaEnum.CONCLUIDA])
 
-        return jsonify({
-            'profissional': profissional.to_dict(),
-            'resumo': {
-                'total_pacientes': len(pacientes),
-                'total_planos': len(planos),
-                'total_metas': total_metas,
-                'metas_concluidas': metas_concluidas,
-                'taxa_conclusao': round((metas_concluidas / total_metas * 100), 2) if total_metas > 0 else 0
-            },
-            'distribuicao_diagnosticos': [{'diagnostico': diag, 'count': count} for diag, count in distribuicao_diagnosticos.items()]
-        }), 200
-    except Exception as e:
-        return jsonify({'erro': str(e)}), 500
+def _montar_relatorio_profissional(profissional, data_inicio=None, data_fim=None):
+    """
+    Monta o relatório do profissional com agregações em SQL, mantendo o número
+    de consultas constante independente da quantidade de pacientes
+    """
+    # Números limitados aos pacientes acessíveis pelo usuário da requisição
+    acesso_planos = filtro_pacientes(PlanoTerapeutico.paciente_id)
+
+    # Pacientes atendidos: com plano do profissional ou com vínculo ativo
+    pacientes_ids = db.session.query(PlanoTerapeutico.paciente_id).filter(
+        PlanoTerapeutico.profissional_id == profissional.id
+    ).union(
+        db.session.query(ProfissionalPaciente.paciente_id).filter(
+            ProfissionalPaciente.profissional_id == profissional.id,
+            ProfissionalPaciente.status == StatusVinculoEnum.ATIVO
+        )
+    )
+    diagnosticos = db.session.query(
+        Paciente.diagnostico,
+        func.count(Paciente.id)
+    ).filter(Paciente.id.in_(pacientes_ids), *filtro_pacientes(Paciente.id)).group_by(Paciente.diagnostico).all()
+
+    vinculos_status = db.session.query(
+        ProfissionalPaciente.status,
+        func.count(ProfissionalPaciente.id)
+    ).filter(
+        ProfissionalPaciente.profissional_id == profissional.id,
+        *filtro_pacientes(ProfissionalPaciente.paciente_id)
+    ).group_by(ProfissionalPaciente.status).all()
+
+    total_planos, total_metas, metas_concluidas = db.session.query(
+        func.count(func.distinct(PlanoTerapeutico.id)),
+        func.count(MetaTerapeutica.id),
+        func.coalesce(func.sum(case((MetaTerapeutica.status == StatusMetaEnum.CONCLUIDA, 1), else_=0)), 0)
+    ).select_from(PlanoTerapeutico).outerjoin(MetaTerapeutica).filter(
+        PlanoTerapeutico.profissional_id == profissional.id, *acesso_planos
+    ).one()
+
+    sessoes_query = db.session.query(
+        Agenda.status,
+        func.count(Agenda.id),
+        func.coalesce(func.sum(case((Agenda.presente.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Agenda.presente.is_(False), 1), else_=0)), 0)
+    ).filter(Agenda.profissional_id == profissional.id, *filtro_pacientes(Agenda.paciente_id))
+    if data_inicio:
+        sessoes_query = sessoes_query.filter(Agenda.data_hora >= data_inicio)
+    if data_fim:
+        sessoes_query = sessoes_query.filter(Agenda.data_hora < data_fim + timedelta(days=1))
+    sessoes_status = sessoes_query.group_by(Agenda.status).all()
+
+    checklists_query = db.session.query(
+        func.count(ChecklistDiario.id),
+        func.count(func.distinct(ChecklistDiario.meta_id)),
+        func.avg(ChecklistDiario.nota)
+    ).join(MetaTerapeutica).join(PlanoTerapeutico).filter(
+        PlanoTerapeutico.profissional_id == profissional.id, *acesso_planos
+    )
+    if data_inicio:
+        checklists_query = checklists_query.filter(ChecklistDiario.data >= data_inicio)
+    if data_fim:
+        checklists_query = checklists_query.filter(ChecklistDiario.data <= data_fim)
+    total_checklists, metas_com_registro, media_notas = checklists_query.one()
+
+    sessoes_por_status = {status.value: total for status, total, _, _ in sessoes_status}
+    presentes = sum(int(p) for _, _, p, _ in sessoes_status)
+    ausentes = sum(int(a) for _, _, _, a in sessoes_status)
+    metas_concluidas = int(metas_concluidas)
+
+    return {
+        'profissional': profissional.to_dict(),
+        'periodo': {
+            'data_inicio': data_inicio.isoformat() if data_inicio else None,
+            'data_fim': data_fim.isoformat() if data_fim else None
+        },
+        'resumo': {
+            'total_pacientes': sum(count for _, count in diagnosticos),
+            'total_planos': total_planos,
+            'total_metas': total_metas,
+            'metas_concluidas': metas_concluidas,
+            'taxa_conclusao': round((metas_concluidas / total_metas * 100), 2) if total_metas > 0 else 0
+        },
+        'vinculos': {status.value: count for status, count in vinculos_status},
+        'sessoes': {
+            'total': sum(sessoes_por_status.values()),
+            'por_status': sessoes_por_status,
+            'realizadas': sessoes_por_status.get(StatusAgendamentoEnum.REALIZADO.value, 0),
+            'faltas': sessoes_por_status.get(StatusAgendamentoEnum.FALTOU.value, 0),
+            'presentes': presentes,
+            'ausentes': ausentes,
+            'taxa_presenca': round(presentes / (presentes + ausentes) * 100, 2) if presentes + ausentes > 0 else 0
+        },
+        'checklists': {
+            'total_registros': total_checklists,
+            'metas_com_registro': metas_com_registro,
+            'media_notas': round(float(media_notas), 2) if media_notas is not None else 0
+        },
+        'distribuicao_diagnosticos': [{'diagnostico': diag.value, 'count': count} for diag, count in diagnosticos]
+    }
 
 
 @relatorios_bp.route('/relatorios/periodo', methods=['GET'])
+@coalescer
 def obter_relatorio_periodo():
     """
     Obtém relatório de um período específico
@@ -354,67 +679,163 @@ def obter_relatorio_periodo():
         data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
         data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
 
-        registros = ChecklistDiario.query.filter(
-            and_(ChecklistDiario.data >= data_inicio_obj, ChecklistDiario.data <= data_fim_obj)
-        ).all()
-
-        registros_por_data = {}
-        formulas_por_data = {}
-        
-        for r in registros:
-            data_str = r.data.isoformat()
-            registros_por_data.setdefault(data_str, []).append(r.nota)
-            
-            # Coletar fórmulas calculadas por data
-            formulas_do_dia = []
-            for resposta in r.respostas:
-                if resposta.pergunta and resposta.pergunta.tipo == TipoPerguntaEnum.FORMULA and resposta.resposta_calculada:
-                    try:
-                        valor_numerico = float(resposta.resposta_calculada)
-                    except (ValueError, TypeError):
-                        valor_numerico = None
-                    
-                    formulas_do_dia.append({
-                        'pergunta_id': resposta.pergunta_id,
-                        'pergunta_texto': resposta.pergunta.texto,
-                        'formula': resposta.pergunta.formula,
-                        'valor_calculado': resposta.resposta_calculada,
-                        'valor_numerico': valor_numerico
-                    })
-            
-            if formulas_do_dia:
-                formulas_por_data[data_str] = formulas_do_dia
-
-        evolucao_diaria = []
-        for d, notas in sorted(registros_por_data.items()):
-            evolucao_dia = {
-                'data': d, 
-                'media_notas': round(sum(notas) / len(notas), 2), 
-                'total_registros': len(notas),
-                'formulas_calculadas': formulas_por_data.get(d, [])
-            }
-            evolucao_diaria.append(evolucao_dia)
-
-        if registros:
-            todas_notas = [r.nota for r in registros]
-            estatisticas = {
-                'total_registros': len(registros),
-                'media_geral': round(sum(todas_notas) / len(todas_notas), 2),
-                'nota_maxima': max(todas_notas),
-                'nota_minima': min(todas_notas)
-            }
-        else:
-            estatisticas = {'total_registros': 0, 'media_geral': 0, 'nota_maxima': 0, 'nota_minima': 0}
-
-        return jsonify({
-            'periodo': {'data_inicio': data_inicio, 'data_fim': data_fim},
-            'evolucao_diaria': evolucao_diaria,
-            'estatisticas': estatisticas
-        }), 200
+        return jsonify(_montar_relatorio_periodo(data_inicio_obj, data_fim_obj)), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 
+def _montar_relatorio_periodo(data_inicio, data_fim):
+    """Evolução diária e estatísticas dos checklists do período (datas inclusivas)"""
+    registros = ChecklistDiario.query.filter(
+        and_(ChecklistDiario.data >= data_inicio, ChecklistDiario.data <= data_fim),
+        *filtro_metas(ChecklistDiario.meta_id)
+    ).all()
+
+    registros_por_data = {}
+    formulas_por_data = {}
+
+    for r in registros:
+        data_str = r.data.isoformat()
+        registros_por_data.setdefault(data_str, []).append(r.nota)
+
+        # Coletar fórmulas calculadas por data
+        formulas_do_dia = []
+        for resposta in r.respostas:
+            if resposta.pergunta and resposta.pergunta.tipo == TipoPerguntaEnum.FORMULA and resposta.resposta_calculada:
+                try:
+                    valor_numerico = float(resposta.resposta_calculada)
+                except (ValueError, TypeError):
+                    valor_numerico = None
+
+                formulas_do_dia.append({
+                    'pergunta_id': resposta.pergunta_id,
+                    'pergunta_texto': resposta.pergunta.texto,
+                    'formula': resposta.pergunta.formula,
+                    'valor_calculado': resposta.resposta_calculada,
+                    'valor_numerico': valor_numerico,
+                    'valor_janela': resposta.resposta_janela
+                })
+
+        if formulas_do_dia:
+            formulas_por_data[data_str] = formulas_do_dia
+
+    evolucao_diaria = []
+    for d, notas in sorted(registros_por_data.items()):
+        evolucao_dia = {
+            'data': d, 
+            'media_notas': round(sum(notas) / len(notas), 2), 
+            'total_registros': len(notas),
+            'formulas_calculadas': formulas_por_data.get(d, [])
+        }
+        evolucao_diaria.append(evolucao_dia)
+
+    if registros:
+        todas_notas = [r.nota for r in registros]
+        estatisticas = {
+            'total_registros': len(registros),
+            'media_geral': round(sum(todas_notas) / len(todas_notas), 2),
+            'nota_maxima': max(todas_notas),
+            'nota_minima': min(todas_notas)
+        }
+    else:
+        estatisticas = {'total_registros': 0, 'media_geral': 0, 'nota_maxima': 0, 'nota_minima': 0}
+
+    return {
+        'periodo': {'data_inicio': data_inicio.isoformat(), 'data_fim': data_fim.isoformat()},
+        'evolucao_diaria': evolucao_diaria,
+        'estatisticas': estatisticas
+    }
+
+
+# --- Relatórios em segundo plano (POST /api/tarefas, ver services.tarefas) ---
+
+def _inteiro(parametros, nome, padrao=None):
+    valor = parametros.get(nome, padrao)
+    if valor is None:
+        raise ValueError(f'{nome} é obrigatório')
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'{nome} deve ser um número inteiro')
+
+
+def _data_parametro(parametros, nome, obrigatorio=False):
+    if obrigatorio and not parametros.get(nome):
+        raise ValueError(f'{nome} é obrigatório')
+    try:
+        data = _parse_data(parametros.get(nome))
+    except (TypeError, ValueError):
+        raise ValueError('Formato de data inválido. Use YYYY-MM-DD')
+    return data.isoformat() if data else None
+
+
+def _intervalo_parametros(parametros, obrigatorio=False):
+    """data_inicio e data_fim (ISO) dos parâmetros; rejeita intervalo invertido"""
+    data_inicio = _data_parametro(parametros, 'data_inicio', obrigatorio)
+    data_fim = _data_parametro(parametros, 'data_fim', obrigatorio)
+    if data_inicio and data_fim and data_inicio > data_fim:
+        raise ValueError('data_inicio deve ser anterior ou igual a data_fim')
+    return {'data_inicio': data_inicio, 'data_fim': data_fim}
+
+
+def _paciente_da_tarefa(paciente_id):
+    if not pode_acessar_paciente(paciente_id):
+        raise PermissionError('Acesso negado')
+    paciente = db.session.get(Paciente, paciente_id)
+    if paciente is None:
+        raise LookupError('Paciente não encontrado')
+    return paciente
+
+
+def _profissional_da_tarefa(profissional_id):
+    profissional = db.session.get(Profissional, profissional_id)
+    if profissional is None:
+        raise LookupError('Profissional não encontrado')
+    return profissional
+
+
+def _validar_tarefa_paciente(parametros):
+    paciente_id = _inteiro(parametros, 'paciente_id')
+    dias = _inteiro(
+        parametros, 'dias', current_app.config.get('RELATORIO_PACIENTE_DIAS_RECENTES', JANELA_RECENTE_PADRAO)
+    )
+    if dias <= 0:
+        raise ValueError('dias deve ser maior que zero')
+    _paciente_da_tarefa(paciente_id)
+    return {'paciente_id': paciente_id, 'dias': dias}
+
+
+def _validar_tarefa_profissional(parametros):
+    profissional_id = _inteiro(parametros, 'profissional_id')
+    intervalo = _intervalo_parametros(parametros)
+    _profissional_da_tarefa(profissional_id)
+    return {'profissional_id': profissional_id, **intervalo}
+
+
+def _validar_tarefa_periodo(parametros):
+    return _intervalo_parametros(parametros, obrigatorio=True)
+
+
+@tipo_tarefa('relatorio_paciente', _validar_tarefa_paciente, limite=2)
+def _tarefa_relatorio_paciente(parametros):
+    paciente = _paciente_da_tarefa(parametros['paciente_id'])
+    return _montar_relatorio_paciente(paciente, parametros['dias'])
+
+
+@tipo_tarefa('relatorio_profissional', _validar_tarefa_profissional, limite=2)
+def _tarefa_relatorio_profissional(parametros):
+    return _montar_relatorio_profissional(
+        _profissional_da_tarefa(parametros['profissional_id']),
+        _parse_data(parametros['data_inicio']),
+        _parse_data(parametros['data_fim'])
+    )
+
+
+@tipo_tarefa('relatorio_periodo', _validar_tarefa_periodo, limite=1)
+def _tarefa_relatorio_periodo(parametros):
+    return _montar_relatorio_periodo(_parse_data(parametros['data_inicio']), _parse_data(parametros['data_fim']))
+
+
 @relatorios_bp.route('/relatorios/formulas/<int:meta_id>', methods=['GET'])
 def obter_relatorio_formulas(meta_id):
     """
@@ -474,16 +895,20 @@ def obter_relatorio_formulas(meta_id):
                     properties:
                       pergunta_id: { type: integer }
                       media_valor: { type: number }
+      403:
+        description: Acesso negado à meta
     """
     try:
         data_inicio = request.args.get('data_inicio')
         data_fim = request.args.get('data_fim')
 
         # Buscar a meta
+        if not pode_acessar_meta(meta_id):
+            return jsonify({'erro': 'Acesso negado'}), 403
         meta = MetaTerapeutica.query.get_or_404(meta_id)
         
         # Buscar checklists da meta
-        query = ChecklistDiario.query.filter_by(meta_id=meta_id)
+        query = ChecklistDiario.query.filter(ChecklistDiario.meta_id == meta_id, *filtro_metas(ChecklistDiario.meta_id))
         
         if data_inicio:
             query = query.filter(ChecklistDiario.data >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
@@ -519,6 +944,7 @@ def obter_relatorio_formulas(meta_id):
                             'data': checklist.data.isoformat(),
                             'valor_calculado': resposta.resposta_calculada,
                             'valor_numerico': valor_numerico,
+                            'valor_janela': resposta.resposta_janela,
                             'checklist_id': checklist.id
                         })
                     except (ValueError, TypeError):
@@ -526,6 +952,7 @@ def obter_relatorio_formulas(meta_id):
                             'data': checklist.data.isoformat(),
                             'valor_calculado': resposta.resposta_calculada,
                             'valor_numerico': None,
+                            'valor_janela': resposta.resposta_janela,
                             'checklist_id': checklist.id
                         })
             
@@ -591,13 +1018,31 @@ def obter_evolucao_formula(pergunta_id):
         type: string
         format: date
         description: Data final (YYYY-MM-DD)
+      - name: max_pontos
+        in: query
+        type: integer
+        description: Reduz a série para no máximo N pontos preservando sua forma (LTTB)
+      - name: agrupamento
+        in: query
+        type: string
+        enum: [semana, mes]
+        description: Agrega os valores por semana ou mês
     responses:
       200:
         description: Evolução da fórmula
+      400:
+        description: Parâmetros inválidos
     """
     try:
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
+        try:
+            data_inicio = _parse_data(request.args.get('data_inicio'))
+            data_fim = _parse_data(request.args.get('data_fim'))
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+        try:
+            max_pontos, agrupamento = _parametros_amostragem()
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
         
         # Buscar a pergunta
         pergunta = Pergunta.query.get_or_404(pergunta_id)
@@ -605,66 +1050,115 @@ def obter_evolucao_formula(pergunta_id):
         if pergunta.tipo != TipoPerguntaEnum.FORMULA:
             return jsonify({'erro': 'Pergunta não é do tipo fórmula'}), 400
         
-        # Buscar respostas calculadas
-        query = db.session.query(ChecklistResposta).join(ChecklistDiario).filter(
+        filtros = [
             ChecklistResposta.pergunta_id == pergunta_id,
-            ChecklistResposta.resposta_calculada.isnot(None)
-        )
-        
+            ChecklistResposta.resposta_calculada.isnot(None),
+            *filtro_metas(ChecklistDiario.meta_id)
+        ]
         if data_inicio:
-            query = query.filter(ChecklistDiario.data >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
+            filtros.append(ChecklistDiario.data >= data_inicio)
         if data_fim:
-            query = query.filter(ChecklistDiario.data <= datetime.strptime(data_fim, '%Y-%m-%d').date())
-        
-        respostas = query.order_by(ChecklistDiario.data).all()
+            filtros.append(ChecklistDiario.data <= data_fim)
+
+        # Buscar respostas calculadas já com checklist e meta em uma única consulta
+        respostas = db.session.query(
+            ChecklistResposta.checklist_id,
+            ChecklistResposta.resposta_calculada,
+            ChecklistResposta.resposta_janela,
+            ChecklistDiario.data,
+            ChecklistDiario.meta_id,
+            MetaTerapeutica.descricao
+        ).join(ChecklistDiario, ChecklistDiario.id == ChecklistResposta.checklist_id).outerjoin(
+            MetaTerapeutica, MetaTerapeutica.id == ChecklistDiario.meta_id
+        ).filter(*filtros).order_by(ChecklistDiario.data).all()
         
         # Organizar dados de evolução
         evolucao = []
-        valores_numericos = []
+        valores = []
         
         for resposta in respostas:
             try:
                 valor_numerico = float(resposta.resposta_calculada)
-                valores_numericos.append(valor_numerico)
             except (ValueError, TypeError):
                 valor_numerico = None
+            valores.append(valor_numerico)
             
             evolucao.append({
-                'data': resposta.checklist.data.isoformat(),
+                'data': resposta.data.isoformat(),
                 'valor_calculado': resposta.resposta_calculada,
                 'valor_numerico': valor_numerico,
+                'valor_janela': resposta.resposta_janela,
                 'checklist_id': resposta.checklist_id,
-                'meta_id': resposta.checklist.meta_id,
-                'meta_descricao': resposta.checklist.meta.descricao if resposta.checklist.meta else None
+                'meta_id': resposta.meta_id,
+                'meta_descricao': resposta.descricao
             })
+        datas = [r.data for r in respostas]
         
-        # Calcular estatísticas
+        # Calcular estatísticas sobre a série completa
         estatisticas = {
             'total_registros': len(evolucao),
             'formula': pergunta.formula,
             'pergunta_texto': pergunta.texto
         }
         
-        if valores_numericos:
-            estatisticas.update({
-                'media': round(sum(valores_numericos) / len(valores_numericos), 2),
-                'maximo': max(valores_numericos),
-                'minimo': min(valores_numericos),
-                'tendencia': 'crescente' if len(valores_numericos) > 1 and valores_numericos[-1] > valores_numericos[0] else 'decrescente' if len(valores_numericos) > 1 and valores_numericos[-1] < valores_numericos[0] else 'estável'
-            })
-        else:
-            estatisticas.update({
-                'media': 0,
-                'maximo': 0,
-                'minimo': 0,
-                'tendencia': 'sem_dados'
-            })
+        serie = calcular_estatisticas(datas, valores)
+        estatisticas.update({
+            'media': serie['media'],
+            'maximo': serie['maximo'],
+            'minimo': serie['minimo'],
+            'tendencia': serie['tendencia'],
+            'inclinacao': serie['inclinacao'],
+            'variancia': serie['variancia'],
+            'desvio_padrao': serie['desvio_padrao'],
+            'percentis': serie['percentis'],
+            'media_movel': serie['media_movel']
+        })
+        
+        total_original = len(evolucao)
+        if agrupamento:
+            evolucao, datas = _evolucao_formula_agrupada(filtros, agrupamento)
+            valores = [p['valor_numerico'] for p in evolucao]
+            if max_pontos:
+                evolucao = reduzir_pontos(evolucao, datas, valores, max_pontos)
+            estatisticas['media_movel'] = _reduzir_media_movel(serie['media_movel'], len(evolucao))
+        elif max_pontos and len(evolucao) > max_pontos:
+            indices = indices_reduzidos(datas, valores, max_pontos)
+            evolucao = [evolucao[i] for i in indices]
+            estatisticas['media_movel'] = _media_movel_dos_indices(serie['media_movel'], valores, indices)
         
         return jsonify({
             'pergunta': pergunta.to_dict(),
             'evolucao': evolucao,
-            'estatisticas': estatisticas
+            'estatisticas': estatisticas,
+            'amostragem': _resumo_amostragem(total_original, len(evolucao), max_pontos, agrupamento)
         }), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
+
+
+def _evolucao_formula_agrupada(filtros, agrupamento):
+    """Agrega os valores numéricos de uma fórmula por semana/mês diretamente no banco"""
+    periodo = func.date_trunc(AGRUPAMENTOS[agrupamento], ChecklistDiario.data).label('periodo')
+    valor = _valor_numerico_sql()
+
+    linhas = db.session.query(
+        periodo,
+        func.avg(valor),
+        func.min(valor),
+        func.max(valor),
+        func.count(valor),
+        func.count(ChecklistResposta.id)
+    ).select_from(ChecklistResposta).join(
+        ChecklistDiario, ChecklistDiario.id == ChecklistResposta.checklist_id
+    ).filter(*filtros).group_by(periodo).order_by(periodo).all()
+
+    pontos = [{
+        'data': inicio.date().isoformat(),
+        'valor_numerico': round(float(media), 2) if media is not None else None,
+        'valor_minimo': minimo,
+        'valor_maximo': maximo,
+        'total_numericos': numericos,
+        'total_registros': total
+    } for inicio, media, minimo, maximo, numericos, total in linhas]
+    return pontos, [inicio.date() for inicio, *_ in linhas]
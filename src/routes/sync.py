@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, current_app, g
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload, selectinload
+from src.models import (
+    db, Paciente, Agenda, MetaTerapeutica, ChecklistDiario, ChecklistResposta,
+    Formulario, ProfissionalPaciente, RegistroExclusao, TipoUsuarioEnum
+)
+from src.services.acesso import (
+    metas_dos_pacientes, pacientes_da_requisicao, restringir_metas, restringir_pacientes
+)
+
+sync_bp = Blueprint('sync', __name__)
+
+# Folga (em segundos) aplicada ao cursor devolvido, para não perder registros de
+# transações que gravaram atualizado_em antes do cursor mas só confirmaram depois
+SYNC_MARGEM_SEGUNDOS_PADRAO = 5
+
+
+def _consulta_pacientes():
+    return restringir_pacientes(Paciente.query, Paciente.id)
+
+
+def _consulta_agenda():
+    return restringir_pacientes(
+        Agenda.query.options(joinedload(Agenda.paciente), joinedload(Agenda.profissional)), Agenda.paciente_id
+    )
+
+
+def _consulta_metas():
+    return restringir_metas(MetaTerapeutica.query.options(
+        selectinload(MetaTerapeutica.formularios).selectinload(Formulario.perguntas)
+    ), MetaTerapeutica.id)
+
+
+def _consulta_checklists():
+    return restringir_metas(ChecklistDiario.query.options(
+        joinedload(ChecklistDiario.meta)
+        .selectinload(MetaTerapeutica.formularios)
+        .selectinload(Formulario.perguntas),
+        selectinload(ChecklistDiario.respostas).joinedload(ChecklistResposta.pergunta)
+    ), ChecklistDiario.meta_id)
+
+
+def _pacientes_de(pacientes):
+    return Paciente.id.in_(pacientes)
+
+
+def _agenda_de(pacientes):
+    return Agenda.paciente_id.in_(pacientes)
+
+
+def _metas_de(pacientes):
+    return MetaTerapeutica.id.in_(metas_dos_pacientes(pacientes))
+
+
+def _checklists_de(pacientes):
+    return ChecklistDiario.meta_id.in_(metas_dos_pacientes(pacientes))
+
+
+# Nome da entidade na resposta -> (modelo, consulta com carregamento antecipado,
+# condição SQL que limita os registros a um conjunto de pacientes)
+ENTIDADES = {
+    'pacientes': (Paciente, _consulta_pacientes, _pacientes_de),
+    'agenda': (Agenda, _consulta_agenda, _agenda_de),
+    'metas_terapeuticas': (MetaTerapeutica, _consulta_metas, _metas_de),
+    'checklists_diarios': (ChecklistDiario, _consulta_checklists, _checklists_de),
+}
+
+
+def _mudancas_de_acesso(desde, pacientes):
+    """
+    Pacientes que entraram e que saíram do acesso do profissional desde o cursor, pelos vínculos
+    alterados ou excluídos nesse intervalo: (entraram, sairam). Os que entraram recebem todos os
+    registros, mesmo os antigos; os que saíram têm os registros removidos no cliente
+    """
+    usuario = g.get('usuario')
+    if usuario is None or usuario.tipo_usuario != TipoUsuarioEnum.PROFISSIONAL or not usuario.profissional_id:
+        return frozenset(), frozenset()
+
+    alterados = {
+        paciente_id for (paciente_id,) in db.session.query(ProfissionalPaciente.paciente_id).filter(
+            ProfissionalPaciente.profissional_id == usuario.profissional_id,
+            ProfissionalPaciente.atualizado_em >= desde
+        )
+    }
+    alterados |= {
+        paciente_id for (paciente_id,) in db.session.query(RegistroExclusao.paciente_id).filter(
+            RegistroExclusao.tabela == ProfissionalPaciente.__tablename__,
+            RegistroExclusao.profissional_id == usuario.profissional_id,
+            RegistroExclusao.excluido_em >= desde
+        )
+    }
+    return frozenset(alterados & pacientes), frozenset(alterados - pacientes)
+
+
+@sync_bp.route('/sync', methods=['GET'])
+def sincronizar():
+    """
+    Retorna apenas os registros alterados ou excluídos desde o último cursor
+    ---
+    tags:
+      - Sincronização
+    parameters:
+      - name: desde
+        in: query
+        type: string
+        description: Cursor devolvido pela sincronização anterior (omitir na primeira carga)
+      - name: entidades
+        in: query
+        type: string
+        description: Lista separada por vírgulas (pacientes, agenda, metas_terapeuticas, checklists_diarios)
+    responses:
+      200:
+        description: |
+          Registros alterados, exclusões e o próximo cursor. As exclusões incluem os registros
+          dos pacientes que deixaram de ser acessíveis desde o cursor
+      400:
+        description: Cursor ou entidade inválidos
+    """
+    try:
+        desde = None
+        if request.args.get('desde'):
+            try:
+                desde = datetime.fromisoformat(request.args['desde'])
+            except ValueError:
+                return jsonify({'erro': 'Cursor inválido. Use o valor retornado em "cursor"'}), 400
+
+        nomes = list(ENTIDADES)
+        if request.args.get('entidades'):
+            nomes = [n.strip() for n in request.args['entidades'].split(',') if n.strip()]
+            invalidas = [n for n in nomes if n not in ENTIDADES]
+            if invalidas:
+                return jsonify({'erro': f'Entidades inválidas: {", ".join(invalidas)}'}), 400
+
+        # O cursor é fixado antes das consultas: alterações concorrentes entram na próxima sincronização
+        margem = current_app.config.get('SYNC_MARGEM_SEGUNDOS', SYNC_MARGEM_SEGUNDOS_PADRAO)
+        cursor = datetime.utcnow() - timedelta(seconds=margem)
+
+        pacientes = pacientes_da_requisicao()
+        usuario = g.get('usuario')
+        # Usuário alterado desde o cursor (ex.: paciente ou profissional trocado): o acesso pode ter
+        # mudado por inteiro, então a resposta é uma carga completa
+        if desde is not None and pacientes is not None and usuario is not None and usuario.atualizado_em >= desde:
+            desde = None
+
+        entraram = sairam = frozenset()
+        if desde is not None and pacientes is not None:
+            entraram, sairam = _mudancas_de_acesso(desde, pacientes)
+
+        resultado = {'cursor': cursor.isoformat(), 'completo': desde is None}
+        for nome in nomes:
+            modelo, consulta, dos_pacientes = ENTIDADES[nome]
+            query = consulta()
+            if desde is not None:
+                alterados = modelo.atualizado_em >= desde
+                query = query.filter(or_(alterados, dos_pacientes(entraram)) if entraram else alterados)
+            resultado[nome] = [obj.to_dict() for obj in query.order_by(modelo.atualizado_em, modelo.id)]
+
+        # Na primeira carga não há o que remover no cliente
+        exclusoes = {nome: [] for nome in nomes}
+        if desde is not None:
+            tabelas = {ENTIDADES[nome][0].__tablename__: nome for nome in nomes}
+            registros = db.session.query(RegistroExclusao.tabela, RegistroExclusao.registro_id).filter(
+                RegistroExclusao.excluido_em >= desde,
+                RegistroExclusao.tabela.in_(tabelas)
+            )
+            if pacientes is not None:
+                # Só exclusões de registros que o usuário podia ver
+                registros = registros.filter(RegistroExclusao.paciente_id.in_(pacientes | sairam))
+            for tabela, registro_id in registros:
+                exclusoes[tabelas[tabela]].append(registro_id)
+
+            # Registros ainda existentes dos pacientes que saíram do acesso
+            if sairam:
+                for nome in nomes:
+                    modelo, _, dos_pacientes = ENTIDADES[nome]
+                    exclusoes[nome].extend(
+                        registro_id for (registro_id,) in db.session.query(modelo.id).filter(dos_pacientes(sairam))
+                    )
+        resultado['exclusoes'] = exclusoes
+
+        return jsonify(resultado), 200
+
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
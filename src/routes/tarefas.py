@@ -0,0 +1,206 @@
+import click
+from flask import Blueprint, Response, g, jsonify, request, url_for
+from src.models import db, Tarefa, StatusTarefaEnum, TipoUsuarioEnum
+from src.services.tarefas import FilaCheia, limpar_tarefas, submeter, tipos_registrados
+
+tarefas_bp = Blueprint('tarefas', __name__)
+
+# Quantidade máxima de tarefas devolvidas na listagem
+LIMITE_LISTAGEM = 50
+
+
+def _consulta_tarefas():
+    """Tarefas visíveis ao usuário: as próprias; administradores (ou autenticação desligada) veem todas"""
+    usuario = g.get('usuario')
+    if usuario is None or usuario.tipo_usuario == TipoUsuarioEnum.ADMIN:
+        return Tarefa.query
+    return Tarefa.query.filter(Tarefa.usuario_id == usuario.id)
+
+
+@tarefas_bp.route('/tarefas', methods=['POST'])
+def criar_tarefa():
+    """
+    Agenda um relatório pesado para execução em segundo plano
+    ---
+    tags:
+      - Tarefas
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - tipo
+          properties:
+            tipo:
+              type: string
+              enum: [relatorio_paciente, relatorio_profissional, relatorio_periodo]
+            parametros:
+              type: object
+              description: |
+                relatorio_paciente: paciente_id, dias (opcional)
+                relatorio_profissional: profissional_id, data_inicio e data_fim (opcionais)
+                relatorio_periodo: data_inicio, data_fim (YYYY-MM-DD)
+    responses:
+      202:
+        description: Tarefa criada; acompanhe em GET /tarefas/{tarefa_id}
+      400:
+        description: Tipo ou parâmetros inválidos
+      403:
+        description: Acesso negado ao paciente
+      404:
+        description: Paciente ou profissional não encontrado
+      503:
+        description: Fila do tipo de tarefa cheia
+    """
+    try:
+        dados = request.get_json(silent=True) or {}
+        if not dados.get('tipo'):
+            return jsonify({'erro': f"tipo é obrigatório. Use: {', '.join(tipos_registrados())}"}), 400
+        parametros = dados.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            return jsonify({'erro': 'parametros deve ser um objeto'}), 400
+
+        usuario = g.get('usuario')
+        try:
+            tarefa = submeter(dados['tipo'], parametros, usuario.id if usuario else None)
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
+        except PermissionError as e:
+            return jsonify({'erro': str(e)}), 403
+        except LookupError as e:
+            return jsonify({'erro': str(e)}), 404
+        except FilaCheia as e:
+            return jsonify({'erro': str(e)}), 503
+
+        response = jsonify(tarefa.to_dict())
+        response.headers['Location'] = url_for('tarefas.obter_tarefa', tarefa_id=tarefa.id)
+        return response, 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+
+@tarefas_bp.route('/tarefas', methods=['GET'])
+def listar_tarefas():
+    """
+    Lista as tarefas mais recentes do usuário
+    ---
+    tags:
+      - Tarefas
+    parameters:
+      - name: status
+        in: query
+        type: string
+        enum: [PENDENTE, EXECUTANDO, CONCLUIDA, ERRO]
+        description: Filtrar por status
+      - name: tipo
+        in: query
+        type: string
+        description: Filtrar por tipo
+    responses:
+      200:
+        description: Lista de tarefas (sem o resultado)
+    """
+    try:
+        query = _consulta_tarefas()
+
+        status = request.args.get('status')
+        if status:
+            if status not in StatusTarefaEnum.__members__:
+                return jsonify({'erro': 'Status inválido'}), 400
+            query = query.filter(Tarefa.status == StatusTarefaEnum[status])
+
+        tipo = request.args.get('tipo')
+        if tipo:
+            query = query.filter(Tarefa.tipo == tipo)
+
+        tarefas = query.order_by(Tarefa.criado_em.desc()).limit(LIMITE_LISTAGEM).all()
+        return jsonify([tarefa.to_dict() for tarefa in tarefas]), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+
+@tarefas_bp.route('/tarefas/<int:tarefa_id>', methods=['GET'])
+def obter_tarefa(tarefa_id):
+    """
+    Obtém o status de uma tarefa
+    ---
+    tags:
+      - Tarefas
+    parameters:
+      - name: tarefa_id
+        in: path
+        type: integer
+        required: true
+        description: ID da tarefa
+    responses:
+      200:
+        description: Tarefa (com resultado_url quando concluída)
+      404:
+        description: Tarefa não encontrada
+    """
+    try:
+        tarefa = _consulta_tarefas().filter(Tarefa.id == tarefa_id).first()
+        if tarefa is None:
+            return jsonify({'erro': 'Tarefa não encontrada'}), 404
+
+        dados = tarefa.to_dict()
+        if tarefa.status == StatusTarefaEnum.CONCLUIDA:
+            dados['resultado_url'] = url_for('tarefas.obter_resultado_tarefa', tarefa_id=tarefa.id)
+        return jsonify(dados), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+
+@tarefas_bp.route('/tarefas/<int:tarefa_id>/resultado', methods=['GET'])
+def obter_resultado_tarefa(tarefa_id):
+    """
+    Obtém o resultado (JSON do relatório) de uma tarefa concluída
+    ---
+    tags:
+      - Tarefas
+    parameters:
+      - name: tarefa_id
+        in: path
+        type: integer
+        required: true
+        description: ID da tarefa
+      - name: download
+        in: query
+        type: boolean
+        description: Enviar como arquivo anexo
+    responses:
+      200:
+        description: Resultado do relatório, igual ao do endpoint síncrono
+      404:
+        description: Tarefa não encontrada
+      409:
+        description: Tarefa ainda não concluída ou terminada com erro
+    """
+    try:
+        tarefa = _consulta_tarefas().filter(Tarefa.id == tarefa_id).first()
+        if tarefa is None:
+            return jsonify({'erro': 'Tarefa não encontrada'}), 404
+        if tarefa.status != StatusTarefaEnum.CONCLUIDA:
+            return jsonify({
+                'erro': tarefa.erro or 'Tarefa ainda não concluída',
+                'status': tarefa.status.value
+            }), 409
+
+        # O resultado já está serializado: vai direto para a resposta
+        response = Response(tarefa.resultado, mimetype='application/json')
+        if request.args.get('download', '').lower() in ('1', 'true'):
+            response.headers['Content-Disposition'] = f'attachment; filename={tarefa.tipo}_{tarefa.id}.json'
+        return response
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+
+@tarefas_bp.cli.command('limpar')
+def limpar_tarefas_comando():
+    """Remove as tarefas antigas e encerra as interrompidas"""
+    removidas, interrompidas = limpar_tarefas()
+    db.session.commit()
+    click.echo(f'{removidas} tarefas removidas, {interrompidas} marcadas como interrompidas')
@@ -1,12 +1,14 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.services.autenticacao import requer_permissao
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
+@requer_permissao('administrar')
 def get_users():
     """
-    Lista todos os usuários
+    Lista todos os usuários (somente administradores)
     ---
     tags:
       - Usuários
@@ -30,6 +32,7 @@ def get_users():
 
 
 @user_bp.route('/users', methods=['POST'])
+@requer_permissao('administrar')
 def create_user():
     """
     Cria um novo usuário
@@ -73,6 +76,7 @@ def create_user():
 
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@requer_permissao('administrar')
 def get_user(user_id):
     """
     Busca um usuário pelo ID
@@ -105,6 +109,7 @@ def get_user(user_id):
 
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
+@requer_permissao('administrar')
 def update_user(user_id):
     """
     Atualiza os dados de um usuário
@@ -153,6 +158,7 @@ def update_user(user_id):
 
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@requer_permissao('administrar')
 def delete_user(user_id):
     """
     Exclui um usuário
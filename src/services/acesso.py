@@ -0,0 +1,159 @@
+import threading
+import time
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from src.models import (
+    db, MetaTerapeutica, PlanoTerapeutico, ProfissionalPaciente, StatusVinculoEnum, TipoUsuarioEnum
+)
+from src.services.versao_tabela import VersaoTabela
+
+# Tempo (em segundos) que os pacientes de um profissional ficam em cache no processo
+ACESSO_CACHE_TTL_PADRAO = 300
+# Intervalo (em segundos) entre as verificações de vínculos alterados por outros processos:
+# é o maior atraso para um vínculo inativado valer em todos os processos
+ACESSO_VERIFICACAO_SEGUNDOS_PADRAO = 5
+TAMANHO_MAXIMO_CACHE = 10000
+
+_cache = {}  # profissional_id -> (expira_em, carregado_em, frozenset de paciente_ids)
+_lock = threading.Lock()
+_versao_vinculos = VersaoTabela(ProfissionalPaciente, 'ACESSO_VERIFICACAO_SEGUNDOS', ACESSO_VERIFICACAO_SEGUNDOS_PADRAO)
+
+
+def pacientes_acessiveis(usuario):
+    """
+    Pacientes que o usuário pode acessar: frozenset de ids, ou None quando não há
+    restrição (administrador, ou autenticação desligada e nenhum usuário na requisição)
+    Profissionais acessam os pacientes com vínculo ativo; responsáveis, apenas o próprio paciente
+    """
+    if usuario is None or usuario.tipo_usuario == TipoUsuarioEnum.ADMIN:
+        return None
+    if usuario.tipo_usuario == TipoUsuarioEnum.PROFISSIONAL and usuario.profissional_id:
+        return pacientes_do_profissional(usuario.profissional_id)
+    if usuario.tipo_usuario == TipoUsuarioEnum.RESPONSAVEL and usuario.paciente_id:
+        return frozenset((usuario.paciente_id,))
+    return frozenset()
+
+
+def pacientes_do_profissional(profissional_id):
+    """
+    Pacientes com vínculo ativo do profissional, do cache do processo ou do banco
+    (após o TTL ou quando algum vínculo foi alterado, em qualquer processo, depois da carga)
+    """
+    agora = time.monotonic()
+    item = _cache.get(profissional_id)
+    if item is not None and item[0] > agora and not _versao_vinculos.alterada_desde(item[1]):
+        return item[2]
+
+    pacientes = frozenset(
+        paciente_id for (paciente_id,) in db.session.query(ProfissionalPaciente.paciente_id).filter(
+            ProfissionalPaciente.profissional_id == profissional_id,
+            ProfissionalPaciente.status == StatusVinculoEnum.ATIVO
+        )
+    )
+    ttl = current_app.config.get('ACESSO_CACHE_TTL_SEGUNDOS', ACESSO_CACHE_TTL_PADRAO)
+    with _lock:
+        _cache[profissional_id] = (agora + ttl, agora, pacientes)
+        while len(_cache) > TAMANHO_MAXIMO_CACHE:
+            _cache.pop(next(iter(_cache)))
+    return pacientes
+
+
+def pacientes_da_requisicao():
+    """Pacientes acessíveis pelo usuário autenticado da requisição (None = sem restrição)"""
+    if not has_app_context():
+        return None
+    return pacientes_acessiveis(g.get('usuario'))
+
+
+def pode_acessar_paciente(paciente_id):
+    pacientes = pacientes_da_requisicao()
+    return pacientes is None or paciente_id in pacientes
+
+
+def pode_acessar_meta(meta_id):
+    """Se a meta é de um paciente acessível; sem consulta ao banco quando não há restrição"""
+    pacientes = pacientes_da_requisicao()
+    if pacientes is None:
+        return True
+    return db.session.query(
+        select(MetaTerapeutica.id).join(
+            PlanoTerapeutico, PlanoTerapeutico.id == MetaTerapeutica.plano_id
+        ).where(MetaTerapeutica.id == meta_id, PlanoTerapeutico.paciente_id.in_(pacientes)).exists()
+    ).scalar()
+
+
+def filtro_pacientes(coluna):
+    """
+    Condições SQL que limitam coluna (um paciente_id) aos pacientes acessíveis:
+    lista vazia quando não há restrição, para uso em .filter(*condicoes)
+    """
+    pacientes = pacientes_da_requisicao()
+    if pacientes is None:
+        return []
+    return [coluna.in_(pacientes)]
+
+
+def filtro_metas(coluna_meta_id):
+    """Condições SQL que limitam coluna_meta_id às metas dos pacientes acessíveis"""
+    pacientes = pacientes_da_requisicao()
+    if pacientes is None:
+        return []
+    return [coluna_meta_id.in_(metas_dos_pacientes(pacientes))]
+
+
+def metas_dos_pacientes(pacientes):
+    """Subconsulta com os ids das metas dos pacientes informados"""
+    return select(MetaTerapeutica.id).join(
+        PlanoTerapeutico, PlanoTerapeutico.id == MetaTerapeutica.plano_id
+    ).where(PlanoTerapeutico.paciente_id.in_(pacientes))
+
+
+def restringir_pacientes(consulta, coluna):
+    """Filtra a consulta (em SQL) pelos pacientes acessíveis; coluna: coluna com o paciente_id"""
+    return consulta.filter(*filtro_pacientes(coluna))
+
+
+def restringir_metas(consulta, coluna_meta_id):
+    """Filtra a consulta pelas metas dos pacientes acessíveis; coluna_meta_id: coluna com o meta_id"""
+    return consulta.filter(*filtro_metas(coluna_meta_id))
+
+
+def invalidar_profissional(profissional_id):
+    with _lock:
+        _cache.pop(profissional_id, None)
+
+
+def limpar_cache():
+    with _lock:
+        _cache.clear()
+    _versao_vinculos.reiniciar()
+
+
+@event.listens_for(Session, 'after_flush')
+def registrar_vinculos_alterados(session, flush_context):
+    """Guarda os profissionais dos vínculos criados, alterados ou excluídos até o commit"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, ProfissionalPaciente):
+            continue
+        historico = inspect(obj).attrs.profissional_id.history
+        for profissional_id in (obj.profissional_id, *historico.deleted):
+            if profissional_id is not None:
+                session.info.setdefault('profissionais_alterados', set()).add(profissional_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidar_vinculos_alterados(session):
+    """
+    Renova na hora, neste processo, o acesso dos profissionais com vínculos alterados;
+    os demais processos percebem a alteração na próxima verificação (_versao_vinculos)
+    """
+    for profissional_id in session.info.pop('profissionais_alterados', ()):
+        invalidar_profissional(profissional_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def descartar_vinculos_alterados(session):
+    session.info.pop('profissionais_alterados', None)
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Agrupamentos de calendário aceitos -> unidade do date_trunc do PostgreSQL
+AGRUPAMENTOS = {
+    'semana': 'week',
+    'mes': 'month'
+}
+
+# Menor quantidade de pontos que o LTTB consegue preservar (primeiro, último e um intermediário)
+MINIMO_PONTOS = 3
+
+
+def indices_lttb(x, y, max_pontos):
+    """
+    Seleciona os índices dos pontos a manter com o algoritmo
+    Largest-Triangle-Three-Buckets, que preserva picos e vales da série
+    x, y: sequências numéricas em ordem crescente de x
+    """
+    total = len(x)
+    if max_pontos >= total or max_pontos < MINIMO_PONTOS:
+        return np.arange(total)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # O primeiro e o último ponto são sempre mantidos; os demais são divididos em baldes
+    limites = np.linspace(1, total - 1, max_pontos - 1).astype(int)
+    selecionados = np.empty(max_pontos, dtype=int)
+    selecionados[0] = 0
+    selecionados[-1] = total - 1
+
+    anterior = 0
+    for i in range(max_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        proximo_fim = limites[i + 2] if i + 2 < len(limites) else total
+        media_x = x[fim:proximo_fim].mean()
+        media_y = y[fim:proximo_fim].mean()
+
+        # Área do triângulo formado pelo ponto anterior, cada candidato e a média do próximo balde
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        selecionados[i + 1] = anterior
+
+    return selecionados
+
+
+def indices_reduzidos(datas, valores, max_pontos):
+    """
+    Índices, em ordem cronológica, dos pontos mantidos ao reduzir a série para no máximo
+    max_pontos com LTTB. Pontos sem valor numérico são descartados quando há redução
+    """
+    if len(valores) <= max_pontos:
+        return list(range(len(valores)))
+
+    validos = [i for i, v in enumerate(valores) if v is not None]
+    x = [datas[i].toordinal() for i in validos]
+    y = [valores[i] for i in validos]
+    return [validos[i] for i in indices_lttb(x, y, max_pontos)]
+
+
+def reduzir_pontos(itens, datas, valores, max_pontos):
+    """
+    Reduz uma lista de itens para no máximo max_pontos com LTTB
+    datas, valores: séries alinhadas com itens, em ordem cronológica
+    """
+    return [itens[i] for i in indices_reduzidos(datas, valores, max_pontos)]
@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from functools import wraps
+
+import jwt
+from flask import current_app, g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.models import db, Usuario, TipoUsuarioEnum
+from src.services.revogacao import revogado
+from src.services.versao_tabela import VersaoTabela
+
+# Chave secreta para JWT (em produção, usar variável de ambiente)
+JWT_SECRET = os.environ.get('JWT_SECRET', 'sua-chave-secreta-super-segura')
+JWT_ALGORITMO = 'HS256'
+
+# Tempo (em segundos) que o usuário resolvido a partir do token fica em cache no processo
+AUTH_CACHE_TTL_PADRAO = 60
+# Intervalo (em segundos) entre as verificações de usuários alterados por outros processos:
+# é o maior atraso para um usuário desativado deixar de ser aceito em todos os processos
+AUTH_VERIFICACAO_SEGUNDOS_PADRAO = 5
+TAMANHO_MAXIMO_CACHE = 10000
+
+# Permissões por tipo de usuário
+PERMISSOES = {
+    TipoUsuarioEnum.ADMIN: frozenset({'editar_dados', 'criar_planos', 'registrar_progresso', 'administrar'}),
+    TipoUsuarioEnum.PROFISSIONAL: frozenset({'editar_dados', 'criar_planos', 'registrar_progresso'}),
+    TipoUsuarioEnum.RESPONSAVEL: frozenset(),
+}
+
+_cache = {}  # usuario_id -> (expira_em, carregado_em, UsuarioAutenticado)
+_lock = threading.Lock()
+_versao_usuarios = VersaoTabela(Usuario, 'AUTH_VERIFICACAO_SEGUNDOS', AUTH_VERIFICACAO_SEGUNDOS_PADRAO)
+
+
+class ErroAutenticacao(Exception):
+    """Token ausente, inválido, expirado ou de usuário inativo"""
+
+
+class UsuarioAutenticado:
+    """
+    Dados do usuário do token, desacoplados da sessão do banco para poderem
+    ser reaproveitados entre requisições
+    """
+
+    __slots__ = (
+        'id', 'email', 'nome', 'tipo_usuario', 'ativo', 'profissional_id', 'paciente_id', 'atualizado_em', 'permissoes'
+    )
+
+    def __init__(self, usuario):
+        self.id = usuario.id
+        self.email = usuario.email
+        self.nome = usuario.nome
+        self.tipo_usuario = usuario.tipo_usuario
+        self.ativo = usuario.ativo
+        self.profissional_id = usuario.profissional_id
+        self.paciente_id = usuario.paciente_id
+        self.atualizado_em = usuario.atualizado_em
+        self.permissoes = PERMISSOES.get(usuario.tipo_usuario, frozenset())
+
+    def tem_permissao(self, permissao):
+        return permissao in self.permissoes
+
+
+def publico(view):
+    """Marca a rota como acessível sem token"""
+    view.publico = True
+    return view
+
+
+def requer_permissao(permissao):
+    """
+    Restringe a rota a usuários com a permissão informada (ex.: 'editar_dados').
+    Com AUTENTICACAO_OBRIGATORIA desligada, requisições sem token passam (como no filtro de pacientes)
+    """
+    def decorador(view):
+        @wraps(view)
+        def verificar(*args, **kwargs):
+            usuario = g.get('usuario')
+            if usuario is None:
+                if current_app.config.get('AUTENTICACAO_OBRIGATORIA', True):
+                    return jsonify({'erro': 'Acesso negado'}), 403
+            elif not usuario.tem_permissao(permissao):
+                return jsonify({'erro': 'Acesso negado'}), 403
+            return view(*args, **kwargs)
+        return verificar
+    return decorador
+
+
+def extrair_token():
+    token = request.headers.get('Authorization')
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    return token or None
+
+
+def decodificar_token(token, verificar_expiracao=True):
+    """Valida assinatura e (por padrão) expiração do token. Lança ErroAutenticacao"""
+    if not token:
+        raise ErroAutenticacao('Token não fornecido')
+    try:
+        return jwt.decode(
+            token, JWT_SECRET, algorithms=[JWT_ALGORITMO], options={'verify_exp': verificar_expiracao}
+        )
+    except jwt.ExpiredSignatureError:
+        raise ErroAutenticacao('Token expirado')
+    except jwt.InvalidTokenError:
+        raise ErroAutenticacao('Token inválido')
+
+
+def obter_usuario(usuario_id):
+    """
+    Usuário ativo pelo id, do cache do processo ou do banco (após o TTL ou quando algum
+    usuário foi alterado, em qualquer processo, depois da carga)
+    """
+    agora = time.monotonic()
+    item = _cache.get(usuario_id)
+    if item is not None and item[0] > agora and not _versao_usuarios.alterada_desde(item[1]):
+        usuario = item[2]
+    else:
+        registro = db.session.get(Usuario, usuario_id)
+        usuario = UsuarioAutenticado(registro) if registro else None
+        ttl = current_app.config.get('AUTH_CACHE_TTL_SEGUNDOS', AUTH_CACHE_TTL_PADRAO)
+        with _lock:
+            _cache[usuario_id] = (agora + ttl, agora, usuario)
+            while len(_cache) > TAMANHO_MAXIMO_CACHE:
+                _cache.pop(next(iter(_cache)))
+
+    if usuario is None or not usuario.ativo:
+        raise ErroAutenticacao('Usuário não encontrado ou inativo')
+    return usuario
+
+
+def autenticar(token):
+    """Resolve o usuário do token. Lança ErroAutenticacao"""
+    payload = decodificar_token(token)
+    if payload.get('jti') and revogado(payload['jti']):
+        raise ErroAutenticacao('Token revogado')
+    return obter_usuario(payload['user_id'])
+
+
+def autenticar_requisicao():
+    """
+    Middleware (before_app_request): exige token válido nas rotas /api, exceto
+    as marcadas com @publico. O usuário fica em g.usuario
+    """
+    g.usuario = None
+    if request.method == 'OPTIONS' or not request.path.startswith('/api/'):
+        return None
+    view = current_app.view_functions.get(request.endpoint)
+    if view is None or getattr(view, 'publico', False):
+        return None
+
+    # Com AUTENTICACAO_OBRIGATORIA desligada (desenvolvimento) o token é opcional
+    obrigatoria = current_app.config.get('AUTENTICACAO_OBRIGATORIA', True)
+    token = extrair_token()
+    if not obrigatoria and not token:
+        return None
+    try:
+        g.usuario = autenticar(token)
+    except ErroAutenticacao as e:
+        if obrigatoria:
+            return jsonify({'erro': str(e)}), 401
+    return None
+
+
+def invalidar_usuario(usuario_id):
+    with _lock:
+        _cache.pop(usuario_id, None)
+
+
+def limpar_cache():
+    with _lock:
+        _cache.clear()
+    _versao_usuarios.reiniciar()
+
+
+@event.listens_for(Session, 'after_flush')
+def registrar_usuarios_alterados(session, flush_context):
+    """Guarda os usuários alterados (ex.: desativados) ou excluídos até o commit"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Usuario) and obj.id is not None:
+            session.info.setdefault('usuarios_alterados', set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidar_usuarios_alterados(session):
+    """
+    Tira os usuários alterados do cache na hora neste processo; os demais
+    processos percebem a alteração na próxima verificação (_versao_usuarios)
+    """
+    for usuario_id in session.info.pop('usuarios_alterados', ()):
+        invalidar_usuario(usuario_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def descartar_usuarios_alterados(session):
+    session.info.pop('usuarios_alterados', None)
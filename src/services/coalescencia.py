@@ -0,0 +1,120 @@
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.models import RegistroExclusao, SessaoUsuario, Tarefa, TokenRevogado, Usuario
+from src.services.acesso import pacientes_da_requisicao
+
+# Tempo (em segundos) que uma resposta concluída é reaproveitada por requisições idênticas
+CACHE_SEGUNDOS_PADRAO = 10
+# Quanto uma requisição idêntica aguarda a que já está em andamento antes de calcular por conta própria
+ESPERA_MAXIMA_SEGUNDOS = 60
+TAMANHO_MAXIMO_CACHE = 1000
+
+# Alterações nesses modelos não mudam os relatórios e não invalidam o cache
+MODELOS_IGNORADOS = (RegistroExclusao, SessaoUsuario, Tarefa, TokenRevogado, Usuario)
+
+
+class _Execucao:
+    """Cálculo em andamento de uma chave: as requisições idênticas aguardam o evento"""
+
+    __slots__ = ('pronta', 'resposta', 'erro')
+
+    def __init__(self):
+        self.pronta = threading.Event()
+        self.resposta = None  # (corpo, status, cabeçalhos)
+        self.erro = None
+
+
+_em_andamento = {}  # chave -> _Execucao
+_concluidas = {}  # chave -> (expira_em, resposta)
+_geracao = 0  # incrementada a cada alteração de dados; respostas de gerações antigas não entram no cache
+_lock = threading.Lock()
+
+
+def chave_requisicao():
+    """Endpoint + parâmetros normalizados (ordem da query string não importa) + pacientes acessíveis"""
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+        pacientes_da_requisicao()
+    )
+
+
+def coalescer(view):
+    """
+    Decorador para endpoints GET caros e sem efeitos colaterais: requisições idênticas
+    simultâneas aguardam um único cálculo e compartilham a resposta, que ainda é
+    reaproveitada por RELATORIOS_CACHE_SEGUNDOS (por processo)
+    """
+    @wraps(view)
+    def executar(*args, **kwargs):
+        chave = chave_requisicao()
+        with _lock:
+            item = _concluidas.get(chave)
+            if item is not None and item[0] > time.monotonic():
+                return _responder(item[1])
+            execucao = _em_andamento.get(chave)
+            lider = execucao is None
+            if lider:
+                execucao = _em_andamento[chave] = _Execucao()
+                geracao = _geracao
+
+        if not lider:
+            if not execucao.pronta.wait(ESPERA_MAXIMA_SEGUNDOS):
+                return view(*args, **kwargs)
+            if execucao.erro is not None:
+                raise execucao.erro
+            return _responder(execucao.resposta)
+
+        try:
+            resposta = current_app.make_response(view(*args, **kwargs))
+            execucao.resposta = (resposta.get_data(), resposta.status_code, list(resposta.headers.items()))
+        except Exception as e:
+            execucao.erro = e
+            raise
+        finally:
+            with _lock:
+                _em_andamento.pop(chave, None)
+                _guardar(chave, execucao.resposta, geracao)
+            execucao.pronta.set()
+        return _responder(execucao.resposta)
+
+    return executar
+
+
+def _guardar(chave, resposta, geracao):
+    """Guarda só respostas 200 calculadas sem alteração de dados no meio. Chamar com _lock"""
+    ttl = current_app.config.get('RELATORIOS_CACHE_SEGUNDOS', CACHE_SEGUNDOS_PADRAO)
+    if not ttl or resposta is None or resposta[1] != 200 or geracao != _geracao:
+        return
+    _concluidas.pop(chave, None)
+    _concluidas[chave] = (time.monotonic() + ttl, resposta)
+    while len(_concluidas) > TAMANHO_MAXIMO_CACHE:
+        _concluidas.pop(next(iter(_concluidas)))
+
+
+def _responder(resposta):
+    # Uma Response nova por requisição: o after_request (ETag, compressão) altera o objeto
+    corpo, status, cabecalhos = resposta
+    return Response(corpo, status=status, headers=cabecalhos)
+
+
+def limpar_cache():
+    global _geracao
+    with _lock:
+        _geracao += 1
+        _concluidas.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def invalidar_relatorios(session, flush_context):
+    """Dados alterados neste processo descartam as respostas guardadas"""
+    alterados = (*session.new, *session.dirty, *session.deleted)
+    if any(not isinstance(obj, MODELOS_IGNORADOS) for obj in alterados):
+        limpar_cache()
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele as respostas usam apenas gzip
+    brotli = None
+
+# Respostas menores que isso não compensam o custo de compressão
+COMPRESSAO_MINIMO_BYTES_PADRAO = 1024
+NIVEL_GZIP = 6
+NIVEL_BROTLI = 5
+
+TIPOS_COMPRESSIVEIS = frozenset({
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+    'text/css', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+})
+
+# Extensão dos arquivos pré-comprimidos gerados por precomprimir_estaticos (ou pelo build do frontend)
+EXTENSOES_PRECOMPRIMIDAS = {'br': '.br', 'gzip': '.gz'}
+
+# Arquivos de bundle com hash de conteúdo no nome (ex.: index-3f2a9c1b.js, main.8e1d0c4a.css)
+PADRAO_ARQUIVO_COM_HASH = re.compile(r'[.-](?=[A-Za-z_]*[0-9])[A-Za-z0-9_]{8,}\.[A-Za-z0-9]+$')
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+def codificacoes_suportadas():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def escolher_codificacao(opcoes=None):
+    """Melhor codificação aceita pelo cliente (Accept-Encoding) entre as opções, ou None"""
+    return request.accept_encodings.best_match(opcoes or codificacoes_suportadas())
+
+
+def comprimir(dados, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=NIVEL_BROTLI)
+    return gzip.compress(dados, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def otimizar_resposta(response):
+    """
+    after_request: ETag e resposta 304 (If-None-Match) para os GETs JSON da API, e
+    compressão gzip/brotli das respostas de texto acima do tamanho mínimo
+    """
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed):
+        return response
+
+    if request.path.startswith('/api/') and response.mimetype == 'application/json':
+        # ETag fraca: identifica o conteúdo independentemente da codificação aplicada abaixo
+        response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest(), weak=True)
+        if 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    _comprimir_resposta(response)
+    return response
+
+
+def _comprimir_resposta(response):
+    if response.mimetype not in TIPOS_COMPRESSIVEIS or 'Content-Encoding' in response.headers:
+        return
+    minimo = current_app.config.get('COMPRESSAO_MINIMO_BYTES', COMPRESSAO_MINIMO_BYTES_PADRAO)
+    if (response.content_length or 0) < minimo:
+        return
+    response.vary.add('Accept-Encoding')
+    codificacao = escolher_codificacao()
+    if codificacao is None:
+        return
+    response.set_data(comprimir(response.get_data(), codificacao))
+    response.headers['Content-Encoding'] = codificacao
+
+
+def arquivo_com_hash(caminho):
+    return PADRAO_ARQUIVO_COM_HASH.search(os.path.basename(caminho)) is not None
+
+
+def precomprimir_estaticos(pasta, minimo=COMPRESSAO_MINIMO_BYTES_PADRAO):
+    """
+    Gera as variantes .gz (e .br, com brotli instalado) dos arquivos compressíveis da pasta,
+    quando ausentes ou mais antigas que o original. Retorna a quantidade de arquivos gerados
+    """
+    gerados = 0
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            if nome.endswith(tuple(EXTENSOES_PRECOMPRIMIDAS.values())):
+                continue
+            if mimetypes.guess_type(nome)[0] not in TIPOS_COMPRESSIVEIS:
+                continue
+            original = os.path.join(raiz, nome)
+            if os.path.getsize(original) < minimo:
+                continue
+            with open(original, 'rb') as f:
+                dados = None
+                for codificacao in codificacoes_suportadas():
+                    destino = original + EXTENSOES_PRECOMPRIMIDAS[codificacao]
+                    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(original):
+                        continue
+                    dados = dados if dados is not None else f.read()
+                    with open(destino, 'wb') as saida:
+                        saida.write(comprimir(dados, codificacao))
+                    gerados += 1
+    return gerados
@@ -0,0 +1,234 @@
+import threading
+from flask import g, has_app_context
+from src.models import db, Formulario, Pergunta, TipoPerguntaEnum
+from src.models.meta_terapeutica import meta_formulario
+from src.services.formulas import (
+    FormulaInvalida, avaliar_formulas, compilar_formula, ordenar_por_dependencia, verificar_ciclos
+)
+
+# Quantidade máxima de metas mantidas no cache do processo
+TAMANHO_MAXIMO_CACHE = 1024
+
+_cache = {}  # meta_id -> EsquemaFormulario
+_lock = threading.Lock()
+
+
+class EsquemaFormulario:
+    """
+    Esquema compilado dos formulários de uma meta: perguntas ordenadas,
+    obrigatórias e o grafo de fórmulas compilado, em ordem topológica
+    versao: tupla ((formulario_id, atualizado_em), ...) usada para invalidar o cache
+    """
+
+    def __init__(self, meta_id, versao, perguntas):
+        self.meta_id = meta_id
+        self.versao = versao
+        self.perguntas = [p.to_dict() for p in perguntas]
+        self.ids = [p.id for p in perguntas]
+        self.obrigatorias = [
+            (str(p.id), p.texto) for p in perguntas
+            if p.obrigatoria and p.tipo != TipoPerguntaEnum.FORMULA
+        ]
+        self.grafo = _compilar_grafo(perguntas)
+        self.formulas = {pergunta_id for pergunta_id, *_ in self.grafo}
+        # Perguntas com valor acumulado entre sessões: {pergunta_id: (janela_sessoes, agregacao_janela)}
+        self.janelas = {
+            p.id: (p.janela_sessoes, p.agregacao_janela) for p in perguntas
+            if p.tipo == TipoPerguntaEnum.FORMULA and p.janela_sessoes
+        }
+
+    def validar(self, respostas_dict):
+        """Valida se todas as perguntas obrigatórias foram respondidas"""
+        if not self.versao:
+            return True, "Nenhum formulário vinculado à meta"
+
+        nao_respondidas = [
+            texto for pergunta_id, texto in self.obrigatorias
+            if str(respostas_dict.get(pergunta_id) or "").strip() == ""
+        ]
+        if nao_respondidas:
+            return False, f"Perguntas obrigatórias não respondidas: {', '.join(nao_respondidas)}"
+        return True, "Validação aprovada"
+
+    def montar_respostas(self, respostas_dict):
+        """Linhas de ChecklistResposta (dicts) para todas as perguntas, com as fórmulas calculadas"""
+        linhas = {
+            pergunta_id: {
+                'pergunta_id': pergunta_id,
+                'resposta': respostas_dict.get(str(pergunta_id), ""),
+                'resposta_calculada': None
+            }
+            for pergunta_id in self.ids
+        }
+        for pergunta_id, resultado in self.calcular_formulas(respostas_dict).items():
+            linhas[pergunta_id]['resposta_calculada'] = resultado
+        return list(linhas.values())
+
+    def calcular_formulas(self, respostas_dict):
+        """Resultados de todas as fórmulas em uma passagem: {pergunta_id: resultado}"""
+        return avaliar_formulas(self.grafo, respostas_dict)
+
+
+def _compilar_grafo(perguntas):
+    """
+    Compila as fórmulas e as ordena topologicamente: [(pergunta_id, FormulaCompilada ou None, expansoes)]
+    Intervalos e grupos são resolvidos com as perguntas do formulário de cada fórmula
+    Fórmulas inválidas ou em ciclo (gravadas antes da validação no cadastro) ficam sem valor
+    """
+    contexto = {}
+    for pergunta in perguntas:
+        contexto.setdefault(pergunta.formulario_id, []).append((pergunta.id, pergunta.grupo))
+
+    compiladas = {}
+    for pergunta in perguntas:
+        if pergunta.tipo != TipoPerguntaEnum.FORMULA:
+            continue
+        try:
+            compilada = compilar_formula(pergunta.formula)
+            compiladas[pergunta.id] = (compilada, compilada.expandir(contexto[pergunta.formulario_id], pergunta.id))
+        except FormulaInvalida:
+            compiladas[pergunta.id] = (None, {})
+
+    ciclicas = []
+    ordem = ordenar_por_dependencia(
+        {p: c.dependencias(e) if c else frozenset() for p, (c, e) in compiladas.items()},
+        ciclicas=ciclicas
+    )
+    return [(p, *compiladas[p]) for p in ordem] + [(p, None, {}) for p in ciclicas]
+
+
+def _versoes(meta_ids):
+    """Versão atual dos formulários de cada meta, em uma única consulta"""
+    versoes = {meta_id: [] for meta_id in meta_ids}
+    linhas = db.session.query(
+        meta_formulario.c.meta_id, Formulario.id, Formulario.atualizado_em
+    ).join(
+        Formulario, Formulario.id == meta_formulario.c.formulario_id
+    ).filter(
+        meta_formulario.c.meta_id.in_(meta_ids)
+    ).order_by(meta_formulario.c.meta_id, Formulario.id)
+    for meta_id, formulario_id, atualizado_em in linhas:
+        versoes[meta_id].append((formulario_id, atualizado_em))
+    return {meta_id: tuple(v) for meta_id, v in versoes.items()}
+
+
+def _compilar(versoes):
+    """Carrega as perguntas das metas informadas e compila seus esquemas"""
+    formulario_ids = {formulario_id for versao in versoes.values() for formulario_id, _ in versao}
+    perguntas_por_formulario = {}
+    if formulario_ids:
+        perguntas = Pergunta.query.filter(
+            Pergunta.formulario_id.in_(formulario_ids)
+        ).order_by(Pergunta.formulario_id, Pergunta.ordem, Pergunta.id)
+        for pergunta in perguntas:
+            perguntas_por_formulario.setdefault(pergunta.formulario_id, []).append(pergunta)
+
+    return {
+        meta_id: EsquemaFormulario(meta_id, versao, [
+            pergunta
+            for formulario_id, _ in versao
+            for pergunta in perguntas_por_formulario.get(formulario_id, [])
+        ])
+        for meta_id, versao in versoes.items()
+    }
+
+
+def obter_esquemas(meta_ids):
+    """
+    Esquemas de várias metas: uma consulta de versão e, só para as metas
+    cujo cache está desatualizado, uma consulta de perguntas
+    Dentro de uma requisição o resultado fica memorizado em flask.g
+    """
+    memo = _memo_requisicao()
+    resultado = {meta_id: memo[meta_id] for meta_id in meta_ids if meta_id in memo}
+    faltantes = [meta_id for meta_id in meta_ids if meta_id not in resultado]
+    if not faltantes:
+        return resultado
+
+    versoes = _versoes(faltantes)
+    desatualizadas = {}
+    for meta_id, versao in versoes.items():
+        esquema = _cache.get(meta_id)
+        if esquema is not None and esquema.versao == versao:
+            resultado[meta_id] = esquema
+        else:
+            desatualizadas[meta_id] = versao
+
+    if desatualizadas:
+        compilados = _compilar(desatualizadas)
+        with _lock:
+            for meta_id, esquema in compilados.items():
+                _cache.pop(meta_id, None)
+                _cache[meta_id] = esquema
+            while len(_cache) > TAMANHO_MAXIMO_CACHE:
+                _cache.pop(next(iter(_cache)))
+        resultado.update(compilados)
+
+    memo.update(resultado)
+    return resultado
+
+
+def obter_esquema(meta_id):
+    """Esquema compilado dos formulários de uma meta"""
+    return obter_esquemas([meta_id])[meta_id]
+
+
+def carregar_dependencias(pergunta_ids=None, formulario_id=None):
+    """
+    Perguntas lidas por cada fórmula gravada, entre os ids ou no formulário informados:
+    {pergunta_id: ids}. Intervalos e grupos são resolvidos no formulário de cada fórmula
+    """
+    consulta = db.session.query(Pergunta.id, Pergunta.formulario_id, Pergunta.formula).filter(
+        Pergunta.tipo == TipoPerguntaEnum.FORMULA
+    )
+    if pergunta_ids is not None:
+        consulta = consulta.filter(Pergunta.id.in_(pergunta_ids))
+    if formulario_id is not None:
+        consulta = consulta.filter(Pergunta.formulario_id == formulario_id)
+    formulas = consulta.all()
+
+    contexto = {}
+    compiladas = {}
+    for pergunta_id, formulario, formula in formulas:
+        try:
+            compilada = compilar_formula(formula)
+        except FormulaInvalida:
+            continue
+        compiladas[pergunta_id] = (formulario, compilada)
+        # O contexto do formulário só é carregado quando há intervalos ou grupos a resolver
+        if compilada.intervalos or compilada.grupos:
+            contexto[formulario] = []
+    if contexto:
+        perguntas = db.session.query(Pergunta.id, Pergunta.formulario_id, Pergunta.grupo).filter(
+            Pergunta.formulario_id.in_(contexto)
+        )
+        for pergunta_id, formulario, grupo in perguntas:
+            contexto[formulario].append((pergunta_id, grupo))
+
+    dependencias = {pergunta_id: frozenset() for pergunta_id, _, _ in formulas}
+    for pergunta_id, (formulario, compilada) in compiladas.items():
+        expansoes = compilada.expandir(contexto.get(formulario, []), pergunta_id)
+        dependencias[pergunta_id] = compilada.dependencias(expansoes)
+    return dependencias
+
+
+def verificar_ciclos_formulario(formulario_id):
+    """
+    Verifica, com as alterações já aplicadas na sessão (antes do commit), se as
+    fórmulas do formulário formam dependência circular, inclusive através de
+    fórmulas de outros formulários. Lança FormulaInvalida
+    """
+    verificar_ciclos(carregar_dependencias(formulario_id=formulario_id), carregar_dependencias)
+
+
+def limpar_cache():
+    with _lock:
+        _cache.clear()
+
+
+def _memo_requisicao():
+    if not has_app_context():
+        return {}
+    if 'esquemas_formulario' not in g:
+        g.esquemas_formulario = {}
+    return g.esquemas_formulario
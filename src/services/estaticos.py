@@ -0,0 +1,138 @@
+import mimetypes
+import os
+import threading
+import time
+import zlib
+
+from flask import Response, current_app, request, send_file
+
+from src.services.compressao import (
+    CACHE_IMUTAVEL, EXTENSOES_PRECOMPRIMIDAS, arquivo_com_hash, codificacoes_suportadas, comprimir,
+    escolher_codificacao
+)
+
+ARQUIVO_INDEX = 'index.html'
+
+
+class ArquivoEstatico:
+    """Entrada do manifesto: metadados do arquivo e das variantes pré-comprimidas (.br/.gz)"""
+
+    __slots__ = ('caminho', 'mimetype', 'etag', 'mtime', 'cache_control', 'variantes')
+
+    def __init__(self, caminho, relativo, stat):
+        self.caminho = caminho
+        self.mimetype = mimetypes.guess_type(relativo)[0] or 'application/octet-stream'
+        self.mtime = stat.st_mtime
+        self.etag = _etag(stat)
+        self.cache_control = CACHE_IMUTAVEL if arquivo_com_hash(relativo) else 'no-cache'
+        self.variantes = {}  # codificacao -> (caminho, etag)
+
+
+class ManifestoEstatico:
+    """
+    Índice da pasta do frontend (SPA) montado uma vez: caminho -> ArquivoEstatico, com o
+    index.html (e suas versões comprimidas) em memória. Rotas da SPA não acessam o disco;
+    a pasta só é reexaminada a cada ESTATICOS_VERIFICAR_SEGUNDOS, se configurado
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.arquivos = {}
+        self.index = None  # (conteudos {codificacao ou None: bytes}, etag)
+        self.assinatura = None
+        self.proxima_verificacao = 0.0
+        self._lock = threading.Lock()
+        self.carregar()
+
+    def carregar(self):
+        arquivos = {}
+        for raiz, _, nomes in os.walk(self.pasta):
+            for nome in nomes:
+                if nome.endswith(tuple(EXTENSOES_PRECOMPRIMIDAS.values())):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                relativo = os.path.relpath(caminho, self.pasta).replace(os.sep, '/')
+                arquivo = ArquivoEstatico(caminho, relativo, os.stat(caminho))
+                for codificacao, extensao in EXTENSOES_PRECOMPRIMIDAS.items():
+                    if os.path.isfile(caminho + extensao):
+                        arquivo.variantes[codificacao] = (caminho + extensao, f'{arquivo.etag}-{codificacao}')
+                arquivos[relativo] = arquivo
+
+        index = None
+        if ARQUIVO_INDEX in arquivos:
+            index = self._carregar_index(arquivos[ARQUIVO_INDEX])
+
+        self.arquivos, self.index, self.assinatura = arquivos, index, self._assinatura()
+
+    def _carregar_index(self, arquivo):
+        with open(arquivo.caminho, 'rb') as f:
+            conteudos = {None: f.read()}
+        for codificacao in codificacoes_suportadas():
+            if codificacao in arquivo.variantes:
+                with open(arquivo.variantes[codificacao][0], 'rb') as f:
+                    conteudos[codificacao] = f.read()
+            else:
+                conteudos[codificacao] = comprimir(conteudos[None], codificacao)
+        return conteudos, f'{zlib.crc32(conteudos[None]):08x}-{len(conteudos[None]):x}'
+
+    def _assinatura(self):
+        # Um build novo altera o mtime das pastas (arquivos com hash novo) ou do index.html
+        mtimes = [os.stat(raiz).st_mtime for raiz, _, _ in os.walk(self.pasta)]
+        index = os.path.join(self.pasta, ARQUIVO_INDEX)
+        return tuple(mtimes), os.stat(index).st_mtime if os.path.exists(index) else None
+
+    def verificar_alteracoes(self):
+        intervalo = current_app.config.get('ESTATICOS_VERIFICAR_SEGUNDOS', 0)
+        if not intervalo or time.monotonic() < self.proxima_verificacao:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.proxima_verificacao = time.monotonic() + intervalo
+            if self._assinatura() != self.assinatura:
+                self.carregar()
+        finally:
+            self._lock.release()
+
+    def responder(self, caminho):
+        """Arquivo do caminho (pré-comprimido se possível) ou, para rotas da SPA, o index.html"""
+        self.verificar_alteracoes()
+        arquivo = self.arquivos.get(caminho) if caminho else None
+        if arquivo is not None and caminho != ARQUIVO_INDEX:
+            return self._enviar_arquivo(arquivo)
+        if self.index is None:
+            return "index.html not found", 404
+        return self._enviar_index()
+
+    def _enviar_arquivo(self, arquivo):
+        codificacao = escolher_codificacao(list(arquivo.variantes)) if arquivo.variantes else None
+        if codificacao:
+            caminho, etag = arquivo.variantes[codificacao]
+        else:
+            caminho, etag = arquivo.caminho, arquivo.etag
+        # send_file usa wsgi.file_wrapper (sendfile no gunicorn) ou X-Sendfile com USE_X_SENDFILE
+        response = send_file(
+            caminho, mimetype=arquivo.mimetype, conditional=True, etag=etag, last_modified=arquivo.mtime
+        )
+        if codificacao:
+            response.headers['Content-Encoding'] = codificacao
+        if arquivo.variantes:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = arquivo.cache_control
+        return response
+
+    def _enviar_index(self):
+        conteudos, etag = self.index
+        codificacao = escolher_codificacao()
+        response = Response(conteudos[codificacao], mimetype='text/html')
+        if codificacao:
+            response.headers['Content-Encoding'] = codificacao
+            etag = f'{etag}-{codificacao}'
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+
+def _etag(stat):
+    return f'{int(stat.st_mtime * 1000):x}-{stat.st_size:x}'
@@ -0,0 +1,143 @@
+import numpy as np
+
+# Janela padrão (em registros) da média móvel
+JANELA_MEDIA_MOVEL_PADRAO = 7
+PERCENTIS_PADRAO = (25, 50, 75)
+
+# Variação ajustada abaixo desta fração do desvio padrão é considerada estável
+TOLERANCIA_TENDENCIA = 0.5
+
+
+def calcular_estatisticas(datas, valores, janela=JANELA_MEDIA_MOVEL_PADRAO, percentis=PERCENTIS_PADRAO):
+    """Calcula as estatísticas de uma única série (datas, valores)"""
+    return calcular_estatisticas_lote({None: (datas, valores)}, janela, percentis)[None]
+
+
+def calcular_estatisticas_lote(series, janela=JANELA_MEDIA_MOVEL_PADRAO, percentis=PERCENTIS_PADRAO):
+    """
+    Calcula estatísticas de várias séries de uma vez com operações vetorizadas
+    series: dict {chave: (datas, valores)}, datas em ordem cronológica
+    Valores None são ignorados. Retorna dict {chave: estatisticas}
+    """
+    chaves = list(series.keys())
+    xs, ys, grupos, datas_validas = [], [], [], []
+    for indice, chave in enumerate(chaves):
+        datas, valores = series[chave]
+        pares = [(d, float(v)) for d, v in zip(datas, valores) if v is not None]
+        if pares:
+            datas_serie, y = zip(*pares)
+            x = [d.toordinal() for d in datas_serie]
+            datas_validas.append(datas_serie)
+            xs.append(np.asarray(x, dtype=float))
+            ys.append(np.asarray(y, dtype=float))
+            grupos.append(np.full(len(pares), indice))
+
+    resultado = {chave: _estatisticas_vazias() for chave in chaves}
+    if not ys:
+        return resultado
+
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    g = np.concatenate(grupos)
+    total_grupos = len(chaves)
+
+    n = np.bincount(g, minlength=total_grupos).astype(float)
+    com_dados = n > 0
+    n_seguro = np.where(com_dados, n, 1.0)
+
+    # Deslocar x pelo primeiro dia de cada série evita perda de precisão nos ordinais
+    inicios = np.concatenate(([0], np.cumsum(n[com_dados])[:-1])).astype(int)
+    x = x - np.repeat(x[inicios], n[com_dados].astype(int))
+
+    soma_x = np.bincount(g, weights=x, minlength=total_grupos)
+    soma_y = np.bincount(g, weights=y, minlength=total_grupos)
+    soma_xx = np.bincount(g, weights=x * x, minlength=total_grupos)
+    soma_xy = np.bincount(g, weights=x * y, minlength=total_grupos)
+    soma_yy = np.bincount(g, weights=y * y, minlength=total_grupos)
+
+    media = soma_y / n_seguro
+    variancia = np.maximum(soma_yy / n_seguro - media ** 2, 0.0)
+    desvio = np.sqrt(variancia)
+
+    # Inclinação por mínimos quadrados (unidades por dia)
+    denominador = n * soma_xx - soma_x ** 2
+    inclinacao = np.divide(
+        n * soma_xy - soma_x * soma_y, denominador,
+        out=np.zeros(total_grupos), where=denominador > 0
+    )
+    duracao = np.zeros(total_grupos)
+    duracao[com_dados] = np.maximum.reduceat(x, inicios)
+    variacao = inclinacao * duracao
+
+    minimo = np.zeros(total_grupos)
+    maximo = np.zeros(total_grupos)
+    minimo[com_dados] = np.minimum.reduceat(y, inicios)
+    maximo[com_dados] = np.maximum.reduceat(y, inicios)
+
+    valores_percentis = _percentis_por_grupo(y, g, inicios, n[com_dados], percentis)
+    medias_moveis = _media_movel_por_grupo(y, inicios, n[com_dados], janela)
+
+    for posicao, indice in enumerate(np.flatnonzero(com_dados)):
+        resultado[chaves[indice]] = {
+            'total_registros': int(n[indice]),
+            'media': round(float(media[indice]), 2),
+            'minimo': float(minimo[indice]),
+            'maximo': float(maximo[indice]),
+            'variancia': round(float(variancia[indice]), 4),
+            'desvio_padrao': round(float(desvio[indice]), 4),
+            'percentis': {
+                f'p{p}': round(float(valores_percentis[posicao, i]), 2) for i, p in enumerate(percentis)
+            },
+            'inclinacao': round(float(inclinacao[indice]), 4),
+            'variacao_ajustada': round(float(variacao[indice]), 2),
+            'tendencia': _classificar_tendencia(n[indice], variacao[indice], desvio[indice]),
+            'media_movel': [
+                {'data': d.isoformat(), 'valor': round(float(v), 2)}
+                for d, v in zip(datas_validas[posicao], medias_moveis[posicao])
+            ]
+        }
+    return resultado
+
+
+def _estatisticas_vazias():
+    return {
+        'total_registros': 0,
+        'media': 0,
+        'minimo': 0,
+        'maximo': 0,
+        'variancia': 0,
+        'desvio_padrao': 0,
+        'percentis': {},
+        'inclinacao': 0,
+        'variacao_ajustada': 0,
+        'tendencia': 'sem_dados',
+        'media_movel': []
+    }
+
+
+def _classificar_tendencia(n, variacao, desvio):
+    """Classifica a tendência pela variação da reta ajustada frente à dispersão da série"""
+    if n < 2 or abs(variacao) <= TOLERANCIA_TENDENCIA * desvio:
+        return 'estável'
+    return 'crescente' if variacao > 0 else 'decrescente'
+
+
+def _percentis_por_grupo(y, g, inicios, tamanhos, percentis):
+    """Percentis (interpolação linear) de cada grupo sem laço por grupo"""
+    ordenado = y[np.lexsort((y, g))]
+    posicoes = inicios[:, None] + (np.asarray(percentis, dtype=float)[None, :] / 100.0) * (tamanhos[:, None] - 1)
+    inferior = np.floor(posicoes).astype(int)
+    superior = np.ceil(posicoes).astype(int)
+    fracao = posicoes - inferior
+    return ordenado[inferior] * (1 - fracao) + ordenado[superior] * fracao
+
+
+def _media_movel_por_grupo(y, inicios, tamanhos, janela):
+    """Média móvel simples de cada grupo usando somas acumuladas"""
+    janela = max(1, int(janela))
+    acumulado = np.concatenate(([0.0], np.cumsum(y)))
+    indices = np.arange(len(y))
+    inicio_grupo = np.repeat(inicios, tamanhos.astype(int))
+    limite = np.maximum(inicio_grupo, indices - janela + 1)
+    medias = (acumulado[indices + 1] - acumulado[limite]) / (indices + 1 - limite)
+    return np.split(medias, inicios[1:])
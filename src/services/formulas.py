@@ -0,0 +1,411 @@
+import ast
+import logging
+import math
+import operator
+import re
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Referência a outra pergunta dentro da fórmula: {pergunta_id}
+PADRAO_REFERENCIA = re.compile(r'\{\s*(\d+)\s*\}')
+# Intervalo de perguntas do mesmo formulário: {primeiro_id..ultimo_id}
+PADRAO_INTERVALO = re.compile(r'\{\s*(\d+)\s*\.\.\s*(\d+)\s*\}')
+# Grupo (tag) de perguntas do mesmo formulário: #nome_do_grupo
+PADRAO_GRUPO = re.compile(r'#([^\W\d]\w*)')
+
+PREFIXO_VARIAVEL = 'p_'
+PREFIXO_INTERVALO = 'i_'
+PREFIXO_GRUPO = 'g_'
+
+# Maior quantidade de perguntas aceita em um intervalo {a..b}
+TAMANHO_MAXIMO_INTERVALO = 1000
+
+# Respostas contadas como "sim" por contar_sim() e percentual()
+RESPOSTAS_SIM = {'sim', 's', 'true', 'verdadeiro', 'yes', 'x'}
+
+OPERADORES_BINARIOS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    # Base convertida para float: potências enormes geram OverflowError em vez de consumir memória
+    ast.Pow: lambda base, expoente: float(base) ** expoente,
+}
+
+OPERADORES_UNARIOS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+FUNCOES = {
+    'min': min,
+    'max': max,
+    'abs': abs,
+    'round': round,
+}
+
+
+def _soma(respostas):
+    return float(np.sum(_valores(respostas)))
+
+
+def _media(respostas):
+    respondidas = [r for r in respostas if _respondida(r)]
+    if not respondidas:
+        raise ValueError('Nenhuma pergunta respondida')
+    return float(np.mean(_valores(respondidas)))
+
+
+def _contar_sim(respostas):
+    return float(np.count_nonzero(_marcas_sim(respostas)))
+
+
+def _percentual(respostas):
+    respondidas = [r for r in respostas if _respondida(r)]
+    if not respondidas:
+        raise ValueError('Nenhuma pergunta respondida')
+    return float(np.count_nonzero(_marcas_sim(respondidas)) * 100.0 / len(respondidas))
+
+
+# Funções de agregação: recebem perguntas ({id}, {a..b} ou #grupo) e operam sobre as respostas
+AGREGACOES = {
+    'soma': _soma,
+    'media': _media,
+    'contar_sim': _contar_sim,
+    'percentual': _percentual,
+}
+
+
+class FormulaInvalida(ValueError):
+    """Fórmula com sintaxe ou construções não permitidas"""
+
+
+class FormulaCompilada:
+    """Árvore validada de uma fórmula e as perguntas que ela referencia"""
+
+    def __init__(self, texto, arvore, referencias, intervalos=frozenset(), grupos=frozenset()):
+        self.texto = texto
+        self.arvore = arvore
+        self.referencias = referencias
+        self.intervalos = intervalos
+        self.grupos = grupos
+
+    def expandir(self, perguntas=None, proprio_id=None):
+        """
+        Resolve intervalos e grupos para ids de perguntas: {nome_variavel: (ids...)}
+        perguntas: lista [(pergunta_id, grupo)] do formulário da fórmula. Sem ela,
+        intervalos incluem todos os ids da faixa e grupos ficam vazios
+        A própria pergunta da fórmula nunca entra na expansão
+        """
+        expansoes = {}
+        for inicio, fim in self.intervalos:
+            if perguntas is None:
+                ids = range(inicio, fim + 1)
+            else:
+                ids = sorted(p for p, _ in perguntas if inicio <= p <= fim)
+            expansoes[f'{PREFIXO_INTERVALO}{inicio}_{fim}'] = tuple(i for i in ids if i != proprio_id)
+        for grupo in self.grupos:
+            ids = [] if perguntas is None else [p for p, g in perguntas if g == grupo]
+            expansoes[f'{PREFIXO_GRUPO}{grupo}'] = tuple(i for i in ids if i != proprio_id)
+        return expansoes
+
+    def dependencias(self, expansoes=None):
+        """Todas as perguntas lidas pela fórmula, incluindo intervalos e grupos expandidos"""
+        if expansoes is None:
+            expansoes = self.expandir()
+        return self.referencias.union(*expansoes.values())
+
+    def avaliar(self, respostas, expansoes=None):
+        """
+        Avalia a fórmula com as respostas das perguntas referenciadas
+        respostas: dict {pergunta_id (int): resposta}; referências ausentes valem 0
+        expansoes: resultado de expandir() (calculado sem contexto se omitido)
+        """
+        if expansoes is None:
+            expansoes = self.expandir()
+        return _avaliar_no(self.arvore.body, respostas, expansoes)
+
+
+@lru_cache(maxsize=2048)
+def compilar_formula(formula):
+    """
+    Converte a fórmula em uma árvore sintática segura
+    Lança FormulaInvalida se houver erro de sintaxe ou construção não permitida
+    """
+    if not formula or not formula.strip():
+        raise FormulaInvalida('Fórmula vazia')
+
+    intervalos = frozenset((int(a), int(b)) for a, b in PADRAO_INTERVALO.findall(formula))
+    for inicio, fim in intervalos:
+        if inicio > fim:
+            raise FormulaInvalida(f'Intervalo inválido {{{inicio}..{fim}}} na fórmula: {formula}')
+        if fim - inicio + 1 > TAMANHO_MAXIMO_INTERVALO:
+            raise FormulaInvalida(
+                f'Intervalo {{{inicio}..{fim}}} excede {TAMANHO_MAXIMO_INTERVALO} perguntas na fórmula: {formula}'
+            )
+    grupos = frozenset(PADRAO_GRUPO.findall(formula))
+
+    expressao = PADRAO_INTERVALO.sub(lambda m: f'{PREFIXO_INTERVALO}{int(m.group(1))}_{int(m.group(2))}', formula)
+    referencias = frozenset(int(r) for r in PADRAO_REFERENCIA.findall(expressao))
+    expressao = PADRAO_REFERENCIA.sub(lambda m: f'{PREFIXO_VARIAVEL}{int(m.group(1))}', expressao)
+    expressao = PADRAO_GRUPO.sub(lambda m: f'{PREFIXO_GRUPO}{m.group(1)}', expressao)
+    try:
+        arvore = ast.parse(expressao.strip(), mode='eval')
+    except SyntaxError:
+        raise FormulaInvalida(f'Sintaxe inválida na fórmula: {formula}')
+
+    # Nomes de função só podem aparecer como a função de uma chamada, e
+    # intervalos/grupos só como argumentos diretos de uma função de agregação
+    chamadas = set()
+    argumentos_agregacao = set()
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Call):
+            chamadas.add(id(no.func))
+            if isinstance(no.func, ast.Name) and no.func.id in AGREGACOES:
+                argumentos_agregacao.update(id(arg) for arg in no.args)
+
+    for no in ast.walk(arvore):
+        _validar_no(no, formula)
+        if not isinstance(no, ast.Name):
+            continue
+        if _eh_conjunto(no.id) and id(no) not in argumentos_agregacao:
+            raise FormulaInvalida(
+                f'Intervalos e grupos só podem ser usados em {", ".join(AGREGACOES)}: {formula}'
+            )
+        if not _eh_variavel(no.id) and not _eh_conjunto(no.id) and id(no) not in chamadas:
+            raise FormulaInvalida(f'Função {no.id} usada sem parênteses na fórmula: {formula}')
+
+    return FormulaCompilada(formula, arvore, referencias, intervalos, grupos)
+
+
+def validar_formula(formula, perguntas_existentes=None):
+    """
+    Valida a fórmula no momento do cadastro
+    perguntas_existentes: ids de perguntas que podem ser referenciadas (opcional)
+    """
+    compilada = compilar_formula(formula)
+    if perguntas_existentes is not None:
+        inexistentes = sorted(compilada.referencias - set(perguntas_existentes))
+        if inexistentes:
+            raise FormulaInvalida(
+                f'Fórmula referencia perguntas inexistentes: {", ".join(str(i) for i in inexistentes)}'
+            )
+    return compilada
+
+
+def ordenar_por_dependencia(dependencias, ciclicas=None):
+    """
+    Ordem topológica das fórmulas: cada uma vem depois das fórmulas que referencia
+    dependencias: dict {pergunta_id: referencias}, na ordem original das perguntas
+    Referências a perguntas que não são fórmulas são ignoradas
+    Lança FormulaInvalida se houver dependência circular, a menos que a lista
+    ciclicas seja informada: nesse caso as fórmulas do ciclo (e as que dependem
+    delas) são colocadas nela e ficam fora da ordem
+    """
+    pendentes = {p: set(refs) & dependencias.keys() for p, refs in dependencias.items()}
+    ordem = []
+    while pendentes:
+        prontas = [p for p, refs in pendentes.items() if not refs]
+        if not prontas:
+            if ciclicas is not None:
+                ciclicas.extend(pendentes)
+                break
+            raise FormulaInvalida(f'Dependência circular entre as fórmulas: {_descrever_ciclo(pendentes)}')
+        for pergunta_id in prontas:
+            del pendentes[pergunta_id]
+            ordem.append(pergunta_id)
+        for refs in pendentes.values():
+            refs.difference_update(prontas)
+    return ordem
+
+
+def verificar_ciclos(dependencias, carregar_dependencias):
+    """
+    Verifica, no cadastro, se as fórmulas criam dependência circular
+    dependencias: dict {pergunta_id: perguntas lidas pela fórmula} das fórmulas verificadas
+    carregar_dependencias: função que recebe ids e retorna o mesmo dict para as
+    perguntas do tipo FORMULA já gravadas entre eles (demais ids são ignorados)
+    """
+    dependencias = dict(dependencias)
+    visitadas = set(dependencias)
+    desconhecidas = set().union(*dependencias.values()) - visitadas
+    # Percorre as fórmulas referenciadas, nível a nível, até fechar o grafo
+    while desconhecidas:
+        visitadas |= desconhecidas
+        novas = carregar_dependencias(desconhecidas)
+        dependencias.update(novas)
+        desconhecidas = set().union(*novas.values()) - visitadas
+    return ordenar_por_dependencia(dependencias)
+
+
+def _descrever_ciclo(pendentes):
+    """Caminho de um ciclo entre as fórmulas restantes, ex.: {3} -> {5} -> {3}"""
+    atual = next(iter(pendentes))
+    caminho = []
+    while atual not in caminho:
+        caminho.append(atual)
+        atual = min(pendentes[atual])
+    caminho = caminho[caminho.index(atual):] + [atual]
+    return ' -> '.join(f'{{{p}}}' for p in caminho)
+
+
+def valor_numerico(resposta):
+    """Converte uma resposta em número; respostas vazias ou não numéricas valem 0"""
+    try:
+        return float(resposta) if resposta not in (None, '') else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def avaliar_formula(formula, respostas_dict, perguntas=None, proprio_id=None):
+    """
+    Avalia a fórmula com as respostas do checklist e retorna o resultado como texto
+    respostas_dict: dict com {pergunta_id: resposta}
+    perguntas, proprio_id: contexto do formulário para intervalos e grupos (ver FormulaCompilada.expandir)
+    Retorna None se a fórmula for inválida ou o cálculo falhar (ex.: divisão por zero)
+    """
+    if not formula:
+        return None
+    try:
+        compilada = compilar_formula(formula)
+        expansoes = compilada.expandir(perguntas, proprio_id)
+        respostas = {
+            pergunta_id: respostas_dict.get(str(pergunta_id))
+            for pergunta_id in compilada.dependencias(expansoes)
+        }
+        return formatar_resultado(compilada.avaliar(respostas, expansoes))
+    except (FormulaInvalida, ArithmeticError, ValueError, TypeError) as e:
+        logger.debug("Fórmula não calculada: %s (%s)", formula, e)
+        return None
+
+
+def avaliar_formulas(formulas, respostas_dict):
+    """
+    Avalia várias fórmulas em uma única passagem, em ordem topológica,
+    alimentando os resultados das fórmulas nas que dependem delas
+    formulas: lista [(pergunta_id, FormulaCompilada ou None, expansoes)] já ordenada
+    Retorna dict {pergunta_id: resultado em texto ou None}
+    """
+    calculadas = {}
+    resultados = {}
+    for pergunta_id, compilada, expansoes in formulas:
+        resultado = None
+        # Se uma fórmula referenciada diretamente não pôde ser calculada, as dependentes também não são;
+        # em agregações ela conta como pergunta sem resposta
+        if compilada is not None and not any(
+            resultados.get(ref, '') is None for ref in compilada.referencias
+        ):
+            respostas = {
+                ref: calculadas[ref] if ref in calculadas else respostas_dict.get(str(ref))
+                for ref in compilada.dependencias(expansoes)
+            }
+            try:
+                resultado = formatar_resultado(compilada.avaliar(respostas, expansoes))
+            except (FormulaInvalida, ArithmeticError, ValueError, TypeError):
+                resultado = None
+        resultados[pergunta_id] = resultado
+        calculadas[pergunta_id] = resultado
+    return resultados
+
+
+def formatar_resultado(resultado):
+    if resultado is None:
+        return None
+    resultado = float(resultado)
+    if math.isnan(resultado) or math.isinf(resultado):
+        return None
+    return str(resultado)
+
+
+def _validar_no(no, formula):
+    if isinstance(no, (ast.Expression, ast.Load)):
+        return
+    if isinstance(no, ast.BinOp):
+        if type(no.op) not in OPERADORES_BINARIOS:
+            raise FormulaInvalida(f'Operador não permitido na fórmula: {formula}')
+        return
+    if isinstance(no, ast.UnaryOp):
+        if type(no.op) not in OPERADORES_UNARIOS:
+            raise FormulaInvalida(f'Operador não permitido na fórmula: {formula}')
+        return
+    if type(no) in OPERADORES_BINARIOS or type(no) in OPERADORES_UNARIOS:
+        return
+    if isinstance(no, ast.Constant):
+        if isinstance(no.value, bool) or not isinstance(no.value, (int, float)):
+            raise FormulaInvalida(f'Apenas números são permitidos na fórmula: {formula}')
+        return
+    if isinstance(no, ast.Name):
+        if not _eh_variavel(no.id) and not _eh_conjunto(no.id) and no.id not in FUNCOES and no.id not in AGREGACOES:
+            raise FormulaInvalida(f'Nome desconhecido "{no.id}" na fórmula: {formula}')
+        return
+    if isinstance(no, ast.Call):
+        if not isinstance(no.func, ast.Name) or no.keywords or (
+            no.func.id not in FUNCOES and no.func.id not in AGREGACOES
+        ):
+            raise FormulaInvalida(f'Função não permitida na fórmula: {formula}')
+        if not no.args:
+            raise FormulaInvalida(f'Função {no.func.id} sem argumentos na fórmula: {formula}')
+        if no.func.id in AGREGACOES and not all(
+            isinstance(arg, ast.Name) and (_eh_variavel(arg.id) or _eh_conjunto(arg.id)) for arg in no.args
+        ):
+            raise FormulaInvalida(
+                f'{no.func.id}() aceita apenas perguntas ({{id}}), intervalos ({{a..b}}) e grupos (#grupo): {formula}'
+            )
+        return
+    raise FormulaInvalida(f'Construção não permitida na fórmula: {formula}')
+
+
+def _eh_variavel(nome):
+    return nome.startswith(PREFIXO_VARIAVEL) and nome[len(PREFIXO_VARIAVEL):].isdigit()
+
+
+def _eh_conjunto(nome):
+    return nome.startswith(PREFIXO_INTERVALO) or nome.startswith(PREFIXO_GRUPO)
+
+
+def _respondida(resposta):
+    return resposta is not None and str(resposta).strip() != ''
+
+
+def _valores(respostas):
+    return np.fromiter((valor_numerico(r) for r in respostas), dtype=float, count=len(respostas))
+
+
+def _marcas_sim(respostas):
+    return np.fromiter((_eh_sim(r) for r in respostas), dtype=bool, count=len(respostas))
+
+
+def _eh_sim(resposta):
+    if not _respondida(resposta):
+        return False
+    texto = str(resposta).strip().lower()
+    return texto in RESPOSTAS_SIM or valor_numerico(texto) == 1.0
+
+
+def _avaliar_no(no, respostas, expansoes):
+    if isinstance(no, ast.BinOp):
+        return OPERADORES_BINARIOS[type(no.op)](
+            _avaliar_no(no.left, respostas, expansoes), _avaliar_no(no.right, respostas, expansoes)
+        )
+    if isinstance(no, ast.UnaryOp):
+        return OPERADORES_UNARIOS[type(no.op)](_avaliar_no(no.operand, respostas, expansoes))
+    if isinstance(no, ast.Constant):
+        return no.value
+    if isinstance(no, ast.Name):
+        return valor_numerico(respostas.get(int(no.id[len(PREFIXO_VARIAVEL):])))
+    if isinstance(no, ast.Call):
+        if no.func.id in AGREGACOES:
+            ids = []
+            for arg in no.args:
+                if _eh_variavel(arg.id):
+                    ids.append(int(arg.id[len(PREFIXO_VARIAVEL):]))
+                else:
+                    ids.extend(expansoes.get(arg.id, ()))
+            return AGREGACOES[no.func.id]([respostas.get(i) for i in ids])
+        return FUNCOES[no.func.id](*[_avaliar_no(arg, respostas, expansoes) for arg in no.args])
+    raise FormulaInvalida('Construção não permitida na fórmula')
@@ -0,0 +1,161 @@
+from datetime import datetime
+from sqlalchemy import update
+from src.models import db, ChecklistDiario, ChecklistResposta, TipoPerguntaEnum
+from src.services.esquema_formulario import obter_esquemas
+from src.services.formulas import AGREGACOES, formatar_resultado
+
+# Maior janela (em sessões) aceita para uma pergunta
+JANELA_MAXIMA_SESSOES = 100
+
+AGREGACAO_JANELA_PADRAO = 'media'
+
+
+def validar_janela(janela_sessoes, agregacao_janela, tipo):
+    """
+    Normaliza a configuração de janela de uma pergunta: (janela_sessoes, agregacao_janela)
+    Lança ValueError se a configuração for inválida
+    """
+    if janela_sessoes in (None, ''):
+        return None, None
+    if tipo != TipoPerguntaEnum.FORMULA:
+        raise ValueError('Janela de sessões só pode ser usada em perguntas do tipo FORMULA')
+    try:
+        janela_sessoes = int(janela_sessoes)
+    except (TypeError, ValueError):
+        raise ValueError('janela_sessoes deve ser um número inteiro')
+    if not 1 <= janela_sessoes <= JANELA_MAXIMA_SESSOES:
+        raise ValueError(f'janela_sessoes deve estar entre 1 e {JANELA_MAXIMA_SESSOES}')
+
+    agregacao_janela = agregacao_janela or AGREGACAO_JANELA_PADRAO
+    if agregacao_janela not in AGREGACOES:
+        raise ValueError(f'agregacao_janela deve ser uma de: {", ".join(AGREGACOES)}')
+    return janela_sessoes, agregacao_janela
+
+
+def atualizar_janelas(alteracoes):
+    """
+    Atualiza resposta_janela apenas das sessões afetadas por checklists criados,
+    alterados ou excluídos, sem reler o histórico da meta
+    alteracoes: iterável de (meta_id, data) dos checklists alterados
+
+    Para cada meta são lidas só as N-1 sessões anteriores à primeira data alterada
+    (entrada da janela) e as N-1 posteriores à última (cujas janelas incluem as alteradas)
+    """
+    alteracoes = list(alteracoes)
+    esquemas = obter_esquemas({meta_id for meta_id, _ in alteracoes})
+    datas_por_meta = {}
+    for meta_id, data in alteracoes:
+        if esquemas[meta_id].janelas:
+            datas_por_meta.setdefault(meta_id, []).append(data)
+
+    atualizacoes = []
+    for meta_id, datas in datas_por_meta.items():
+        janelas = esquemas[meta_id].janelas
+        maior_janela = max(janela for janela, _ in janelas.values())
+        inicio, fim = min(datas), max(datas)
+
+        base = db.session.query(ChecklistDiario.id, ChecklistDiario.data).filter(ChecklistDiario.meta_id == meta_id)
+        anteriores = base.filter(ChecklistDiario.data < inicio).order_by(
+            ChecklistDiario.data.desc()).limit(maior_janela - 1).all()
+        afetadas = base.filter(ChecklistDiario.data >= inicio, ChecklistDiario.data <= fim).order_by(
+            ChecklistDiario.data).all()
+        posteriores = base.filter(ChecklistDiario.data > fim).order_by(
+            ChecklistDiario.data).limit(maior_janela - 1).all()
+
+        sessoes = [checklist_id for checklist_id, _ in reversed(anteriores)]
+        primeira_afetada = len(sessoes)
+        sessoes += [checklist_id for checklist_id, _ in afetadas + posteriores]
+        atualizacoes += _calcular_janelas(sessoes, janelas, primeira_afetada)
+
+    _gravar_janelas(atualizacoes)
+
+
+def recalcular_janelas(pergunta_ids, janelas):
+    """
+    Recalcula todo o histórico das perguntas informadas (usado quando a
+    configuração de janela de uma pergunta muda)
+    janelas: dict {pergunta_id: (janela_sessoes, agregacao_janela)}; perguntas sem
+    janela configurada têm resposta_janela limpa
+    """
+    atualizacoes = []
+    sem_janela = [pergunta_id for pergunta_id in pergunta_ids if pergunta_id not in janelas]
+    if sem_janela:
+        atualizacoes += [
+            {'id': resposta_id, 'checklist_id': checklist_id, 'resposta_janela': None}
+            for resposta_id, checklist_id in db.session.query(ChecklistResposta.id, ChecklistResposta.checklist_id).filter(
+                ChecklistResposta.pergunta_id.in_(sem_janela),
+                ChecklistResposta.resposta_janela.isnot(None)
+            )
+        ]
+
+    com_janela = {pergunta_id: janelas[pergunta_id] for pergunta_id in pergunta_ids if pergunta_id in janelas}
+    if com_janela:
+        sessoes_por_meta = {}
+        linhas = db.session.query(ChecklistDiario.meta_id, ChecklistDiario.data, ChecklistDiario.id).join(
+            ChecklistResposta, ChecklistResposta.checklist_id == ChecklistDiario.id
+        ).filter(
+            ChecklistResposta.pergunta_id.in_(com_janela)
+        ).distinct().order_by(ChecklistDiario.meta_id, ChecklistDiario.data)
+        for meta_id, _, checklist_id in linhas:
+            sessoes_por_meta.setdefault(meta_id, []).append(checklist_id)
+        for sessoes in sessoes_por_meta.values():
+            atualizacoes += _calcular_janelas(sessoes, com_janela, 0)
+
+    _gravar_janelas(atualizacoes)
+
+
+def _gravar_janelas(atualizacoes):
+    """
+    Grava as atualizações [{id, checklist_id, resposta_janela}] em lote. O UPDATE em lote não passa
+    pelo before_flush (registrar_alteracoes): atualizado_em dos checklists alterados é renovado
+    aqui, para que a sincronização incremental envie os novos valores
+    """
+    if not atualizacoes:
+        return
+    checklist_ids = {atualizacao.pop('checklist_id') for atualizacao in atualizacoes}
+    db.session.execute(update(ChecklistResposta), atualizacoes)
+    db.session.execute(
+        update(ChecklistDiario).where(ChecklistDiario.id.in_(checklist_ids)).values(atualizado_em=datetime.utcnow())
+    )
+
+
+def _calcular_janelas(sessoes, janelas, primeira_afetada):
+    """
+    Janela deslizante sobre as sessões de uma meta, em ordem cronológica
+    sessoes: ids dos checklists; só as sessões a partir de primeira_afetada são gravadas
+    Retorna as atualizações em lote [{id, checklist_id, resposta_janela}] dos valores que mudaram
+    """
+    respostas = db.session.query(
+        ChecklistResposta.id,
+        ChecklistResposta.checklist_id,
+        ChecklistResposta.pergunta_id,
+        ChecklistResposta.resposta_calculada,
+        ChecklistResposta.resposta_janela
+    ).filter(
+        ChecklistResposta.checklist_id.in_(sessoes),
+        ChecklistResposta.pergunta_id.in_(janelas)
+    )
+    por_sessao = {}
+    for resposta in respostas:
+        por_sessao[(resposta.checklist_id, resposta.pergunta_id)] = resposta
+
+    atualizacoes = []
+    for pergunta_id, (janela, agregacao) in janelas.items():
+        valores = [
+            por_sessao[(checklist_id, pergunta_id)].resposta_calculada
+            if (checklist_id, pergunta_id) in por_sessao else None
+            for checklist_id in sessoes
+        ]
+        for posicao in range(primeira_afetada, len(sessoes)):
+            resposta = por_sessao.get((sessoes[posicao], pergunta_id))
+            if resposta is None:
+                continue
+            try:
+                valor = formatar_resultado(
+                    AGREGACOES[agregacao](valores[max(0, posicao - janela + 1):posicao + 1])
+                )
+            except (ArithmeticError, ValueError, TypeError):
+                valor = None
+            if valor != resposta.resposta_janela:
+                atualizacoes.append({'id': resposta.id, 'checklist_id': resposta.checklist_id, 'resposta_janela': valor})
+    return atualizacoes
@@ -0,0 +1,134 @@
+from sqlalchemy.orm import lazyload
+from src.models import db, MetaTerapeutica, ChecklistDiario, ChecklistResposta, StatusMetaEnum
+
+# Limite de sessões consecutivas aceito em criterio_sessoes
+MAXIMO_SESSOES_CRITERIO = 50
+
+
+def validar_criterio(criterio_sessoes, criterio_limiar, criterio_pergunta_id):
+    """
+    Normaliza o critério de maestria de uma meta: (sessoes, limiar, pergunta_id)
+    Sem criterio_sessoes o critério fica desativado. Lança ValueError se inválido
+    """
+    if criterio_sessoes in (None, ''):
+        return None, None, None
+    try:
+        criterio_sessoes = int(criterio_sessoes)
+    except (TypeError, ValueError):
+        raise ValueError('criterio_sessoes deve ser um número inteiro')
+    if not 1 <= criterio_sessoes <= MAXIMO_SESSOES_CRITERIO:
+        raise ValueError(f'criterio_sessoes deve estar entre 1 e {MAXIMO_SESSOES_CRITERIO}')
+    try:
+        criterio_limiar = float(criterio_limiar)
+    except (TypeError, ValueError):
+        raise ValueError('criterio_limiar é obrigatório e deve ser numérico')
+    if criterio_pergunta_id in (None, ''):
+        criterio_pergunta_id = None
+    else:
+        try:
+            criterio_pergunta_id = int(criterio_pergunta_id)
+        except (TypeError, ValueError):
+            raise ValueError('criterio_pergunta_id inválido')
+    return criterio_sessoes, criterio_limiar, criterio_pergunta_id
+
+
+def atualizar_maestria(alteracoes):
+    """
+    Atualiza o estado de maestria das metas após checklists criados, alterados ou excluídos
+    alteracoes: iterável de (meta_id, data) dos checklists alterados
+
+    Sessões novas posteriores à última avaliada só avançam (ou zeram) a sequência guardada
+    na meta; alterações no passado reavaliam apenas as últimas criterio_sessoes sessões
+    """
+    datas_por_meta = {}
+    for meta_id, data in alteracoes:
+        datas_por_meta.setdefault(meta_id, []).append(data)
+    if not datas_por_meta:
+        return
+
+    # Bloqueia as metas: checklists simultâneos da mesma meta não perdem atualizações da sequência
+    metas = MetaTerapeutica.query.filter(
+        MetaTerapeutica.id.in_(datas_por_meta),
+        MetaTerapeutica.criterio_sessoes.isnot(None)
+    ).options(lazyload(MetaTerapeutica.formularios)).with_for_update()
+    for meta in metas:
+        datas = datas_por_meta[meta.id]
+        if meta.maestria_ultima_data is None or min(datas) > meta.maestria_ultima_data:
+            for data, valor in _valores_sessoes(meta, datas=datas):
+                _registrar_sessao(meta, data, valor)
+            _verificar_conclusao(meta)
+        else:
+            reavaliar_meta(meta)
+
+
+def reavaliar_meta(meta):
+    """
+    Recalcula o estado de maestria a partir das últimas sessões da meta
+    (usado quando o critério muda ou uma sessão passada é alterada)
+    """
+    meta.maestria_sequencia = 0
+    meta.maestria_ultima_data = None
+    if meta.criterio_sessoes:
+        # Só as últimas criterio_sessoes sessões influenciam a sequência atual
+        sessoes = _valores_sessoes(meta, limite=meta.criterio_sessoes)
+        for data, valor in reversed(sessoes):
+            _registrar_sessao(meta, data, valor)
+        _verificar_conclusao(meta)
+
+
+def _registrar_sessao(meta, data, valor):
+    """Transição O(1) do estado: uma sessão que atinge o limiar estende a sequência, outra a zera"""
+    if valor is not None and valor >= meta.criterio_limiar:
+        meta.maestria_sequencia = (meta.maestria_sequencia or 0) + 1
+    else:
+        meta.maestria_sequencia = 0
+    meta.maestria_ultima_data = data
+
+
+def _verificar_conclusao(meta):
+    # A conclusão automática não é desfeita se a sequência cair depois
+    if meta.status == StatusMetaEnum.EM_ANDAMENTO and meta.maestria_sequencia >= meta.criterio_sessoes:
+        meta.status = StatusMetaEnum.CONCLUIDA
+
+
+def _valores_sessoes(meta, datas=None, limite=None):
+    """
+    Valores usados pelo critério: [(data, valor)]
+    datas: apenas as sessões nessas datas (ordem crescente)
+    limite: apenas as últimas N sessões (ordem decrescente)
+    O valor é a resposta da pergunta do critério (resultado, se for fórmula) ou a nota do checklist
+    """
+    if meta.criterio_pergunta_id:
+        consulta = db.session.query(
+            ChecklistDiario.data, ChecklistResposta.resposta_calculada, ChecklistResposta.resposta
+        ).outerjoin(
+            ChecklistResposta,
+            (ChecklistResposta.checklist_id == ChecklistDiario.id)
+            & (ChecklistResposta.pergunta_id == meta.criterio_pergunta_id)
+        )
+    else:
+        consulta = db.session.query(ChecklistDiario.data, ChecklistDiario.nota)
+    consulta = consulta.filter(ChecklistDiario.meta_id == meta.id)
+
+    if datas is not None:
+        consulta = consulta.filter(ChecklistDiario.data.in_(set(datas))).order_by(ChecklistDiario.data)
+    else:
+        consulta = consulta.order_by(ChecklistDiario.data.desc()).limit(limite)
+
+    valores = []
+    for linha in consulta:
+        if meta.criterio_pergunta_id:
+            data, calculada, resposta = linha
+            bruto = calculada if calculada not in (None, '') else resposta
+        else:
+            data, bruto = linha
+        valores.append((data, _numero(bruto)))
+    return valores
+
+
+def _numero(bruto):
+    """Resposta em número; vazia ou não numérica não atinge o critério"""
+    try:
+        return float(bruto)
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,142 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+NIVEL_PADRAO = 'INFO'
+# Registros aguardando o listener; com a fila cheia os novos são descartados em vez de bloquear a requisição
+FILA_TAMANHO_PADRAO = 10000
+# Fração dos registros DEBUG que é emitida (1.0 = todos)
+AMOSTRAGEM_DEBUG_PADRAO = 1.0
+
+# Atributos que todo LogRecord tem; o que passar disso veio de extra={...} e vai para o JSON
+_ATRIBUTOS_RECORD = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_handler = None
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro: ts, nivel, logger, mensagem, campos extras e exceção"""
+
+    def format(self, record):
+        registro = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_RECORD:
+                registro[chave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            registro['excecao'] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar só uma fração dos registros DEBUG (eventos de alto volume); os demais níveis passam todos"""
+
+    def __init__(self, taxa):
+        super().__init__()
+        self.taxa = taxa
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.taxa >= 1.0 or random.random() < self.taxa
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """
+    Enfileira o registro sem formatar (a serialização JSON e a escrita ficam na thread do listener)
+    e nunca bloqueia: com a fila cheia o registro é descartado e contado
+    """
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Resolve mensagem e traceback aqui: args e frames podem mudar depois que a requisição seguir
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def configurar_logs(app):
+    """
+    Logs do projeto em JSON (uma linha por registro) no stderr. A requisição só enfileira
+    o registro; uma thread em segundo plano formata e escreve. Configuração em app.config:
+    LOG_NIVEL, LOG_NIVEIS ("modulo=NIVEL,..."), LOG_AMOSTRAGEM_DEBUG e LOG_FILA_TAMANHO
+    """
+    global _listener, _handler
+    parar_logs()
+
+    fila = queue.Queue(app.config.get('LOG_FILA_TAMANHO', FILA_TAMANHO_PADRAO))
+    _handler = HandlerFila(fila)
+    _handler.addFilter(FiltroAmostragem(app.config.get('LOG_AMOSTRAGEM_DEBUG', AMOSTRAGEM_DEBUG_PADRAO)))
+
+    saida = logging.StreamHandler(sys.stderr)
+    saida.setFormatter(FormatadorJson())
+    _listener = logging.handlers.QueueListener(fila, saida)
+
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(_handler)
+    raiz.setLevel(app.config.get('LOG_NIVEL', NIVEL_PADRAO).upper())
+    for nome, nivel in niveis_por_modulo(app.config.get('LOG_NIVEIS', '')).items():
+        logging.getLogger(nome).setLevel(nivel)
+
+    _listener.start()
+
+
+def niveis_por_modulo(texto):
+    """'src.routes.agenda=DEBUG, sqlalchemy.engine=WARNING' -> {'src.routes.agenda': 'DEBUG', ...}"""
+    niveis = {}
+    for item in texto.split(','):
+        nome, _, nivel = item.partition('=')
+        if nome.strip() and nivel.strip():
+            niveis[nome.strip()] = nivel.strip().upper()
+    return niveis
+
+
+def parar_logs():
+    """Esvazia a fila e encerra a thread do listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def registros_descartados():
+    return _handler.descartados if _handler is not None else 0
+
+
+def _reiniciar_no_filho():
+    # Após um fork (ex.: workers do gunicorn com --preload) a thread do listener não existe no filho,
+    # e a fila pode ter ficado com o lock preso: o filho recomeça com fila e listener próprios
+    global _listener
+    if _listener is not None:
+        _handler.queue = queue.Queue(_handler.queue.maxsize)
+        _listener = logging.handlers.QueueListener(_handler.queue, *_listener.handlers)
+        _listener.start()
+
+
+atexit.register(parar_logs)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_no_filho)
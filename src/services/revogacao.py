@@ -0,0 +1,179 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from src.models import db, TokenRevogado
+
+# Intervalo (em segundos) entre as leituras das revogações novas em cada processo
+ATUALIZACAO_SEGUNDOS_PADRAO = 30
+# Intervalo entre as reconstruções completas do filtro, que descartam os tokens já expirados
+RECONSTRUCAO_SEGUNDOS_PADRAO = 3600
+# Folga do cursor incremental, para não perder revogações de transações confirmadas depois da leitura
+MARGEM_SEGUNDOS = 5
+
+TAXA_FALSO_POSITIVO = 0.01
+CAPACIDADE_MINIMA = 1024
+TAMANHO_MAXIMO_CONFIRMADOS = 10000
+
+
+class FiltroBloom:
+    """
+    Conjunto probabilístico compacto (bits em vez das chaves): nunca dá falso negativo;
+    falso positivo com probabilidade ~taxa enquanto tiver até capacidade itens
+    """
+
+    __slots__ = ('bits', 'tamanho', 'hashes')
+
+    def __init__(self, capacidade, taxa=TAXA_FALSO_POSITIVO):
+        self.tamanho = max(64, int(-capacidade * math.log(taxa) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.tamanho / capacidade * math.log(2)))
+        self.bits = bytearray((self.tamanho + 7) // 8)
+
+    def _posicoes(self, chave):
+        # Dupla dispersão: k posições derivadas de um único hash de 128 bits
+        digest = hashlib.blake2b(chave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.tamanho for i in range(self.hashes)]
+
+    def adicionar(self, chave):
+        for posicao in self._posicoes(chave):
+            self.bits[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, chave):
+        return all(self.bits[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+
+class ListaRevogacao:
+    """
+    Revogações conhecidas por este processo: filtro de Bloom com os jti não expirados e um
+    conjunto exato pequeno com as respostas já confirmadas no banco para os positivos do filtro
+    """
+
+    def __init__(self, capacidade):
+        self.filtro = FiltroBloom(capacidade)
+        self.capacidade = capacidade
+        self.total = 0
+        self.confirmados = {}  # jti -> revogado (True) ou falso positivo do filtro (False)
+        self.cursor = None
+        self.proxima_atualizacao = 0.0
+        self.proxima_reconstrucao = 0.0
+
+    def adicionar(self, jti):
+        self.filtro.adicionar(jti)
+        self.confirmados[jti] = True
+        self.total += 1
+
+
+_lista = None
+_lock = threading.Lock()
+
+
+def revogado(jti):
+    """
+    Verifica se o token foi revogado. O caso comum (token não revogado) é resolvido só
+    pelo filtro em memória; apenas positivos do filtro ainda não confirmados consultam o banco
+    """
+    lista = _lista_atualizada()
+    if jti not in lista.filtro:
+        return False
+    confirmado = lista.confirmados.get(jti)
+    if confirmado is None:
+        confirmado = db.session.query(TokenRevogado.query.filter_by(jti=jti).exists()).scalar()
+        with _lock:
+            if len(lista.confirmados) >= TAMANHO_MAXIMO_CONFIRMADOS:
+                lista.confirmados.pop(next(iter(lista.confirmados)))
+            lista.confirmados[jti] = confirmado
+    return confirmado
+
+
+def revogar_token(jti, expira_em):
+    """
+    Registra a revogação do token até expira_em (datetime UTC). Vale imediatamente neste
+    processo e, nos demais, na próxima atualização periódica. Não faz commit
+    """
+    if not jti:
+        return
+    if db.session.get(TokenRevogado, jti) is None:
+        db.session.add(TokenRevogado(jti=jti, expira_em=expira_em))
+    lista = _lista_atualizada()
+    with _lock:
+        lista.adicionar(jti)
+
+
+def revogar_payload(payload):
+    """Revoga o token a partir do payload JWT já decodificado (ignora tokens sem jti)"""
+    if payload.get('jti') and payload.get('exp'):
+        revogar_token(payload['jti'], datetime.utcfromtimestamp(payload['exp']))
+
+
+def limpar_cache():
+    global _lista
+    with _lock:
+        _lista = None
+
+
+def _lista_atualizada():
+    """Lista do processo, recarregada em segundo plano da requisição apenas quando vence o intervalo"""
+    lista = _lista
+    if lista is not None and time.monotonic() < lista.proxima_atualizacao:
+        return lista
+    # Só uma thread atualiza; as demais seguem com a lista atual (se já houver uma)
+    if not _lock.acquire(blocking=lista is None):
+        return lista
+    try:
+        lista = _lista
+        agora = time.monotonic()
+        if lista is None or agora >= lista.proxima_reconstrucao or lista.total > lista.capacidade:
+            lista = _reconstruir()
+        elif agora >= lista.proxima_atualizacao:
+            _carregar_novas(lista)
+        return lista
+    finally:
+        _lock.release()
+
+
+def _reconstruir():
+    """Remove do banco as revogações expiradas e monta um filtro novo com as restantes"""
+    global _lista
+    inicio = datetime.utcnow()
+    # Conexão própria: não interfere na transação da requisição em andamento
+    with db.engine.begin() as conexao:
+        conexao.execute(delete(TokenRevogado).where(TokenRevogado.expira_em < inicio))
+        jtis = conexao.execute(select(TokenRevogado.jti)).scalars().all()
+
+    lista = ListaRevogacao(max(CAPACIDADE_MINIMA, 2 * len(jtis)))
+    for jti in jtis:
+        lista.filtro.adicionar(jti)
+    lista.total = len(jtis)
+    lista.cursor = inicio - timedelta(seconds=MARGEM_SEGUNDOS)
+    agora = time.monotonic()
+    lista.proxima_atualizacao = agora + _config('REVOGACAO_ATUALIZACAO_SEGUNDOS', ATUALIZACAO_SEGUNDOS_PADRAO)
+    lista.proxima_reconstrucao = agora + _config('REVOGACAO_RECONSTRUCAO_SEGUNDOS', RECONSTRUCAO_SEGUNDOS_PADRAO)
+    _lista = lista
+    return lista
+
+
+def _carregar_novas(lista):
+    """Acrescenta ao filtro as revogações gravadas (por qualquer processo) desde o último cursor"""
+    inicio = datetime.utcnow()
+    with db.engine.connect() as conexao:
+        jtis = conexao.execute(
+            select(TokenRevogado.jti).where(TokenRevogado.revogado_em >= lista.cursor)
+        ).scalars().all()
+    for jti in jtis:
+        if lista.confirmados.get(jti) is not True:
+            lista.adicionar(jti)
+    lista.cursor = inicio - timedelta(seconds=MARGEM_SEGUNDOS)
+    lista.proxima_atualizacao = time.monotonic() + _config(
+        'REVOGACAO_ATUALIZACAO_SEGUNDOS', ATUALIZACAO_SEGUNDOS_PADRAO
+    )
+
+
+def _config(chave, padrao):
+    return current_app.config.get(chave, padrao)
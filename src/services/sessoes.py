@@ -0,0 +1,176 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from src.models import db, SessaoUsuario
+from src.services.autenticacao import JWT_SECRET, JWT_ALGORITMO, ErroAutenticacao, obter_usuario
+
+# Validade do token de acesso (JWT) e do refresh token
+ACESSO_MINUTOS_PADRAO = 15
+REFRESH_DIAS_PADRAO = 30
+
+# Verificações de senha simultâneas por processo e quantas podem aguardar na fila
+SENHA_THREADS_PADRAO = min(4, os.cpu_count() or 1)
+SENHA_FILA_PADRAO = 32
+SENHA_TIMEOUT_SEGUNDOS = 30
+
+_pool = None
+_vagas = None
+_lock = threading.Lock()
+
+
+class ServidorOcupado(Exception):
+    """Fila de verificação de senhas cheia"""
+
+
+def verificar_senha(senha_hash, senha):
+    """Compara a senha com o hash em uma thread do pool limitado. Lança ServidorOcupado"""
+    return _executar(check_password_hash, senha_hash, senha)
+
+
+def gerar_hash_senha(senha):
+    """Gera o hash da senha em uma thread do pool limitado. Lança ServidorOcupado"""
+    return _executar(generate_password_hash, senha)
+
+
+def _executar(funcao, *args):
+    """
+    O hash de senha (PBKDF2/scrypt) é caro em CPU: limita quantos rodam ao mesmo tempo
+    e recusa na hora, em vez de enfileirar sem limite, quando muitos logins chegam juntos
+    """
+    pool, vagas = _pool_senhas()
+    if not vagas.acquire(blocking=False):
+        raise ServidorOcupado('Muitas tentativas de login simultâneas. Tente novamente em instantes')
+    try:
+        futuro = pool.submit(funcao, *args)
+    except Exception:
+        vagas.release()
+        raise
+    futuro.add_done_callback(lambda _: vagas.release())
+    return futuro.result(timeout=SENHA_TIMEOUT_SEGUNDOS)
+
+
+def _pool_senhas():
+    global _pool, _vagas
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                threads = current_app.config.get('SENHA_THREADS', SENHA_THREADS_PADRAO)
+                fila = current_app.config.get('SENHA_FILA_MAXIMA', SENHA_FILA_PADRAO)
+                _vagas = threading.BoundedSemaphore(threads + fila)
+                _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='senhas')
+    return _pool, _vagas
+
+
+def gerar_token_acesso(usuario, sessao_id):
+    """JWT de curta duração; sid identifica a sessão de refresh que o originou"""
+    payload = {
+        'user_id': usuario.id,
+        'email': usuario.email,
+        'tipo_usuario': usuario.tipo_usuario.value,
+        'sid': sessao_id,
+        'jti': secrets.token_hex(16),
+        'exp': datetime.utcnow() + timedelta(minutes=validade_acesso_minutos())
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITMO)
+
+
+def validade_acesso_minutos():
+    return current_app.config.get('JWT_ACESSO_MINUTOS', ACESSO_MINUTOS_PADRAO)
+
+
+def validade_refresh_dias():
+    return current_app.config.get('REFRESH_TOKEN_DIAS', REFRESH_DIAS_PADRAO)
+
+
+def criar_sessao(usuario):
+    """
+    Abre uma sessão de refresh para o usuário: (sessao, refresh_token)
+    Aproveita para remover as sessões expiradas do usuário. Não faz commit
+    """
+    SessaoUsuario.query.filter(
+        SessaoUsuario.usuario_id == usuario.id,
+        SessaoUsuario.expira_em < datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+    segredo = secrets.token_urlsafe(32)
+    sessao = SessaoUsuario(
+        usuario_id=usuario.id,
+        token_hash=_hash_token(segredo),
+        expira_em=datetime.utcnow() + timedelta(days=validade_refresh_dias())
+    )
+    db.session.add(sessao)
+    db.session.flush()
+    return sessao, f'{sessao.id}.{segredo}'
+
+
+def renovar_sessao(refresh_token):
+    """
+    Troca o refresh token por um novo (rotação) sem verificar a senha: (usuario, sessao, refresh_token)
+    Um token já trocado que volte a ser usado encerra a sessão na hora (com commit), pois indica
+    token vazado. Lança ErroAutenticacao. Nos demais casos não faz commit
+    """
+    sessao_id, segredo = _ler_refresh_token(refresh_token)
+    sessao = SessaoUsuario.query.filter_by(id=sessao_id).with_for_update().first()
+    if sessao is None or sessao.expira_em < datetime.utcnow():
+        raise ErroAutenticacao('Sessão expirada ou encerrada')
+    if not hmac.compare_digest(sessao.token_hash, _hash_token(segredo)):
+        db.session.delete(sessao)
+        db.session.commit()
+        raise ErroAutenticacao('Refresh token inválido')
+
+    usuario = obter_usuario(sessao.usuario_id)
+    segredo = secrets.token_urlsafe(32)
+    sessao.token_hash = _hash_token(segredo)
+    sessao.expira_em = datetime.utcnow() + timedelta(days=validade_refresh_dias())
+    return usuario, sessao, f'{sessao.id}.{segredo}'
+
+
+def encerrar_sessao(refresh_token=None, sessao_id=None):
+    """
+    Logout: exclui a sessão do refresh token ou do id informado (vindo de um token de acesso
+    já validado). Lança ErroAutenticacao se o refresh token não confere. Não faz commit
+    """
+    consulta = SessaoUsuario.query
+    if refresh_token:
+        sessao_id, segredo = _ler_refresh_token(refresh_token)
+        consulta = consulta.filter(SessaoUsuario.token_hash == _hash_token(segredo))
+    if sessao_id is None:
+        return 0
+    removidas = consulta.filter(SessaoUsuario.id == sessao_id).delete(synchronize_session=False)
+    if refresh_token and not removidas:
+        raise ErroAutenticacao('Refresh token inválido')
+    return removidas
+
+
+def encerrar_sessoes_usuario(usuario_id):
+    """Encerra todas as sessões do usuário (ex.: troca de senha). Não faz commit"""
+    return SessaoUsuario.query.filter_by(usuario_id=usuario_id).delete(synchronize_session=False)
+
+
+def limpar_sessoes_expiradas():
+    """Remove as sessões expiradas de todos os usuários. Não faz commit"""
+    return SessaoUsuario.query.filter(
+        SessaoUsuario.expira_em < datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+
+def _ler_refresh_token(refresh_token):
+    """Formato '<sessao_id>.<segredo>'. Lança ErroAutenticacao"""
+    sessao_id, _, segredo = (refresh_token or '').partition('.')
+    if not sessao_id.isdigit() or not segredo:
+        raise ErroAutenticacao('Refresh token inválido')
+    return int(sessao_id), segredo
+
+
+def _hash_token(segredo):
+    # O segredo já é aleatório (256 bits): SHA-256 simples basta, sem custo de hash de senha
+    return hashlib.sha256(segredo.encode()).hexdigest()
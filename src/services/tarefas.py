@@ -0,0 +1,178 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+
+from src.models import db, Tarefa, StatusTarefaEnum
+from src.services.autenticacao import obter_usuario
+
+logger = logging.getLogger(__name__)
+
+# Execuções simultâneas de cada tipo por processo e quantas podem aguardar na fila
+LIMITE_PADRAO = 1
+FILA_PADRAO = 20
+# Tarefas concluídas ficam disponíveis por esse tempo; pendentes/executando há mais que o
+# tempo máximo são consideradas interrompidas (ex.: processo reiniciado)
+RETENCAO_HORAS_PADRAO = 24
+TEMPO_MAXIMO_MINUTOS_PADRAO = 30
+
+
+class FilaCheia(Exception):
+    """Fila do tipo de tarefa cheia"""
+
+
+class TipoTarefa:
+    __slots__ = ('nome', 'executar', 'validar', 'limite')
+
+    def __init__(self, nome, executar, validar, limite):
+        self.nome = nome
+        self.executar = executar
+        self.validar = validar
+        self.limite = limite
+
+
+_tipos = {}
+_pools = {}  # tipo -> (pool, vagas)
+_lock = threading.Lock()
+
+
+def tipo_tarefa(nome, validar, limite=LIMITE_PADRAO):
+    """
+    Decorador que registra funcao(parametros) -> dict como tipo de tarefa.
+    validar(parametros) roda na requisição e devolve os parâmetros normalizados (JSON);
+    lança ValueError (400), PermissionError (403) ou LookupError (404)
+    """
+    def registrar(funcao):
+        _tipos[nome] = TipoTarefa(nome, funcao, validar, limite)
+        return funcao
+    return registrar
+
+
+def tipos_registrados():
+    return sorted(_tipos)
+
+
+def submeter(tipo, parametros, usuario_id=None):
+    """
+    Valida os parâmetros, grava a tarefa (com commit) e a envia ao pool do tipo.
+    Lança ValueError/PermissionError/LookupError da validação e FilaCheia
+    """
+    definicao = _tipos.get(tipo)
+    if definicao is None:
+        raise ValueError(f"Tipo de tarefa inválido. Use: {', '.join(tipos_registrados())}")
+    parametros = definicao.validar(parametros or {})
+
+    pool, vagas = _pool(definicao)
+    if not vagas.acquire(blocking=False):
+        raise FilaCheia('Muitas tarefas deste tipo na fila. Tente novamente em instantes')
+    try:
+        tarefa = Tarefa(tipo=tipo, parametros=parametros, usuario_id=usuario_id)
+        db.session.add(tarefa)
+        db.session.commit()
+        futuro = pool.submit(_executar, current_app._get_current_object(), tarefa.id)
+    except Exception:
+        vagas.release()
+        raise
+    futuro.add_done_callback(lambda _: vagas.release())
+    return tarefa
+
+
+def _pool(definicao):
+    """
+    Um pool por tipo: relatórios pesados ocupam no máximo `limite` threads (e conexões do banco)
+    cada, sem disputar com os demais tipos nem com as requisições interativas
+    """
+    item = _pools.get(definicao.nome)
+    if item is None:
+        with _lock:
+            item = _pools.get(definicao.nome)
+            if item is None:
+                limite = limites_configurados().get(definicao.nome, definicao.limite)
+                fila = current_app.config.get('TAREFAS_FILA_MAXIMA', FILA_PADRAO)
+                item = (
+                    ThreadPoolExecutor(max_workers=limite, thread_name_prefix=f'tarefa-{definicao.nome}'),
+                    threading.BoundedSemaphore(limite + fila)
+                )
+                _pools[definicao.nome] = item
+    return item
+
+
+def limites_configurados():
+    """TAREFAS_LIMITES 'relatorio_periodo=1,relatorio_paciente=3' -> {'relatorio_periodo': 1, ...}"""
+    limites = {}
+    for item in current_app.config.get('TAREFAS_LIMITES', '').split(','):
+        nome, _, limite = item.partition('=')
+        if nome.strip() and limite.strip().isdigit() and int(limite) > 0:
+            limites[nome.strip()] = int(limite)
+    return limites
+
+
+def _executar(app, tarefa_id):
+    # Roda no pool: exceções aqui seriam engolidas pelo futuro e a tarefa ficaria PENDENTE
+    # com os clientes consultando para sempre. Qualquer falha é registrada e marca a tarefa como ERRO
+    with app.app_context():
+        tipo = None
+        try:
+            # Reserva a tarefa: só quem muda PENDENTE -> EXECUTANDO a executa
+            reservada = Tarefa.query.filter_by(id=tarefa_id, status=StatusTarefaEnum.PENDENTE).update(
+                {'status': StatusTarefaEnum.EXECUTANDO, 'iniciado_em': datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.session.commit()
+            if not reservada:
+                return
+
+            tarefa = db.session.get(Tarefa, tarefa_id)
+            tipo = tarefa.tipo
+            # Mesmo escopo de acesso aos pacientes do usuário que pediu (ver services.acesso)
+            g.usuario = obter_usuario(tarefa.usuario_id) if tarefa.usuario_id else None
+            resultado = app.json.dumps(_tipos[tipo].executar(tarefa.parametros))
+            _finalizar(tarefa_id, StatusTarefaEnum.CONCLUIDA, resultado=resultado)
+        except Exception as e:
+            db.session.rollback()
+            if not isinstance(e, (ValueError, PermissionError, LookupError)):
+                logger.exception("Erro ao executar tarefa %s (%s)", tarefa_id, tipo)
+            _finalizar_com_erro(tarefa_id, str(e))
+
+
+def _finalizar(tarefa_id, status, resultado=None, erro=None):
+    Tarefa.query.filter_by(id=tarefa_id).update(
+        {'status': status, 'resultado': resultado, 'erro': erro, 'concluido_em': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    logger.info("Tarefa %s finalizada: %s", tarefa_id, status.value)
+
+
+def _finalizar_com_erro(tarefa_id, erro):
+    """Marca a tarefa como ERRO; se nem isso for possível (ex.: banco fora), o limpar_tarefas a encerra depois"""
+    try:
+        _finalizar(tarefa_id, StatusTarefaEnum.ERRO, erro=erro)
+    except Exception:
+        db.session.rollback()
+        logger.exception("Não foi possível marcar a tarefa %s como erro", tarefa_id)
+
+
+def limpar_tarefas():
+    """
+    Remove as tarefas finalizadas além da retenção e marca como erro as que ficaram
+    pendentes/executando além do tempo máximo. Retorna (removidas, interrompidas). Não faz commit
+    """
+    agora = datetime.utcnow()
+    retencao = current_app.config.get('TAREFAS_RETENCAO_HORAS', RETENCAO_HORAS_PADRAO)
+    tempo_maximo = current_app.config.get('TAREFAS_TEMPO_MAXIMO_MINUTOS', TEMPO_MAXIMO_MINUTOS_PADRAO)
+
+    interrompidas = Tarefa.query.filter(
+        Tarefa.status.in_([StatusTarefaEnum.PENDENTE, StatusTarefaEnum.EXECUTANDO]),
+        Tarefa.criado_em < agora - timedelta(minutes=tempo_maximo)
+    ).update(
+        {'status': StatusTarefaEnum.ERRO, 'erro': 'Tarefa interrompida', 'concluido_em': agora},
+        synchronize_session=False
+    )
+    removidas = Tarefa.query.filter(
+        Tarefa.status.in_([StatusTarefaEnum.CONCLUIDA, StatusTarefaEnum.ERRO]),
+        Tarefa.concluido_em < agora - timedelta(hours=retencao)
+    ).delete(synchronize_session=False)
+    return removidas, interrompidas
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from src.models import db
+
+
+class VersaoTabela:
+    """
+    Percebe alterações feitas por qualquer processo em uma tabela com atualizado_em:
+    a cada intervalo lê (max(atualizado_em), count(*)) com conexão própria, como a
+    atualização periódica das revogações. A contagem cobre as exclusões
+    """
+
+    def __init__(self, modelo, chave_intervalo, intervalo_padrao):
+        self.modelo = modelo
+        self.chave_intervalo = chave_intervalo
+        self.intervalo_padrao = intervalo_padrao
+        self.versao = None
+        self.alterada_em = 0.0
+        self.proxima_leitura = 0.0
+        self._lock = threading.Lock()
+
+    def alterada_desde(self, instante):
+        """
+        Se a tabela mudou depois de instante (time.monotonic()): entradas de cache
+        carregadas antes da última alteração percebida estão vencidas
+        """
+        if time.monotonic() >= self.proxima_leitura:
+            self._ler()
+        return self.alterada_em > instante
+
+    def _ler(self):
+        # Só uma thread lê; as demais seguem com a versão atual
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            inicio = time.monotonic()
+            with db.engine.connect() as conexao:
+                versao = tuple(conexao.execute(
+                    select(func.max(self.modelo.atualizado_em), func.count()).select_from(self.modelo)
+                ).one())
+            if versao != self.versao:
+                # Marca o início da leitura: cargas que começaram antes dela podem ter lido dados antigos.
+                # A primeira leitura também conta, pois não há versão anterior com que comparar
+                self.alterada_em = inicio
+            self.versao = versao
+            self.proxima_leitura = time.monotonic() + current_app.config.get(
+                self.chave_intervalo, self.intervalo_padrao
+            )
+        finally:
+            self._lock.release()
+
+    def reiniciar(self):
+        self.versao = None
+        self.alterada_em = 0.0
+        self.proxima_leitura = 0.0
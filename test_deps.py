@@ -22,6 +22,7 @@ def test_imports():
         ('blinker', 'Blinker'),
         ('itsdangerous', 'ItsDangerous'),
         ('markupsafe', 'MarkupSafe'),
+        ('numpy', 'NumPy'),
         ('greenlet', 'Greenlet'),
         ('typing_extensions', 'typing-extensions'),
         ('charset_normalizer', 'charset-normalizer'),